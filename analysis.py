@@ -0,0 +1,207 @@
+import os
+import time
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from sentiment import polarity, warm_up
+from overthinking import detect_overthinking
+
+
+# Analyze & Save jobs from every session, off the sessions' script threads.
+# A job scores the entry, finds its overthinking keywords and saves it; the
+# session keeps the future and picks the result up on a later rerun.
+#   OJA_ANALYSIS_THREADS     jobs running at once
+#   OJA_ANALYSIS_PROCESSES   scoring runs in this many worker processes, so long
+#                            entries from many users use every core (scoring is
+#                            pure Python and holds the GIL). Defaults to one per
+#                            core up to the thread count; 0, and the default on a
+#                            single core, scores on the job threads themselves.
+ANALYSIS_THREADS = int(os.environ.get("OJA_ANALYSIS_THREADS", 4))
+_cores = os.cpu_count() or 1
+ANALYSIS_PROCESSES = int(os.environ.get("OJA_ANALYSIS_PROCESSES", min(ANALYSIS_THREADS, _cores) if _cores > 1 else 0))
+# Jobs queued or running before new ones are turned away. A job keeps its slot
+# until its worker process is done with the entry, even after it timed out.
+ANALYSIS_MAX_PENDING = int(os.environ.get("OJA_ANALYSIS_MAX_PENDING", 64))
+# Seconds a job may take, time spent queued included
+ANALYSIS_TIMEOUT = float(os.environ.get("OJA_ANALYSIS_TIMEOUT", 30))
+
+
+class AnalysisBusy(RuntimeError):
+    pass
+
+class AnalysisTimeout(TimeoutError):
+    pass
+
+
+def analyze(entry):
+    # (sentiment, overthinking keywords); module level so worker processes can run it
+    return polarity(entry), detect_overthinking(entry)
+
+
+class _Job:
+    # Whether a job got to save its entry or was given up on first: exactly one wins
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.saving = False
+        self.abandoned = False
+        self.holds = 1   # the job itself, plus its scoring task while a worker process has it
+
+    def start_saving(self):
+        with self.lock:
+            if self.abandoned or time.monotonic() > self.deadline:
+                self.abandoned = True
+                return False
+            self.saving = True
+            return True
+
+    def abandon(self):
+        with self.lock:
+            if not self.saving:
+                self.abandoned = True
+            return self.abandoned
+
+
+class AnalysisPool:
+    def __init__(self, threads=ANALYSIS_THREADS, processes=ANALYSIS_PROCESSES,
+                 max_pending=ANALYSIS_MAX_PENDING, timeout=ANALYSIS_TIMEOUT):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._threads = ThreadPoolExecutor(threads, thread_name_prefix="analysis")
+        self._process_count = processes
+        self._processes = self._new_processes() if processes > 0 else None
+        atexit.register(self.close)
+
+    def _new_processes(self):
+        # spawned, not forked: the server process is full of threads
+        return ProcessPoolExecutor(
+            self._process_count, mp_context=multiprocessing.get_context("spawn"), initializer=warm_up,
+        )
+
+    def submit(self, entry, save=None):
+        # Future of (sentiment, keywords). save(sentiment, keywords) runs in the
+        # job once the entry is scored, unless the job is already past its
+        # deadline: a job that timed out never saves, so the entry can simply be
+        # submitted again. None when there is nothing to persist.
+        # Raises AnalysisBusy once max_pending jobs are queued or running.
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise AnalysisBusy(f"{self._pending} entries are already being analyzed")
+            self._pending += 1
+        job = _Job(time.monotonic() + self.timeout)
+        try:
+            future = self._threads.submit(self._run, entry, save, job)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.job = job
+        future.deadline = job.deadline
+        future.add_done_callback(self._finished)
+        return future
+
+    def _run(self, entry, save, job):
+        deadline = job.deadline
+        if time.monotonic() > deadline:
+            raise AnalysisTimeout("no worker was free in time")
+        if self._processes is None:
+            sentiment, keywords = analyze(entry)
+        else:
+            try:
+                sentiment, keywords = self._score(entry, job)
+            except BrokenProcessPool:
+                # a worker died (killed, crashed): the whole pool is unusable; once more on a new one
+                sentiment, keywords = self._score(entry, job)
+        if save is not None:
+            if not job.start_saving():
+                raise AnalysisTimeout("scored too late to save")
+            save(sentiment, keywords)
+        return sentiment, keywords
+
+    def _score(self, entry, job):
+        processes = self._processes
+        try:
+            scored = processes.submit(analyze, entry)
+        except BrokenProcessPool:
+            self._restart(processes)
+            raise
+        with self._lock:
+            job.holds += 1
+        scored.add_done_callback(lambda _: self._release(job))
+        try:
+            return scored.result(timeout=max(0.0, job.deadline - time.monotonic()))
+        except TimeoutError:
+            # cancel() can't stop a running task: its slot stays taken until the worker is done
+            scored.cancel()
+            raise AnalysisTimeout("scoring took too long") from None
+        except BrokenProcessPool:
+            self._restart(processes)
+            raise
+
+    def _restart(self, broken):
+        # swap in a new process pool, once, for whichever job noticed first
+        with self._lock:
+            if self._processes is not broken:
+                return
+            self._processes = self._new_processes()
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, job):
+        with self._lock:
+            job.holds -= 1
+            if job.holds == 0:
+                self._pending -= 1
+
+    def _finished(self, future):
+        self._release(future.job)
+        with self._lock:
+            if future.cancelled():
+                self.timed_out += 1
+            elif future.exception() is None:
+                self.completed += 1
+            elif isinstance(future.exception(), AnalysisTimeout):
+                self.timed_out += 1
+            else:
+                self.failed += 1
+
+    def poll(self, future):
+        # The job's result if it is done (re-raising its error), None while it
+        # is still running, AnalysisTimeout once it is past its deadline. A job
+        # already saving its entry is waited for, so a timeout means not saved.
+        if future.done():
+            if future.cancelled():
+                raise AnalysisTimeout("the analysis was cancelled")
+            return future.result()
+        if time.monotonic() > future.deadline and future.job.abandon():
+            future.cancel()  # only stops jobs that are still queued
+            raise AnalysisTimeout("the analysis took too long")
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timed_out": self.timed_out,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+            }
+
+    def close(self):
+        self._threads.shutdown(wait=True, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True, cancel_futures=True)
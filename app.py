@@ -1,25 +1,38 @@
 import streamlit as st
-import pandas as pd
-from textblob import TextBlob
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-import random
-import csv
-import matplotlib.pyplot as plt
-import streamlit.components.v1 as components
 import time
-import sys
-import hashlib
+import random
+from functools import partial
+
+# pandas and textblob are only imported by the code paths that use them,
+# so the login page paints without paying for either
+from storage import get_storage, get_user_directory
+from sentiment import polarity, IncrementalSentiment, warm_up as warm_up_sentiment
+from audit import get_audit_sink
+from throttle import get_login_throttle, client_key
+from mood_coalescer import get_mood_coalescer
+from mood_trend import TREND_RANGES, pick_granularity, downsample, bucket_keys
+from journal_store import JournalStore, get_entry_hash, memory_report
+from search import get_search_index, MOODS, SEARCH_PAGE_SIZE
+from backup import export_file, export_name, import_file, EXPORT_MIME
+from overthinking import overthinking_keywords, detect_overthinking
+from analysis import AnalysisPool, AnalysisBusy, AnalysisTimeout
+from metrics import METRICS_ENABLED, start_rerun, timed
 
 
 
 st.set_page_config(page_title="Login", layout="centered")  
 
+# Timing spans for this rerun (no-ops unless OJA_METRICS is set)
+rerun_timer = start_rerun()
+rerun_timer.section("intro + theme")
+
 # Set session flags
 if "intro_shown" not in st.session_state:
     st.session_state.intro_shown = False
 
-# 1. 🌟 INTRO ANIMATION SCREEN
+# 1. 🌟 INTRO ANIMATION SCREEN (plays in the browser; the script carries on rendering underneath)
 if not st.session_state.intro_shown:
     st.markdown("""
     <style>
@@ -29,7 +42,13 @@ if not st.session_state.intro_shown:
         background: linear-gradient(135deg, #fce3ff, #e0f7ff);
         display: flex; justify-content: center; align-items: center;
         z-index: 9999;
-        animation: fadeIn 3s ease-in-out;
+        animation: introFade 3.5s ease-in-out forwards;
+    }
+    @keyframes introFade {
+        0% { opacity: 0; }
+        15% { opacity: 1; }
+        85% { opacity: 1; }
+        100% { opacity: 0; visibility: hidden; pointer-events: none; }
     }
     .intro-text {
         font-size: 3rem;
@@ -52,10 +71,7 @@ if not st.session_state.intro_shown:
     </div>
     """, unsafe_allow_html=True)
 
-    time.sleep(3)
     st.session_state.intro_shown = True
-    st.rerun()
-    st.stop()
 
 st.markdown("""
     <style>
@@ -106,40 +122,31 @@ st.markdown("""
 
 
 # ---------- LOGIN SYSTEM ----------
-LOGIN_LOG_FILE = "login_attempts.csv"
-USERS_FILE = "users.csv"
-
 # Function to log login attempts
+@timed("audit.log_login_attempt")
 def log_login_attempt(username, success):
     attempt = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "username": username,
         "status": "Success" if success else "Failed"
     }
+    get_audit_sink().submit(attempt)
 
-    file_exists = os.path.exists(LOGIN_LOG_FILE)
-    with open(LOGIN_LOG_FILE, mode='a', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=["timestamp", "username", "status"])
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(attempt)
+# Who is logging in, for the login throttle: the connection's address, or the
+# X-Forwarded-For hop added by OJA_TRUSTED_PROXIES proxies in front of the server
+def login_client():
+    address = st.context.ip_address
+    return client_key(address if isinstance(address, str) else "", st.context.headers.get("X-Forwarded-For", ""))
 
 # -------- Load Users --------
+@timed("storage.load_users")
 def load_users():
-    if not os.path.exists(USERS_FILE):
-        return {}
-    with open(USERS_FILE, mode='r') as file:
-        reader = csv.DictReader(file)
-        return {row['username']: row['password'] for row in reader}
+    return get_user_directory().load_users()
 
 # -------- Save New User --------
+@timed("storage.save_new_user")
 def save_new_user(username, password):
-    file_exists = os.path.exists(USERS_FILE)
-    with open(USERS_FILE, mode='a', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=["username", "password"])
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow({"username": username, "password": password})
+    return get_user_directory().save_new_user(username, password)
 
 # -------- Sign Up --------
 def sign_up():
@@ -147,11 +154,9 @@ def sign_up():
     new_user = st.text_input("Choose a username", key="new_user")
     new_pass = st.text_input("Choose a password", type="password", key="new_pass")
     if st.button("Create Account"):
-        users = load_users()
-        if new_user in users:
+        if new_user in load_users() or not save_new_user(new_user, new_pass):
             st.error("🚫 Username already exists.")
         else:
-            save_new_user(new_user, new_pass)
             st.success("✅ Account created! Please log in.")
             st.session_state.show_login = True
 
@@ -177,14 +182,22 @@ def check_password():
     if "login_attempts" not in st.session_state:
         st.session_state["login_attempts"] = 0
 
-    users = load_users()
-
     def password_entered():
         username = st.session_state["username"]
         password = st.session_state["password"]
 
+        # throttled attempts stop here: no user lookup and no audit write of their own
+        wait = get_login_throttle().check(username, login_client())
+        if wait:
+            st.session_state["logged_in"] = False
+            del st.session_state["password"]
+            st.warning(f"🚦 Too many login attempts. Please try again in {int(wait) + 1} seconds.")
+            return
+
+        users = load_users()
         if username in users and users[username] == password:
             st.session_state["logged_in"] = True
+            st.session_state["current_user"] = username
             st.session_state["login_attempts"] = 0
             log_login_attempt(username, True)
             del st.session_state["password"]
@@ -210,17 +223,34 @@ def check_password():
         return True
 
 # -------- Handle Login or Signup View --------
+rerun_timer.section("login")
 if "show_login" not in st.session_state:
     st.session_state.show_login = True
 
 if st.session_state.show_login:
     if not check_password():
+        rerun_timer.finish()
         st.stop()
 else:
     sign_up()
+    rerun_timer.finish()
     st.stop()
 
 
+# The sentiment backend (compiled lexicon or TextBlob) loads once per server process, shared by every session
+@st.cache_resource(show_spinner=False)
+def load_sentiment_engine():
+    return warm_up_sentiment()
+
+rerun_timer.section("sentiment warm-up")
+load_sentiment_engine()
+
+# Analyze & Save jobs from every session run on one pool per server process
+@st.cache_resource(show_spinner=False)
+def analysis_pool():
+    return AnalysisPool()
+
+
 # Initialize session state variables
 if "current_mood" not in st.session_state:
     st.session_state.current_mood = "Neutral"
@@ -229,11 +259,14 @@ if "playlist_index" not in st.session_state:
 if "theme_applied" not in st.session_state:
     st.session_state.theme_applied = False
 
+# Saved this session: hash and metadata only (within OJA_SESSION_JOURNAL_BUDGET), the text stays in storage
 if "journal_entries" not in st.session_state:
-    st.session_state.journal_entries = []
+    st.session_state.journal_entries = JournalStore(owner=st.session_state.get("current_user") or "")
 
-if "saved_hashes" not in st.session_state:
-    st.session_state.saved_hashes = set()
+if "journal_search_page" not in st.session_state:
+    st.session_state.journal_search_page = 0
+if "journal_page" not in st.session_state:
+    st.session_state.journal_page = 0
 
 if "current_mood" not in st.session_state:
     st.session_state.current_mood = "Neutral"
@@ -258,25 +291,8 @@ playlist_dict = {
     ]
 }
 
-# File to save journal entries
-JOURNAL_FILE = "journal_db.csv"
-
-# Ensure journal file exists
-def ensure_journal_file():
-    if not os.path.exists(JOURNAL_FILE):
-        df = pd.DataFrame(columns=["date", "entry", "sentiment", "keywords"])
-        df.to_csv(JOURNAL_FILE, index=False)
-
-# Overthinking keyword list
-overthinking_keywords = [
-    "always", "never", "can't","not", "should have", "why", "again", "mess", "ruined",
-    "everything", "nothing", "failed", "hate", "hopeless", "worthless","sad","what if",
-    "maybe i should have","i can't stop thinking about", "why did i","what will they think",
-    "i always mess things up","what is it goes wrong?", "did i say something wrong?","i need to be sure",
-    "past","future","every time","doubt","anxious","nervous","insecure","guilt","fear","regret"
-    "embarrassed","shame","panic","die","depressed","depression","low","without","alone","weak","confusion","confuse",
-    "remember","i wonder","left","alone","defeat","destroy","disappointed" "disappoinment","end","loser"
-]
+# Saved journals shown per page
+JOURNAL_PAGE_SIZE = int(os.environ.get("OJA_JOURNAL_PAGE_SIZE", 10))
 
 positive_prompts = [
     "What are three things that went okay today?",
@@ -320,14 +336,10 @@ supportive_messages = [
 ]
 
 
-# Detect overthinking keywords
-def detect_overthinking(text):
-    return [kw for kw in overthinking_keywords if kw in text.lower()]
-
 # Analyze entry: sentiment + keyword detection
+@timed("analysis.analyze_entry")
 def analyze_entry(entry):
-    blob = TextBlob(entry)
-    sentiment = blob.sentiment.polarity
+    sentiment = polarity(entry)
     keywords = detect_overthinking(entry)
     return sentiment,keywords
 
@@ -350,22 +362,35 @@ def to_embed_url(link):
 
 
 
-# Save journal entry
-def save_entry(entry, sentiment, keywords):
+# Journal and mood history of the logged-in user: their own partition of the storage
+def user_storage():
+    return get_storage().for_user(st.session_state.get("current_user"))
+
+def user_search_index():
+    return get_search_index(st.session_state.get("current_user"))
+
+# Persist journal entry (also called from analysis pool threads, so the
+# user's storage and search index are passed in rather than read from the session)
+@timed("storage.save_entry")
+def store_entry(storage, search_index, entry, sentiment, keywords):
     entry_data = {
         "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "entry": entry,
         "sentiment": sentiment,
         "keywords": ", ".join(keywords)
     }
-    df = pd.DataFrame([entry_data])
-    df.to_csv(JOURNAL_FILE, mode='a', header=not os.path.exists(JOURNAL_FILE), index=False)
+    entry_id = storage.save_entry(entry_data)
+    search_index.add(entry_id, entry_data)
 
-# Load past entries
-def load_entries():
-    if os.path.exists(JOURNAL_FILE):
-        return pd.read_csv(JOURNAL_FILE)
-    return pd.DataFrame(columns=["date", "entry", "sentiment", "keywords"])
+# Most frequent overthinking keywords (and pairs) for one week or month, read from the counters
+@timed("storage.load_top_triggers")
+def load_top_triggers(granularity, bucket):
+    return user_storage().load_top_triggers(granularity, bucket)
+
+# Load one page of saved entries, newest first
+@timed("storage.load_entries_page")
+def load_entries_page(page, page_size=JOURNAL_PAGE_SIZE):
+    return user_storage().load_entries_page(page * page_size, page_size)
 
 
 # Apply theme based on mood
@@ -395,6 +420,7 @@ def get_music_embed_link(mood):
 
 
 # ------- Setup ------- #
+rerun_timer.section("playlist + editor")
 st.title("🧠 Overthinker Journal Assistant")
 
 st.markdown("""
@@ -402,8 +428,6 @@ Write your thoughts and let the assistant gently reflect back what it sees.
 This is your safe space to process and breathe. 💬🫧
 """)
 
-ensure_journal_file()
-
 # Optional Spotify playlist customization
 st.subheader("🎵 Custom Playlist for Your Mood")
 user_playlist = st.text_input("Paste your Spotify Playlist Link")
@@ -420,9 +444,12 @@ if user_playlist:
 
 entry = st.text_area("✍️ Journal Entry:", height=200)
 
-# Live theme change while typing
+# Live theme change while typing (only new or edited sentences get re-scored)
+if "live_sentiment" not in st.session_state:
+    st.session_state.live_sentiment = IncrementalSentiment()
+
 if entry.strip():
-    live_sentiment, _ = analyze_entry(entry)
+    live_sentiment = st.session_state.live_sentiment.update(entry)
     if live_sentiment > 0.3:
         st.session_state.current_mood = "Positive"
     elif live_sentiment < -0.3:
@@ -441,9 +468,6 @@ def get_music_embed_link(mood):
     return playlists[index]
 
 
-def get_entry_hash(entry_text):
-    return hashlib.md5(entry_text.strip().encode()).hexdigest()
-
 # Helper function for mood label
 def get_mood_label(sentiment):
     if sentiment > 0.3:
@@ -453,67 +477,181 @@ def get_mood_label(sentiment):
     else:
         return "🙂"
 
-# 💾 Save Entry in session state
-def save_entry(entry, sentiment, keywords):
-    if 'journal_entries' not in st.session_state:
-        st.session_state.journal_entries = []
-
-    entry_hash = get_entry_hash(entry)
-    existing_hashes = [get_entry_hash(e['entry']) for e in st.session_state.journal_entries]
-
-    if entry_hash not in existing_hashes:
-        st.session_state.journal_entries.append({
-            "entry": entry,
-            "sentiment": sentiment,
-            "keywords": keywords,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M")
-        })
+# 🗑️ Delete a saved entry (on disk and from this session)
+@timed("storage.delete_entry")
+def delete_entry(journal):
+    # a stale CSV row number may have matched a different row: drop the one actually deleted
+    deleted = user_storage().delete_entry(journal)
+    if deleted is not None:
+        user_search_index().remove(deleted)
+    if 'journal_entries' in st.session_state:
+        saved = st.session_state.journal_entries.find_by_hash(get_entry_hash(journal["entry"]))
+        if saved is not None:
+            st.session_state.journal_entries.delete(saved["id"])
+
+
+# Analyze & Save: the analysis pool scores and saves the entry; this session
+# keeps the job and shows its result on the first rerun after it finishes
+def saved_this_session(entry):
+    # recent saves are in the session journal; older ones it dropped are looked up in storage
+    journal_entries = st.session_state.journal_entries
+    if entry in journal_entries:
+        return True
+    return journal_entries.evicted_since is not None and user_storage().has_entry(entry, journal_entries.evicted_since)
 
-# 🗑️ Delete entry by index
-def delete_entry(index):
-    if 'journal_entries' in st.session_state and 0 <= index < len(st.session_state.journal_entries):
-        del st.session_state.journal_entries[index]
+def submit_analysis(entry):
+    # this session already saved this text: score it again, don't save it twice
+    save = None if saved_this_session(entry) else partial(store_entry, user_storage(), user_search_index(), entry)
+    st.session_state.pending_analysis = {
+        "entry": entry,
+        "future": analysis_pool().submit(entry, save),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
 
+def show_analysis(sentiment, keywords):
+    st.subheader("🔍 Analysis Result")
+    if sentiment < -0.3 or keywords:
+        st.markdown("**💡 Gentle Insight:** It seems you're reflecting on something heavy or overthinking.")
+        if keywords:
+            st.markdown(f"**🧠 Keywords:** `{', '.join(keywords)}`")
+        st.markdown(f"**💬 Support:** _{random.choice(supportive_messages)}_")
+        st.markdown(f"**🪶 Prompt:** _{random.choice(positive_prompts)}_")
+    elif sentiment > 0.3:
+        st.success("🌟 You're in a good space! Keep that momentum!")
+    else:
+        st.info("🌀 Neutral tone detected. Every feeling is valid.")
+
+@st.fragment(run_every=0.5)
+def wait_for_analysis():
+    # reruns the page once the job is done (or late), so its result gets picked up
+    pending = st.session_state.get("pending_analysis")
+    if pending is None:
+        return
+    future = pending["future"]
+    # a late job that is already saving is waited for, not reported as timed out
+    if future.done() or (time.monotonic() > future.deadline and not future.job.saving):
+        st.rerun()
+    st.info("⏳ Analyzing your entry...")
 
-# Analyze & Save button
+rerun_timer.section("analyze & save")
 if st.button("📊 Analyze & Save"):
     if entry.strip() == "":
         st.warning("Please enter something before analyzing.")
+    elif "pending_analysis" in st.session_state:
+        st.info("Still analyzing your last entry, hang on a moment.")
+    else:
+        try:
+            submit_analysis(entry)
+        except AnalysisBusy:
+            st.warning("Lots of entries are being analyzed right now. Please try again in a moment.")
+
+pending_analysis = st.session_state.get("pending_analysis")
+if pending_analysis is not None:
+    try:
+        result = analysis_pool().poll(pending_analysis["future"])
+    except AnalysisTimeout:
+        del st.session_state.pending_analysis
+        st.error("⌛ Analyzing took too long. Please try again.")
+    except Exception as e:
+        del st.session_state.pending_analysis
+        st.error(f"Could not analyze and save your entry: {e}")
     else:
-        sentiment, keywords = analyze_entry(entry)
-
-        apply_mood_theme(sentiment)
-        save_entry(entry, sentiment, keywords)
-
-        # 🧠 Show Analysis
-        st.subheader("🔍 Analysis Result")
-        if sentiment < -0.3 or keywords:
-            st.markdown("**💡 Gentle Insight:** It seems you're reflecting on something heavy or overthinking.")
-            if keywords:
-                st.markdown(f"**🧠 Keywords:** `{', '.join(keywords)}`")
-            st.markdown(f"**💬 Support:** _{random.choice(supportive_messages)}_")
-            st.markdown(f"**🪶 Prompt:** _{random.choice(positive_prompts)}_")
-        elif sentiment > 0.3:
-            st.success("🌟 You're in a good space! Keep that momentum!")
+        if result is None:
+            wait_for_analysis()
         else:
-            st.info("🌀 Neutral tone detected. Every feeling is valid.")
+            del st.session_state.pending_analysis
+            sentiment, keywords = result
+            # the job saved it already; the session journal only needs to know
+            st.session_state.journal_entries.add(pending_analysis["entry"], sentiment, keywords,
+                                                 pending_analysis["timestamp"])
+            apply_mood_theme(sentiment)
+            show_analysis(sentiment, keywords)
+
+rerun_timer.section("top triggers")
+# 🧠 Top triggers this week / month (counters only, never the raw history)
+trigger_buckets = bucket_keys(datetime.now().strftime("%Y-%m-%d"))
+if load_top_triggers("month", trigger_buckets["month"])["entries"]:
+    st.markdown("---")
+    st.subheader("🧠 Your Top Triggers")
+    trigger_range = st.radio("Show:", ["This week", "This month"], horizontal=True, key="trigger_range")
+    granularity = "week" if trigger_range == "This week" else "month"
+    triggers = load_top_triggers(granularity, trigger_buckets[granularity])
+    if triggers["keywords"]:
+        for keyword, count in triggers["keywords"]:
+            st.progress(count / triggers["entries"], text=f"**{keyword}** · {count} of {triggers['entries']} entries")
+        if triggers["pairs"]:
+            together = ", ".join(f"{a} + {b} ({count})" for (a, b), count in triggers["pairs"])
+            st.caption(f"Often together: {together}")
+    else:
+        st.info(f"No overthinking keywords {trigger_range.lower()}. 🌿")
+
+rerun_timer.section("saved journals")
+# 📚 Saved journals: only the current page is loaded from disk (newest first)
+def show_journal(journal):
+    with st.expander(f"📝 {journal['date'][:16]}"):
+        st.write(journal["entry"])
+        st.markdown(f"**Mood:** {get_mood_label(journal['sentiment'])}")
+        if journal["keywords"]:
+            st.markdown(f"**🧠 Keywords:** `{journal['keywords']}`")
+        if st.button("🗑️ Delete Entry", key=f"delete_{journal['id']}"):
+            delete_entry(journal)
+            st.rerun()
+
+def page_controls(page_key, page_count, newer_label="⬅️ Newer", older_label="Older ➡️"):
+    if page_count <= 1:
+        return
+    newer_col, page_col, older_col = st.columns([1, 2, 1])
+    if newer_col.button(newer_label, key=f"{page_key}_newer", disabled=st.session_state[page_key] == 0):
+        st.session_state[page_key] -= 1
+        st.rerun()
+    page_col.markdown(
+        f"<center>Page {st.session_state[page_key] + 1} of {page_count}</center>",
+        unsafe_allow_html=True,
+    )
+    if older_col.button(older_label, key=f"{page_key}_older", disabled=st.session_state[page_key] >= page_count - 1):
+        st.session_state[page_key] += 1
+        st.rerun()
 
-        st.markdown("---")
-        st.subheader("📚 Your Saved Journals")
-for i, journal in enumerate(st.session_state.journal_entries[::-1]):  # show newest first
-            with st.expander(f"📝 {journal['timestamp']}"):
-                st.write(journal["entry"])
-                st.markdown(f"**Mood:** {get_mood_label(journal['sentiment'])}")
-                if journal["keywords"]:
-                    st.markdown(f"**🧠 Keywords:** `{', '.join(journal['keywords'])}`")
-                if st.button("🗑️ Delete Entry", key=f"delete_{i}"):
-                    delete_entry(len(st.session_state.journal_entries) - 1 - i)
-                    st.rerun()
+journal_count = user_storage().count_entries()
+if journal_count:
+    st.markdown("---")
+    st.subheader("📚 Your Saved Journals")
+
+    # 🔎 Search: words or "a phrase", optionally narrowed by mood and keyword
+    query_col, mood_col, keyword_col = st.columns([3, 1, 1])
+    search_query = query_col.text_input("🔎 Search your journals", key="journal_search", placeholder='words or "a phrase"')
+    search_mood = mood_col.selectbox("Mood", ["Any", *MOODS], key="journal_search_mood")
+    search_keyword = keyword_col.selectbox("Keyword", ["Any", *overthinking_keywords], key="journal_search_keyword")
+    search = (search_query.strip(), search_mood, search_keyword)
+    if search != st.session_state.get("journal_search_last"):
+        st.session_state.journal_search_last = search
+        st.session_state.journal_search_page = 0
+
+    if search != ("", "Any", "Any"):
+        with st.spinner("Searching..."):
+            match_count, results = user_search_index().search(
+                search_query,
+                mood=None if search_mood == "Any" else search_mood,
+                keyword=None if search_keyword == "Any" else search_keyword,
+                page=st.session_state.journal_search_page,
+            )
+        st.caption(f"{match_count} matching entr{'y' if match_count == 1 else 'ies'}")
+        for journal in results:
+            show_journal(journal)
+        page_controls("journal_search_page", (match_count + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE,
+                      "⬅️ Better matches", "More ➡️")
+    else:
+        page_count = (journal_count + JOURNAL_PAGE_SIZE - 1) // JOURNAL_PAGE_SIZE
+        st.session_state.journal_page = min(st.session_state.journal_page, page_count - 1)
+        for journal in load_entries_page(st.session_state.journal_page):
+            show_journal(journal)
+        page_controls("journal_page", page_count)
 
 
 
+# the text in the editor only picks the playlist; it is saved by Analyze & Save alone
 sentiment, keywords = analyze_entry(entry)
-save_entry(entry, sentiment, keywords)
+rerun_timer.section("playlist embed")
 # Determine mood from sentiment
 mood = "Positive" if sentiment > 0.1 else "Negative" if sentiment < -0.1 else "Neutral"
 
@@ -556,7 +694,6 @@ if playlist_list:
         st.rerun()
 
 
-MOOD_LOG_FILE = "mood_log.csv"
 # Mood mapping
 MOOD_SCORE_MAP = {
     "positive": 1,
@@ -641,28 +778,12 @@ mood_suggestions = {
 
 # Save mood
 def save_mood(sentiment):
-    today = pd.Timestamp.today().strftime('%Y-%m-%d')
-    new_entry = pd.DataFrame({"date": [today], "sentiment": [sentiment]})
-    
-    if os.path.exists(MOOD_LOG_FILE):
-        old = pd.read_csv(MOOD_LOG_FILE)
-        updated = pd.concat([old, new_entry], ignore_index=True)
-    else:
-        updated = new_entry
-
-    updated.to_csv(MOOD_LOG_FILE, index=False)
-
-# Load mood entries
-def load_entries():
-    if os.path.exists(MOOD_LOG_FILE):
-        return pd.read_csv(MOOD_LOG_FILE)
-    else:
-        return pd.DataFrame(columns=["date", "sentiment"])
+    today = datetime.now().strftime('%Y-%m-%d')
+    user_storage().save_mood_entry({"date": today, "text": "", "sentiment": sentiment})
 
 # Sentiment analyzer
 def analyze_sentiment(text):
-    analysis = TextBlob(text)
-    return round(analysis.sentiment.polarity, 2)
+    return round(polarity(text), 2)
 
 # --- Placeholder logic if you still want score detection ---
 def get_mood_category(score):
@@ -678,6 +799,7 @@ def get_mood_suggestions(score):
     return random.sample(mood_suggestions[mood], k=2), mood
 
 # --- UI Starts Here ---
+rerun_timer.section("mood logging")
 st.header("📝 How Are You Feeling Today?")
 
 # Manual mood selection using radio
@@ -703,6 +825,7 @@ if st.button("Show me something 💡"):
 
 
 # Function to save mood entry based on radio mood
+@timed("storage.save_mood_entry")
 def save_mood_entry(text, mood):
     score = MOOD_SCORE_MAP[mood]
     entry = {
@@ -710,19 +833,22 @@ def save_mood_entry(text, mood):
         "text": text,
         "sentiment": score
     }
-    if os.path.exists(MOOD_LOG_FILE):
-        existing = pd.read_csv(MOOD_LOG_FILE)
-        updated = pd.concat([existing, pd.DataFrame([entry])], ignore_index=True)
-    else:
-        updated = pd.DataFrame([entry])
-    updated.to_csv(MOOD_LOG_FILE, index=False)
+    user_storage().save_mood_entry(entry)
+
+# Auto-logged radio mood: written at once, repeats counted into the same row (updated on a change or after a while)
+@timed("storage.log_radio_mood")
+def log_radio_mood(mood):
+    return get_mood_coalescer().observe(user_storage(), "(Radio selection)", MOOD_SCORE_MAP[mood])
 
 # Function to load entries for graph
-def load_entries():
-    if os.path.exists(MOOD_LOG_FILE):
-        return pd.read_csv(MOOD_LOG_FILE)
-    else:
-        return pd.DataFrame(columns=["date", "text", "sentiment"])
+@timed("storage.load_mood_entries")
+def load_mood_entries(since=None):
+    return user_storage().load_mood_entries(since=since)
+
+# Pre-aggregated day/week/month averages for graph
+@timed("storage.load_mood_rollup")
+def load_mood_rollup(granularity, since=None):
+    return user_storage().load_mood_rollup(granularity, since=since)
 
 # === Auto Log Mood from Radio Button ===
 st.markdown("---")
@@ -731,26 +857,76 @@ st.subheader("📊 Your Mood Trend")
 # Save mood automatically when selected
 if selected_mood:
     mood_key = mood_map[selected_mood]
-    save_mood_entry(text="(Radio selection)", mood=mood_key)
-    st.success(f"Auto-logged: {mood_key} mood at {datetime.now().strftime('%H:%M:%S')}")
+    logged = log_radio_mood(mood_key)
+    since = f" (selected {logged['count']} times since {logged['first_seen']:%H:%M:%S})" if logged["count"] > 1 else ""
+    st.success(f"Auto-logged: {mood_key} mood at {logged['last_seen']:%H:%M:%S}{since}")
 
 
 # Reset mood history
 if st.button("🔁 Reset Mood History"):
-    if os.path.exists(MOOD_LOG_FILE):
-        os.remove(MOOD_LOG_FILE)
+    get_mood_coalescer().discard(user_storage())
+    if user_storage().clear_mood_log():
         st.success("Mood history cleared! Refresh to start again.")
+        rerun_timer.finish()
         st.stop()
 
-# Show graph
-history = load_entries()
-if not history.empty:
-    history["date"] = pd.to_datetime(history["date"])
-    history = history.sort_values("date")
-    st.line_chart(history.set_index("date")["sentiment"])
+rerun_timer.section("trend chart")
+# Show graph: raw points for short ranges, rollups for longer ones, never more than CHART_POINT_BUDGET points
+first_mood_day = user_storage().first_mood_day()
+if first_mood_day:
+    trend_range = st.radio("Show:", list(TREND_RANGES), index=1, horizontal=True, key="trend_range")
+    today = datetime.now().date()
+    range_days = TREND_RANGES[trend_range]
+    if range_days:
+        range_start = today - timedelta(days=range_days - 1)
+    else:
+        range_start = datetime.strptime(first_mood_day, "%Y-%m-%d").date()
+    granularity = pick_granularity((today - range_start).days + 1)
+    import pandas as pd
+
+    if granularity == "raw":
+        history = load_mood_entries(since=range_start.isoformat())
+        if not history.empty:
+            history["date"] = pd.to_datetime(history["date"])
+            history = history.sort_values("date")
+            history = downsample(history, "date", "sentiment")
+            st.line_chart(history.set_index("date")["sentiment"])
+    else:
+        history = load_mood_rollup(granularity, since=range_start.isoformat())
+        if not history.empty:
+            history["bucket"] = pd.to_datetime(history["bucket"])
+            history = downsample(history, "bucket", "mean")
+            st.line_chart(history.set_index("bucket")[["mean", "min", "max"]])
+            st.caption(f"Average mood per {granularity}, with the lowest and highest moments.")
+    if history.empty:
+        st.info("No mood entries in this range yet.")
 else:
     st.info("No mood entries yet. Select a mood to start tracking!")
 
+rerun_timer.section("backup")
+# 💾 Backup and restore: the download is only built when clicked, straight from storage,
+# though Streamlit holds the whole file in memory to serve it (backup.py --user streams)
+EXPORT_DATASETS = {"Journal": "journal", "Mood log": "mood_log"}
+with st.expander("💾 Back up or restore your journal"):
+    dataset_col, format_col = st.columns(2)
+    export_dataset = EXPORT_DATASETS[dataset_col.selectbox("Export", list(EXPORT_DATASETS), key="export_dataset")]
+    export_format = format_col.selectbox("Format", ["NDJSON", "CSV"], key="export_format").lower()
+    st.download_button(
+        "⬇️ Download",
+        data=partial(export_file, user_storage(), export_dataset, export_format),
+        file_name=export_name(export_dataset, export_format),
+        mime=EXPORT_MIME[export_format],
+        key="export_download",
+        on_click="ignore",
+    )
+    backup_file = st.file_uploader("Restore from a backup", type=["ndjson", "jsonl", "json", "csv"], key="import_file")
+    if backup_file is not None and st.button("⬆️ Import", key="import_start"):
+        with st.spinner("Importing..."):
+            report = import_file(user_storage(), backup_file)
+        st.success(report.summary())
+        for error in report.errors:
+            st.caption(error)
+
 
 
 st.markdown("<hr>", unsafe_allow_html=True)
@@ -758,3 +934,16 @@ st.markdown(
     "<center><sub>Made with ❤️ for your beautiful moods 💫</sub></center>",
     unsafe_allow_html=True,
 )
+
+# -------- Debug sidebar: where this rerun's time went --------
+rerun_timer.finish()
+if METRICS_ENABLED and st.sidebar.checkbox("Show rerun timings", key="show_rerun_timings"):
+    st.sidebar.text("\n".join(f"{label:<32}{ms:>8.1f} ms" for label, ms in rerun_timer.breakdown()))
+if METRICS_ENABLED and st.sidebar.checkbox("Show session memory", key="show_session_memory"):
+    # session journals of every open session in this server process
+    report = memory_report()
+    lines = [f"{'user':<14}{'entries':>8}{'dropped':>8}{'RAM KB':>9}"]
+    for footprint in [*report["sessions"][:20], dict(report["total"], owner=f"{report['total']['sessions']} sessions")]:
+        lines.append(f"{(footprint['owner'] or '-')[:13]:<14}{footprint['entries']:>8}{footprint['evicted']:>8}"
+                     f"{footprint['memory_bytes'] / 1024:>9.1f}")
+    st.sidebar.text("\n".join(lines))
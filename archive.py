@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+from datetime import date, datetime
+
+from storage import JOURNAL_FILE, MOOD_LOG_FILE, JOURNAL_COLUMNS, MOOD_COLUMNS, DB_FILE, user_partition_dir
+
+
+# Columnar history archive: one Parquet file per dataset and month.
+#   archive/journal/month=2024-03/part-0.parquet
+#   archive/mood_log/month=2024-03/part-0.parquet
+# and the same layout per user, under archive/users/<user partition>/.
+#
+# Only complete months are archived, for offline analytics: a query reads just
+# the partitions and columns it touches. The app itself never reads the archive.
+# It is a snapshot of the live storage at the time of the last convert, so
+# entries deleted since then are still in it until convert rebuilds it.
+#   python archive.py convert [journal|mood_log|all] [--user NAME] [--source csv|sqlite] [--through YYYY-MM-DD]
+#   python archive.py info [--user NAME]
+#   python archive.py query journal [--user NAME] --start 2024-01-01 --end 2024-04-01 --columns date,sentiment
+#
+# Needs pyarrow (optional in requirement.txt).
+
+ARCHIVE_DIR = os.environ.get("OJA_ARCHIVE_DIR", "archive")
+ARCHIVE_COMPRESSION = os.environ.get("OJA_ARCHIVE_COMPRESSION", "zstd")
+# Rows read from the source per chunk; each chunk becomes one row group per month
+ARCHIVE_CHUNK_ROWS = int(os.environ.get("OJA_ARCHIVE_CHUNK_ROWS", 100000))
+
+# dataset -> source CSV, SQLite table, columns and their types
+DATASETS = {
+    "journal": {
+        "csv": JOURNAL_FILE,
+        "table": "journal",
+        "columns": JOURNAL_COLUMNS,
+        "types": {"date": "string", "entry": "string", "sentiment": "float64", "keywords": "string"},
+    },
+    "mood_log": {
+        "csv": MOOD_LOG_FILE,
+        "table": "mood_log",
+        "columns": MOOD_COLUMNS,
+        "types": {"date": "string", "text": "string", "sentiment": "float64", "count": "int64", "last_seen": "string"},
+    },
+}
+
+
+class ArchiveUnavailable(RuntimeError):
+    pass
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+    except ImportError:
+        raise ArchiveUnavailable("the columnar archive needs pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+# -------- Layout --------
+def user_root(user, root=ARCHIVE_DIR):
+    # no user: the shared history from before per-user partitions
+    return os.path.join(root, "users", os.path.basename(user_partition_dir(user))) if user else root
+
+def dataset_dir(dataset, root=ARCHIVE_DIR):
+    return os.path.join(root, dataset)
+
+def partition_path(base, month):
+    return os.path.join(base, f"month={month}", "part-0.parquet")
+
+def partition_file(dataset, month, root=ARCHIVE_DIR):
+    return partition_path(dataset_dir(dataset, root), month)
+
+def read_meta(dataset, root=ARCHIVE_DIR):
+    path = os.path.join(dataset_dir(dataset, root), "_meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+def months(dataset, root=ARCHIVE_DIR):
+    meta = read_meta(dataset, root)
+    return meta["months"] if meta else []
+
+
+# -------- CSV / SQLite -> Parquet --------
+def source_chunks(dataset, source, chunk_rows, user=None):
+    import pandas as pd
+    spec = DATASETS[dataset]
+    if source == "csv":
+        path = os.path.join(user_partition_dir(user), spec["csv"]) if user else spec["csv"]
+        if not os.path.exists(path):
+            return
+        text_columns = {c: str for c, t in spec["types"].items() if t == "string"}
+        for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=text_columns):
+            # older mood logs have no text (or count, last_seen) column
+            yield chunk.reindex(columns=spec["columns"])
+    else:
+        from storage import SqliteStorage
+        storage = SqliteStorage(DB_FILE)
+        if not storage.is_migrated():
+            storage.migrate_from_csv()
+        conn = storage.connection()
+        sql = f"SELECT {', '.join(spec['columns'])} FROM {spec['table']} WHERE user = ? ORDER BY id"
+        yield from pd.read_sql_query(sql, conn, params=(user or "",), chunksize=chunk_rows)
+
+def convert(dataset, source=None, through=None, root=ARCHIVE_DIR, chunk_rows=ARCHIVE_CHUNK_ROWS,
+            compression=ARCHIVE_COMPRESSION, user=None):
+    # Rebuild one dataset's archive (of one user) from rows dated before `through`
+    # (default: the first day of the current month, so only complete months)
+    pa = require_pyarrow()
+    import pyarrow.parquet as pq
+    import pandas as pd
+
+    spec = DATASETS[dataset]
+    source = source or os.environ.get("OJA_STORAGE", "sqlite").lower()
+    through = through or date.today().replace(day=1).isoformat()
+    root = user_root(user, root)
+    arrow_types = {"string": pa.string(), "float64": pa.float64(), "int64": pa.int64()}
+    schema = pa.schema([(column, arrow_types[spec["types"][column]]) for column in spec["columns"]])
+
+    # write next to the live archive and swap it in only once every month made it
+    staging = dataset_dir(dataset, root) + ".staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    writers = {}
+    rows = 0
+    try:
+        for chunk in source_chunks(dataset, source, chunk_rows, user):
+            chunk = chunk.dropna(subset=["date"])
+            chunk["date"] = chunk["date"].astype(str)
+            chunk["sentiment"] = pd.to_numeric(chunk["sentiment"], errors="coerce")
+            if dataset == "mood_log":
+                # rows from before coalescing were each seen once, at their date
+                chunk["count"] = pd.to_numeric(chunk["count"], errors="coerce").fillna(1).astype("int64")
+                chunk["last_seen"] = chunk["last_seen"].fillna(chunk["date"]).astype(str)
+            chunk = chunk[chunk["date"] < through]
+            if chunk.empty:
+                continue
+            for month, group in chunk.groupby(chunk["date"].str[:7], sort=False):
+                writer = writers.get(month)
+                if writer is None:
+                    path = partition_path(staging, month)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writer = writers[month] = pq.ParquetWriter(path, schema, compression=compression)
+                writer.write_table(pa.Table.from_pandas(group, schema=schema, preserve_index=False))
+                rows += len(group)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    meta = {
+        "through": through,
+        "rows": rows,
+        "months": sorted(writers),
+        "source": source,
+        "compression": compression,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    os.makedirs(staging, exist_ok=True)
+    with open(os.path.join(staging, "_meta.json"), "w") as file:
+        json.dump(meta, file, indent=2)
+    live = dataset_dir(dataset, root)
+    old = live + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(live):
+        os.replace(live, old)
+    os.replace(staging, live)
+    shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+
+# -------- Range queries --------
+def read(dataset, columns=None, start=None, end=None, root=ARCHIVE_DIR, user=None):
+    # Archived rows with start <= date < end (ISO strings, either may be None).
+    # Months outside the range are never opened; inside them the date filter is
+    # pushed down to the row groups and only `columns` are decoded.
+    require_pyarrow()
+    import pyarrow.dataset as ds
+    import pandas as pd
+
+    root = user_root(user, root)
+    columns = list(columns or DATASETS[dataset]["columns"])
+    first = start[:7] if start else None
+    last = end[:7] if end else None
+    paths = [
+        partition_file(dataset, month, root) for month in months(dataset, root)
+        if (first is None or month >= first) and (last is None or month <= last)
+    ]
+    if not paths:
+        return pd.DataFrame(columns=columns)
+    condition = None
+    if start:
+        condition = ds.field("date") >= start
+    if end:
+        condition = ds.field("date") < end if condition is None else condition & (ds.field("date") < end)
+    table = ds.dataset(paths, format="parquet").to_table(columns=columns, filter=condition)
+    return table.to_pandas()
+
+# -------- CLI --------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Month-partitioned Parquet archive of journal and mood history")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert", help="rebuild the archive from the CSVs or the SQLite db")
+    convert_parser.add_argument("dataset", nargs="?", default="all", choices=[*DATASETS, "all"])
+    convert_parser.add_argument("--source", choices=["csv", "sqlite"], help="default: the OJA_STORAGE backend")
+    convert_parser.add_argument("--through", help="archive rows dated before this day (default: start of this month)")
+    info_parser = commands.add_parser("info", help="show what is archived")
+    query_parser = commands.add_parser("query", help="print rows in a date range")
+    query_parser.add_argument("dataset", choices=list(DATASETS))
+    for command in (convert_parser, info_parser, query_parser):
+        command.add_argument("--user", help="one user's history (default: the shared history)")
+    query_parser.add_argument("--start")
+    query_parser.add_argument("--end")
+    query_parser.add_argument("--columns", help="comma-separated column list")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "convert":
+            for dataset in (DATASETS if args.dataset == "all" else [args.dataset]):
+                meta = convert(dataset, source=args.source, through=args.through, user=args.user)
+                print(f"{dataset}: {meta['rows']} rows in {len(meta['months'])} months (before {meta['through']})")
+        elif args.command == "info":
+            root = user_root(args.user)
+            for dataset in DATASETS:
+                meta = read_meta(dataset, root)
+                if meta is None:
+                    print(f"{dataset}: not archived")
+                    continue
+                size = sum(os.path.getsize(partition_file(dataset, m, root)) for m in meta["months"])
+                span = f"{meta['months'][0]}..{meta['months'][-1]}" if meta["months"] else "empty"
+                print(f"{dataset}: {meta['rows']} rows, {span}, {size} bytes ({meta['compression']}), "
+                      f"from {meta['source']} at {meta['created']}")
+        else:
+            columns = args.columns.split(",") if args.columns else None
+            print(read(args.dataset, columns, args.start, args.end, user=args.user).to_string(index=False))
+    except ArchiveUnavailable as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
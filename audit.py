@@ -0,0 +1,95 @@
+import os
+import sys
+import queue
+import atexit
+import threading
+import time
+
+from storage import get_storage
+
+
+# Login attempts are queued and written in batches by one background thread,
+# so a login request never waits on the audit log file.
+AUDIT_BATCH_SIZE = int(os.environ.get("OJA_AUDIT_BATCH_SIZE", 100))
+AUDIT_FLUSH_SECONDS = float(os.environ.get("OJA_AUDIT_FLUSH_SECONDS", 1.0))
+AUDIT_QUEUE_SIZE = int(os.environ.get("OJA_AUDIT_QUEUE_SIZE", 10000))
+
+
+class AuditSink:
+    def __init__(self, write_batch, batch_size=AUDIT_BATCH_SIZE, flush_seconds=AUDIT_FLUSH_SECONDS,
+                 queue_size=AUDIT_QUEUE_SIZE):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="login-audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, attempt):
+        if self._closed:
+            self.write_batch([attempt])
+            return
+        # blocks only if the writer has fallen a whole queue behind
+        self._queue.put(attempt)
+
+    def flush(self, timeout=None):
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, markers, stop = [], [], False
+            deadline = time.monotonic() + self.flush_seconds
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if stop or markers or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.write_batch(batch)
+                    self.written += len(batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    print(f"login audit: could not write {len(batch)} attempts: {e}", file=sys.stderr)
+            for marker in markers:
+                marker.set()
+            if stop:
+                return
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+def get_audit_sink():
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = AuditSink(get_storage().log_login_attempts)
+    return _sink
@@ -0,0 +1,333 @@
+import io
+import os
+import sys
+import csv
+import json
+import heapq
+import argparse
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from storage import JOURNAL_COLUMNS, MOOD_COLUMNS, get_storage
+from journal_store import get_entry_hash
+
+
+# Streaming backup and restore of one user's journal and mood log.
+#   python backup.py export journal --user NAME [--format ndjson|csv] [-o journal.ndjson]
+#   python backup.py import journal.ndjson --user NAME
+#
+# Export is a generator of encoded chunks read straight off the storage
+# cursor, so the CLI never holds the history as a whole. The in-app download
+# can't stream: Streamlit reads the whole export into memory (O(file)) when the
+# button is clicked, and serves it from there. Import reads the file a
+# line at a time, validates every row, skips the ones already saved (same
+# entry hash) and writes the rest IMPORT_BATCH_ROWS at a time.
+
+DATASETS = {"journal": JOURNAL_COLUMNS, "mood_log": MOOD_COLUMNS}
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_MIME = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows encoded per chunk of an export
+EXPORT_CHUNK_ROWS = int(os.environ.get("OJA_EXPORT_CHUNK_ROWS", 1000))
+# Rows handed to the storage backend per write during an import
+IMPORT_BATCH_ROWS = int(os.environ.get("OJA_IMPORT_BATCH_ROWS", 1000))
+# Rejected rows listed in an import report; the rest are only counted
+IMPORT_MAX_ERRORS = 20
+
+
+# -------- Export --------
+def iter_rows(storage, dataset):
+    # oldest first, with the dataset's columns only
+    if dataset == "journal":
+        for journal in storage.iter_entries():
+            yield {column: journal[column] for column in JOURNAL_COLUMNS}
+    else:
+        yield from storage.iter_mood_entries()
+
+def export_chunks(storage, dataset, fmt="ndjson", chunk_rows=EXPORT_CHUNK_ROWS):
+    # UTF-8 bytes, chunk_rows rows at a time. NDJSON rows carry their dataset,
+    # so a journal and a mood log export can be concatenated into one file.
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=DATASETS[dataset])
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(json.dumps({"dataset": dataset, **row}, ensure_ascii=False))
+            buffer.write("\n")
+    for count, row in enumerate(iter_rows(storage, dataset), start=1):
+        write(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+class ChunkReader(io.RawIOBase):
+    # Read-only file over a generator of byte chunks. st.download_button calls
+    # export_file on click and read()s it whole into its media store, so the
+    # in-app export costs memory for the whole file; only the CLI streams.
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # only "rewind" before the first read, which download_button does
+        if offset == 0 and whence == io.SEEK_SET and self._position == 0:
+            return 0
+        raise io.UnsupportedOperation("ChunkReader can only be read forward")
+
+    def readinto(self, buffer):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        self._position += n
+        return n
+
+    def readall(self):
+        data = b"".join([self._pending, *self._chunks])
+        self._pending = memoryview(b"")
+        self._position += len(data)
+        return data
+
+def export_file(storage, dataset, fmt="ndjson"):
+    return ChunkReader(export_chunks(storage, dataset, fmt))
+
+def export_name(dataset, fmt):
+    return f"oja-{dataset.replace('_', '-')}-{datetime.now().strftime('%Y-%m-%d')}.{fmt}"
+
+
+# -------- Import: validation --------
+def check_date(value):
+    # kept as written (the app writes both dates and date-times); any ISO form is accepted
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("missing date")
+    try:
+        datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"bad date {value!r}") from None
+    return value.strip()
+
+def check_sentiment(value):
+    try:
+        sentiment = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"bad sentiment {value!r}") from None
+    if not -1.0 <= sentiment <= 1.0:  # also rejects NaN
+        raise ValueError(f"sentiment {value!r} outside -1..1")
+    return sentiment
+
+def clean_journal_row(record):
+    entry = record.get("entry")
+    if not isinstance(entry, str) or not entry.strip():
+        raise ValueError("empty entry")
+    sentiment, keywords = record.get("sentiment"), record.get("keywords")
+    if sentiment in (None, "") or keywords is None:
+        # plain diaries without scores get the same analysis as Analyze & Save
+        from sentiment import polarity
+        from overthinking import detect_overthinking
+        if sentiment in (None, ""):
+            sentiment = polarity(entry)
+        if keywords is None:
+            keywords = detect_overthinking(entry)
+    if not isinstance(keywords, str):
+        keywords = ", ".join(str(keyword) for keyword in keywords)
+    return {"date": check_date(record.get("date")), "entry": entry,
+            "sentiment": check_sentiment(sentiment), "keywords": keywords}
+
+def check_count(value):
+    try:
+        count = int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"bad count {value!r}") from None
+    if count < 1:
+        raise ValueError(f"count {value!r} below 1")
+    return count
+
+def clean_mood_row(record):
+    text = record.get("text") or ""
+    if not isinstance(text, str):
+        raise ValueError("text must be a string")
+    date = check_date(record.get("date"))
+    # backups from before coalescing have neither column: one selection, seen at its date
+    count, last_seen = record.get("count"), record.get("last_seen")
+    return {"date": date, "text": text, "sentiment": check_sentiment(record.get("sentiment")),
+            "count": check_count(count) if count not in (None, "") else 1,
+            "last_seen": check_date(last_seen) if last_seen not in (None, "") else date}
+
+CLEANERS = {"journal": clean_journal_row, "mood_log": clean_mood_row}
+
+def dataset_of(record):
+    dataset = record.get("dataset") or ("journal" if "entry" in record else "mood_log")
+    if dataset not in DATASETS:
+        raise ValueError(f"unknown dataset {dataset!r}")
+    return dataset
+
+
+# -------- Import: duplicates --------
+def row_hash(dataset, row):
+    # 64 bits of the entry hash (the same one the session journal dedupes on);
+    # mood rows are identified by their date, text and score
+    if dataset == "journal":
+        key = row["entry"]
+    else:
+        key = f"{row['date']}|{row['text']}|{float(row['sentiment'])}"
+    return int(get_entry_hash(key)[:16], 16)
+
+class SeenHashes:
+    # 64-bit row hashes: a sorted array (8 bytes per row) plus a set of the
+    # newest ones, merged in once it grows past an eighth of the array
+    def __init__(self, hashes=()):
+        self._sorted = array("Q", sorted(hashes))
+        self._recent = set()
+
+    def __contains__(self, key):
+        if key in self._recent:
+            return True
+        i = bisect_left(self._sorted, key)
+        return i < len(self._sorted) and self._sorted[i] == key
+
+    def add(self, key):
+        self._recent.add(key)
+        if len(self._recent) > max(IMPORT_BATCH_ROWS, len(self._sorted) // 8):
+            self._sorted = array("Q", heapq.merge(self._sorted, sorted(self._recent)))
+            self._recent = set()
+
+
+# -------- Import: reading and writing --------
+def detect_format(file, name=None):
+    name = (name or getattr(file, "name", "") or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    head = file.read(64)
+    file.seek(0)
+    return "ndjson" if head.lstrip().startswith(b"{") else "csv"
+
+def read_records(file, fmt):
+    # (line number, record dict or the ValueError explaining why it isn't one)
+    text = io.TextIOWrapper(file, encoding="utf-8", errors="replace", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    yield number, ValueError("not valid JSON")
+                    continue
+                yield number, record if isinstance(record, dict) else ValueError("not a JSON object")
+    finally:
+        # hand the file back open; closing it is the caller's business
+        text.detach()
+
+class ImportReport:
+    def __init__(self):
+        self.saved = {dataset: 0 for dataset in DATASETS}
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    def reject(self, number, reason):
+        self.invalid += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(f"line {number}: {reason}")
+
+    def summary(self):
+        return (f"Imported {self.saved['journal']} journal entries and {self.saved['mood_log']} moods; "
+                f"skipped {self.duplicates} already saved and {self.invalid} invalid rows.")
+
+def import_file(storage, file, fmt=None, batch_rows=IMPORT_BATCH_ROWS):
+    # file: a binary file object (an upload or an open file); read once, front to back
+    fmt = fmt or detect_format(file)
+    report = ImportReport()
+    seen = {}
+    batches = {dataset: [] for dataset in DATASETS}
+
+    def flush(dataset):
+        if batches[dataset]:
+            save = storage.save_entries if dataset == "journal" else storage.save_mood_entries
+            report.saved[dataset] += save(batches[dataset])
+            batches[dataset] = []
+
+    for number, record in read_records(file, fmt):
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            dataset = dataset_of(record)
+            row = CLEANERS[dataset](record)
+        except ValueError as e:
+            report.reject(number, e)
+            continue
+        hashes = seen.get(dataset)
+        if hashes is None:
+            # what this user already has, loaded the first time the file mentions the dataset
+            hashes = seen[dataset] = SeenHashes(row_hash(dataset, r) for r in iter_rows(storage, dataset))
+        key = row_hash(dataset, row)
+        if key in hashes:
+            report.duplicates += 1
+            continue
+        if dataset == "journal":
+            # the same text twice is one entry, as in the session journal; identical
+            # mood rows are legitimate (one score per day, logged more than once)
+            hashes.add(key)
+        batches[dataset].append(row)
+        if len(batches[dataset]) >= batch_rows:
+            flush(dataset)
+    for dataset in DATASETS:
+        flush(dataset)
+    return report
+
+
+# -------- CLI --------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a user's journal or mood log out to a file, or back in")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write one dataset as NDJSON or CSV")
+    export_parser.add_argument("dataset", choices=list(DATASETS))
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    export_parser.add_argument("-o", "--output", help="default: stdout")
+    import_parser = commands.add_parser("import", help="validate, dedupe and save a backup")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=EXPORT_FORMATS, help="default: from the file name or contents")
+    for command in (export_parser, import_parser):
+        command.add_argument("--user", help="whose history (default: the shared history)")
+    args = parser.parse_args(argv)
+
+    storage = get_storage().for_user(args.user)
+    if args.command == "export":
+        output = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for chunk in export_chunks(storage, args.dataset, args.format):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+        return 0
+    with open(args.file, "rb") as file:
+        report = import_file(storage, file, args.format)
+    print(report.summary())
+    for error in report.errors:
+        print(f"  {error}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Rerun latency, memory and file-growth benchmark for app.py, driven headlessly
+# through streamlit.testing.v1.AppTest against generated histories.
+#   python bench.py                                    # 1k and 100k rows, table
+#   python bench.py --rows 1000 100000 1000000 --sessions 8
+#   python bench.py --save bench_baseline.json         # record a baseline
+#   python bench.py --compare bench_baseline.json      # exit code 1 on regression
+#
+# Every history size runs in a fresh interpreter and an empty directory, so
+# peak RSS and file growth belong to that size alone.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, "app.py")
+
+DEFAULT_ROWS = [1000, 100000]
+FLOWS = ["login", "analyze", "mood", "chart", "concurrent"]
+
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench-password"
+
+# A flow regresses when its latency grows by more than this fraction and by at least MIN_SLOWDOWN_MS
+TOLERANCE = 0.25
+MIN_SLOWDOWN_MS = 20
+
+SAMPLE_ENTRIES = [
+    "Had a calm morning walk and felt grateful for the quiet.",
+    "I keep overthinking what I said yesterday and can't sleep.",
+    "Work was stressful but dinner with friends was lovely.",
+    "Feeling stuck and a bit alone, nothing seems to go right.",
+    "Great day! Finished the project and celebrated.",
+]
+
+
+def run_child(rows, args):
+    # Run one history size in a fresh interpreter and return the JSON it prints
+    # every login flow signs in the same user from the same client: keep the throttle out of the way
+    env = dict(os.environ, OJA_STORAGE=args.backend,
+               OJA_LOGIN_LIMIT_PER_USER=str(10 ** 9), OJA_LOGIN_LIMIT_PER_CLIENT=str(10 ** 9))
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", str(rows),
+         "--iterations", str(args.iterations), "--sessions", str(args.sessions), "--backend", args.backend],
+        capture_output=True, text=True, env=env, cwd=tempfile.mkdtemp(prefix="oja-bench-"),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "child failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# -------- Generated history (child side) --------
+def generate_history(rows):
+    from storage import (USERS_FILE, JOURNAL_FILE, MOOD_LOG_FILE, USER_COLUMNS, JOURNAL_COLUMNS, MOOD_COLUMNS,
+                         ensure_user_partition)
+
+    rng = random.Random(rows)
+    start = datetime.now() - timedelta(days=3 * 365)
+    step = timedelta(days=3 * 365) / rows
+
+    def dates():
+        for i in range(rows):
+            yield (start + step * i).strftime("%Y-%m-%d %H:%M:%S")
+
+    with open(USERS_FILE, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=USER_COLUMNS)
+        writer.writeheader()
+        writer.writerow({"username": BENCH_USER, "password": BENCH_PASSWORD})
+    # the bench user's own partition; the SQLite backend imports it on first start
+    partition = ensure_user_partition(BENCH_USER)
+    with open(os.path.join(partition, JOURNAL_FILE), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(JOURNAL_COLUMNS)
+        for i, date in enumerate(dates()):
+            writer.writerow([date, f"{rng.choice(SAMPLE_ENTRIES)} (#{i})", round(rng.uniform(-1, 1), 3), "overthinking, alone"])
+    with open(os.path.join(partition, MOOD_LOG_FILE), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(MOOD_COLUMNS)
+        for date in dates():
+            writer.writerow([date, "(Radio selection)", rng.choice([-1, 0, 1]), 1, date])
+
+def data_sizes():
+    from storage import get_storage, SqliteStorage
+    storage = get_storage()
+    if isinstance(storage, SqliteStorage):
+        # fold the WAL back into the database so growth shows up in oja.db itself
+        storage.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    sizes = {}
+    for directory, _, names in os.walk("."):
+        for name in names:
+            if not name.endswith(".lock"):
+                path = os.path.normpath(os.path.join(directory, name))
+                sizes[path] = os.path.getsize(path)
+    return sizes
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# -------- Flows (child side) --------
+def timed(latencies, app):
+    started = time.perf_counter()
+    app.run()
+    latencies.append((time.perf_counter() - started) * 1000)
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+
+def new_session(logged_in=True):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_FILE, default_timeout=300)
+    if logged_in:
+        app.session_state["logged_in"] = True
+        app.session_state["current_user"] = BENCH_USER
+        app.session_state["show_login"] = True
+    app.run()
+    return app
+
+def find(widgets, label):
+    return next(w for w in widgets if label in w.label)
+
+def flow_login(latencies):
+    app = new_session(logged_in=False)
+    app.text_input(key="username").input(BENCH_USER)
+    app.text_input(key="password").input(BENCH_PASSWORD)
+    timed(latencies, app)
+    if not app.session_state["logged_in"]:
+        raise RuntimeError("login failed")
+
+def flow_analyze(app, latencies, i):
+    find(app.text_area, "Journal Entry").input(f"{SAMPLE_ENTRIES[i % len(SAMPLE_ENTRIES)]} ({time.time_ns()})")
+    find(app.button, "Analyze & Save").click()
+    timed(latencies, app)
+    # the analysis pool scores and saves in the background; the next rerun picks the result up
+    if "pending_analysis" in app.session_state:
+        app.session_state["pending_analysis"]["future"].result(timeout=60)
+        app.run()
+
+def flow_mood(app, latencies, i):
+    radio = find(app.radio, "Choose your mood")
+    radio.set_value(radio.options[i % len(radio.options)])
+    timed(latencies, app)
+
+def flow_chart(app, latencies, i):
+    radio = app.radio(key="trend_range")
+    radio.set_value(radio.options[i % len(radio.options)])
+    timed(latencies, app)
+
+def serialize_script_parsing():
+    # AppTest re-parses app.py on every run, and ast.parse from several threads
+    # at once can fail on CPython 3.11 ("AST constructor recursion depth mismatch").
+    # Only the parse is serialized; the reruns themselves still overlap.
+    from streamlit.runtime.scriptrunner import magic
+
+    add_magic = magic.add_magic
+    parse_lock = threading.Lock()
+
+    def locked_add_magic(code, script_path):
+        with parse_lock:
+            return add_magic(code, script_path)
+    magic.add_magic = locked_add_magic
+
+def run_concurrent(sessions, iterations):
+    # Each simulated user gets its own AppTest (its own session) on its own thread
+    latencies, errors = [], []
+    lock = threading.Lock()
+    serialize_script_parsing()
+
+    def user(n):
+        mine = []
+        try:
+            app = new_session()
+            for i in range(iterations):
+                (flow_analyze, flow_mood, flow_chart)[(n + i) % 3](app, mine, i)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise RuntimeError(errors[0])
+    return latencies
+
+def measure(rows, iterations, sessions):
+    sys.path.insert(0, APP_DIR)
+    started = time.perf_counter()
+    generate_history(rows)
+    setup = {"generate_s": time.perf_counter() - started}
+
+    # first session pays for the storage migration, rollups and the sentiment warm-up
+    started = time.perf_counter()
+    app = new_session()
+    setup["warmup_s"] = time.perf_counter() - started
+    before = data_sizes()
+
+    latencies = {flow: [] for flow in FLOWS}
+    for i in range(iterations):
+        flow_login(latencies["login"])
+        flow_analyze(app, latencies["analyze"], i)
+        flow_mood(app, latencies["mood"], i)
+        flow_chart(app, latencies["chart"], i)
+    if sessions:
+        latencies["concurrent"] = run_concurrent(sessions, iterations)
+
+    # the coalescer's open rows go out through the write queue, so it closes first
+    from mood_coalescer import get_mood_coalescer
+    from writer import get_write_queue
+    get_mood_coalescer().close()
+    get_write_queue().close()
+    after = data_sizes()
+    growth = {name: size - before.get(name, 0) for name, size in after.items() if size != before.get(name, 0)}
+    return {
+        "rows": rows,
+        "setup": setup,
+        "latency_ms": latencies,
+        "peak_rss_mb": peak_rss_mb(),
+        "file_growth_bytes": growth,
+    }
+
+
+# -------- Report (parent side) --------
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+def summarize(result):
+    flows = {}
+    for flow, values in result["latency_ms"].items():
+        if values:
+            flows[flow] = {"n": len(values), "p50": round(percentile(values, 0.5), 1), "p99": round(percentile(values, 0.99), 1)}
+    rss = result["peak_rss_mb"]
+    return {
+        "flows": flows,
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "file_growth_bytes": sum(result["file_growth_bytes"].values()),
+        "file_growth": result["file_growth_bytes"],
+        "setup_s": {k: round(v, 2) for k, v in result["setup"].items()},
+    }
+
+def report(summaries):
+    print(f"{'rows':>9}  {'flow':<11}{'n':>5}{'p50 ms':>10}{'p99 ms':>10}")
+    for rows, summary in summaries.items():
+        for flow, stats in summary["flows"].items():
+            print(f"{rows:>9}  {flow:<11}{stats['n']:>5}{stats['p50']:>10.1f}{stats['p99']:>10.1f}")
+        print(f"{rows:>9}  peak RSS {summary['peak_rss_mb']} MB, files grew {summary['file_growth_bytes']} bytes, "
+              f"setup {summary['setup_s']}")
+
+def compare(summaries, baseline):
+    # Latency checks p50 and p99; memory and file growth use the same tolerance
+    regressions = []
+    for rows, summary in summaries.items():
+        base = baseline.get("results", {}).get(rows)
+        if base is None:
+            continue
+        for flow, stats in summary["flows"].items():
+            old = base["flows"].get(flow)
+            if old is None:
+                continue
+            for key in ("p50", "p99"):
+                if stats[key] > old[key] * (1 + TOLERANCE) and stats[key] - old[key] >= MIN_SLOWDOWN_MS:
+                    regressions.append(f"{rows} rows {flow} {key}: {old[key]} -> {stats[key]} ms")
+        for key, unit in (("peak_rss_mb", "MB"), ("file_growth_bytes", "bytes")):
+            old, new = base.get(key), summary.get(key)
+            if old and new and new > old * (1 + TOLERANCE):
+                regressions.append(f"{rows} rows {key}: {old} -> {new} {unit}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AppTest-driven load test and benchmark for app.py")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="history sizes to generate")
+    parser.add_argument("--iterations", type=int, default=20, help="reruns per flow")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions (0 to skip)")
+    parser.add_argument("--backend", default=os.environ.get("OJA_STORAGE", "sqlite"), help="storage backend")
+    parser.add_argument("--save", help="write the results to this baseline file")
+    parser.add_argument("--compare", help="compare against this baseline file, exit code 1 on regression")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child, args.iterations, args.sessions)))
+        return 0
+
+    summaries = {}
+    for rows in args.rows:
+        print(f"running {rows} rows ...", file=sys.stderr)
+        summaries[str(rows)] = summarize(run_child(rows, args))
+    report(summaries)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(summaries, json.load(file))
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if not regressions:
+            print(f"no regressions against {args.compare}")
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({
+                "backend": args.backend,
+                "iterations": args.iterations,
+                "sessions": args.sessions,
+                "results": summaries,
+            }, file, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import os
+import sys
+import hashlib
+import weakref
+
+
+# Metadata kept in memory per session, at most this many bytes; the oldest
+# entries are dropped first and looked up in storage instead
+SESSION_JOURNAL_BUDGET = int(os.environ.get("OJA_SESSION_JOURNAL_BUDGET", 64 * 1024))
+
+
+def get_entry_hash(entry_text):
+    return hashlib.md5(entry_text.strip().encode()).hexdigest()
+
+
+# -------- Session journal store --------
+# What this session has saved, for the duplicate check and for deletes:
+# entries keyed by id in insertion order plus a hash -> id index, so saving,
+# the duplicate check, lookup and delete are all O(1). Only metadata is kept,
+# within the byte budget; the text lives in the user's storage and is never
+# held here. evicted_since is the timestamp of the oldest entry dropped, so
+# callers know from when on storage has to be asked instead.
+_stores = weakref.WeakSet()
+
+class JournalStore:
+    def __init__(self, owner="", budget=SESSION_JOURNAL_BUDGET):
+        self.owner = owner
+        self.budget = budget
+        self.evicted = 0
+        self.evicted_since = None
+        self._meta = {}                # id -> (hash, sentiment, keywords, timestamp), oldest first
+        self._by_hash = {}
+        self._next_id = 1
+        self._meta_bytes = 0
+        _stores.add(self)
+
+    def __len__(self):
+        return len(self._meta)
+
+    def __contains__(self, entry_text):
+        return get_entry_hash(entry_text) in self._by_hash
+
+    def add(self, entry, sentiment, keywords, timestamp):
+        # Returns the new entry id, or None if the same text is already saved
+        entry_hash = get_entry_hash(entry)
+        if entry_hash in self._by_hash:
+            return None
+        entry_id = self._next_id
+        self._next_id += 1
+        meta = (entry_hash, sentiment, tuple(map(sys.intern, keywords)), timestamp)
+        self._meta[entry_id] = meta
+        self._meta_bytes += record_size(meta)
+        self._by_hash[entry_hash] = entry_id
+        while self._meta_bytes > self.budget and len(self._meta) > 1:
+            self._evict()
+        return entry_id
+
+    def _evict(self):
+        oldest = next(iter(self._meta))
+        timestamp = self._meta[oldest][3]
+        self.delete(oldest)
+        self.evicted += 1
+        if self.evicted_since is None:
+            self.evicted_since = timestamp
+
+    def get(self, entry_id):
+        meta = self._meta.get(entry_id)
+        if meta is None:
+            return None
+        entry_hash, sentiment, keywords, timestamp = meta
+        return {
+            "id": entry_id,
+            "hash": entry_hash,
+            "sentiment": sentiment,
+            "keywords": list(keywords),
+            "timestamp": timestamp,
+        }
+
+    def find_by_hash(self, entry_hash):
+        entry_id = self._by_hash.get(entry_hash)
+        return None if entry_id is None else self.get(entry_id)
+
+    def delete(self, entry_id):
+        meta = self._meta.pop(entry_id, None)
+        if meta is None:
+            return False
+        del self._by_hash[meta[0]]
+        self._meta_bytes -= record_size(meta)
+        return True
+
+    def footprint(self):
+        return {"owner": self.owner, "entries": len(self._meta), "evicted": self.evicted,
+                "memory_bytes": self._meta_bytes}
+
+
+def record_size(meta):
+    # rough in-memory size of one metadata record; keyword strings are interned and shared
+    return sys.getsizeof(meta) + sum(map(sys.getsizeof, meta))
+
+def memory_report():
+    # footprint of every live session journal in this process, largest first, and their sum
+    sessions = sorted((store.footprint() for store in list(_stores)), key=lambda f: -f["memory_bytes"])
+    total = {key: sum(f[key] for f in sessions) for key in ("entries", "evicted", "memory_bytes")}
+    return {"sessions": sessions, "total": dict(total, sessions=len(sessions))}
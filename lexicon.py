@@ -0,0 +1,192 @@
+import os
+import re
+import sys
+import json
+import threading
+from array import array
+
+from writer import atomic_write
+
+
+# Array-backed port of TextBlob's pattern sentiment scorer.
+#
+# The word list is compiled from the lexicon TextBlob ships (en-sentiment.xml,
+# plus the "-ly" adverbs TextBlob derives from its adjectives) into
+# LEXICON_FILE, which is checked in next to this module:
+#   python lexicon.py        # recompile after upgrading textblob
+# Scoring needs neither TextBlob nor nltk: a word is one dict lookup for its
+# index into flat arrays of polarity, intensity and modifier flags.
+#
+# Scores follow TextBlob's rules (intensifiers multiply the next word,
+# negations flip it at half strength, "!" boosts the word before it) with
+# one deliberate difference: "don't", "isn't" ... negate here, while
+# TextBlob's tokenizer splits them into "do n ' t" and ignores the negation.
+
+LEXICON_FILE = os.environ.get(
+    "OJA_LEXICON_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sentiment_lexicon.json")
+)
+# Bump when the compiled format changes; older files are recompiled
+LEXICON_VERSION = 1
+
+NEGATIONS = ("no", "not", "n't", "never")
+PUNCTUATION = ".,;:!?()[]{}`'\"@#$^&*+-|=~_"
+# "!" after a word makes it this much stronger
+EXCLAMATION_BOOST = 1.25
+
+
+# -------- Compiling from TextBlob --------
+def compile_lexicon():
+    from importlib.metadata import version
+    from textblob.en import sentiment
+    from textblob._text import EMOTICONS
+
+    len(sentiment)  # lazydict: loads en-sentiment.xml
+    words = sorted(dict.keys(sentiment))
+    polarity, intensity, modifier = [], [], []
+    for word in words:
+        senses = dict.__getitem__(sentiment, word)
+        p, _, i = senses[None]
+        polarity.append(p)
+        intensity.append(i)
+        # TextBlob treats a word as an intensifier if any of its senses is an adverb
+        modifier.append(int("RB" in senses))
+    # TextBlob only matches emoticons that are short and not plain words
+    emoticons = {
+        face.lower(): p
+        for (_, p), faces in EMOTICONS.items() for face in faces
+        if not face.isalpha() and len(face) <= 5 and face not in PUNCTUATION
+    }
+    return {
+        "version": LEXICON_VERSION,
+        "source": f"textblob {version('textblob')}",
+        "words": words,
+        "polarity": polarity,
+        "intensity": intensity,
+        "modifier": modifier,
+        "emoticons": emoticons,
+    }
+
+
+def save_lexicon(data, path=LEXICON_FILE):
+    with atomic_write(path) as file:
+        json.dump(data, file)
+
+
+# -------- Scoring --------
+def clamp(value):
+    return max(-1.0, min(value, 1.0))
+
+class Lexicon:
+    def __init__(self, data):
+        self.source = data["source"]
+        self.ids = {word: i for i, word in enumerate(data["words"])}
+        self.polarity = array("d", data["polarity"])
+        self.intensity = array("d", data["intensity"])
+        self.modifier = array("B", data["modifier"])
+        self.emoticons = data["emoticons"]
+        faces = "|".join(re.escape(face) for face in sorted(self.emoticons, key=len, reverse=True))
+        # emoticons standing alone, "(!)", "...", "do" + "n't", "'s", words, any other symbol
+        self._token_re = re.compile(
+            (rf"(?<!\S)(?:{faces})(?!\S)|" if faces else "")
+            + r"\(!\)|\.\.\.|\w+(?=n't)|n't|'\w+|\w+(?:-\w+)*|\S"
+        )
+
+    @classmethod
+    def load(cls, path=LEXICON_FILE):
+        # the compiled file if it is current, otherwise compile and (best effort) save it
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("version") == LEXICON_VERSION:
+                return cls(data)
+        data = compile_lexicon()
+        try:
+            save_lexicon(data, path)
+        except OSError:
+            pass
+        return cls(data)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def tokenize(self, text):
+        return self._token_re.findall(text.lower())
+
+    def assessments(self, tokens):
+        # polarity of every sentiment-bearing token, after modifiers and negations
+        ids, polarity, intensity, modifier = self.ids, self.polarity, self.intensity, self.modifier
+        scores = []      # [polarity, intensity, negated]
+        m = n = None     # preceding modifier / negation
+        for token in tokens:
+            i = ids.get(token)
+            if i is not None:
+                if m is None:
+                    scores.append([polarity[i], intensity[i], False])
+                else:
+                    # "very happy": the modifier's entry takes the word's polarity, scaled
+                    last = scores[-1]
+                    last[0] = clamp(polarity[i] * last[1])
+                    last[1] = intensity[i]
+                if n is not None:
+                    # "not very good" is weaker than "good", not stronger
+                    last = scores[-1]
+                    last[1] = 1.0 / last[1] if last[1] else 0.0
+                    last[2] = True
+                m = token if modifier[i] else None
+                n = token if token in NEGATIONS else None
+                continue
+            if token in NEGATIONS:
+                n = token
+            elif n is not None and len(token.strip("'")) > 1:
+                n = None
+            if n is not None and m is not None and m.endswith("ly"):
+                # "really not good": the negation belongs to the adverb before it
+                scores[-1][2] = True
+                n = None
+            elif m is not None and len(token) > 2:
+                m = None
+            if token == "!" and scores:
+                scores[-1][0] = clamp(scores[-1][0] * EXCLAMATION_BOOST)
+            elif token == "(!)":
+                scores.append([0.0, 1.0, False])
+            else:
+                face = self.emoticons.get(token)
+                if face is not None:
+                    scores.append([face, 1.0, False])
+        return [p * -0.5 if negated else p for p, _, negated in scores]
+
+    def score(self, text):
+        # (polarity, number of assessments), polarity the mean over assessments
+        scores = self.assessments(self.tokenize(text))
+        return (sum(scores) / len(scores) if scores else 0.0), len(scores)
+
+    def score_many(self, texts):
+        tokenize, assessments = self.tokenize, self.assessments
+        result = []
+        for text in texts:
+            scores = assessments(tokenize(text))
+            result.append(sum(scores) / len(scores) if scores else 0.0)
+        return result
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+def get_lexicon():
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                _lexicon = Lexicon.load()
+    return _lexicon
+
+
+def main():
+    data = compile_lexicon()
+    save_lexicon(data)
+    print(f"{LEXICON_FILE}: {len(data['words'])} words, {len(data['emoticons'])} emoticons from {data['source']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import os
+import sys
+import time
+import atexit
+import threading
+from contextlib import nullcontext
+from functools import wraps
+
+
+# Per-rerun timing spans, aggregated into histograms and exported as Prometheus text.
+#   OJA_METRICS=1                  turn timing on (off by default: every hook is a no-op)
+#   OJA_METRICS_FILE=metrics.prom  file rewritten every OJA_METRICS_INTERVAL seconds
+#   OJA_METRICS_PORT=9464          also serve the same text at http://localhost:9464/metrics
+METRICS_ENABLED = os.environ.get("OJA_METRICS", "").lower() not in ("", "0", "false", "no")
+METRICS_FILE = os.environ.get("OJA_METRICS_FILE", "metrics.prom")
+METRICS_INTERVAL = float(os.environ.get("OJA_METRICS_INTERVAL", 15))
+METRICS_PORT = int(os.environ.get("OJA_METRICS_PORT", 0))
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# -------- Process-wide histograms --------
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.total += seconds
+        self.count += 1
+
+class Registry:
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+            self.version += 1
+
+    def render(self):
+        lines = [
+            "# HELP oja_span_seconds Time spent in one section or function of an app.py rerun.",
+            "# TYPE oja_span_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._histograms):
+                histogram = self._histograms[name]
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'oja_span_seconds_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'oja_span_seconds_sum{{span="{label}"}} {histogram.total:.6f}')
+                lines.append(f'oja_span_seconds_count{{span="{label}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+# -------- Export: text file and optional /metrics endpoint --------
+class Exporter:
+    def __init__(self, registry, path=METRICS_FILE, interval=METRICS_INTERVAL, port=METRICS_PORT):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._written = -1
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, name="metrics-exporter", daemon=True).start()
+        atexit.register(self.close)
+        if port:
+            self._serve(port)
+
+    def write(self):
+        from writer import atomic_write
+        version = self.registry.version
+        if version == self._written:
+            return
+        try:
+            with atomic_write(self.path) as file:
+                file.write(self.registry.render())
+            self._written = version
+        except OSError as e:
+            print(f"metrics: could not write {self.path}: {e}", file=sys.stderr)
+
+    def close(self):
+        self._stop.set()
+        self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def _serve(self, port):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        except OSError as e:
+            # another server process already serves the endpoint
+            print(f"metrics: port {port} unavailable: {e}", file=sys.stderr)
+            return
+        threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = Registry()
+                Exporter(registry)
+                _registry = registry
+    return _registry
+
+
+# -------- Spans within one rerun --------
+# A rerun runs start to finish on one script thread, so the current timer is thread-local
+_current = threading.local()
+
+class RerunTimer:
+    # Sections are laps through the script (each one ends where the next starts);
+    # spans are timed functions called inside them
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = []  # (name, depth, seconds)
+        self._section = None
+        self._depth = 0
+        self.finished = False
+
+    def section(self, name):
+        now = time.perf_counter()
+        self._close_section(now)
+        self._section = (name, now, len(self.rows))
+        self.rows.append((name, 0, 0.0))
+
+    def _close_section(self, now):
+        if self._section is not None:
+            name, started, row = self._section
+            self.rows[row] = (name, 0, now - started)
+            get_registry().observe("section:" + name, now - started)
+            self._section = None
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def finish(self):
+        if self.finished:
+            return
+        now = time.perf_counter()
+        self._close_section(now)
+        self.finished = True
+        get_registry().observe("rerun", now - self.started)
+
+    def breakdown(self):
+        # [(label, milliseconds)] in script order, function spans indented under their section
+        return [("  " * depth + name, seconds * 1000) for name, depth, seconds in self.rows]
+
+class _Span:
+    # timer is None outside a rerun (background threads): only the histogram is updated
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        timer = self.timer
+        if timer is not None:
+            timer._depth += 1
+            self._row = len(timer.rows)
+            timer.rows.append((self.name, timer._depth, 0.0))
+        self._started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._started
+        timer = self.timer
+        if timer is not None:
+            timer.rows[self._row] = (self.name, timer._depth, seconds)
+            timer._depth -= 1
+        get_registry().observe(self.name, seconds)
+
+class _NullTimer:
+    finished = True
+
+    def section(self, name):
+        pass
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def finish(self):
+        pass
+
+    def breakdown(self):
+        return []
+
+_NULL_SPAN = nullcontext()
+_NULL_TIMER = _NullTimer()
+
+
+def start_rerun():
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    _current.timer = RerunTimer()
+    return _current.timer
+
+def span(name):
+    # Time a block inside the current rerun (or on its own outside of one)
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    timer = getattr(_current, "timer", None)
+    return _Span(timer if timer is not None and not timer.finished else None, name)
+
+def timed(name):
+    # Decorator form of span(); leaves the function untouched when timing is off
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import atexit
+import threading
+from datetime import datetime
+
+
+# The radio mood is auto-logged on every rerun, so any click on the page would
+# log it again. Repeats of the same mood by the same user are collapsed into
+# one open row (count, last seen). The row is written as soon as it opens, so
+# the chart shows the selection right away, and its count and last seen are
+# updated in place once it closes: when the user picks a different mood, or
+# when MOOD_COALESCE_SECONDS have passed since it opened (a background thread
+# closes expired rows; the rest are closed at exit).
+MOOD_COALESCE_SECONDS = float(os.environ.get("OJA_MOOD_COALESCE_SECONDS", 300))
+
+
+class MoodCoalescer:
+    def __init__(self, window=MOOD_COALESCE_SECONDS):
+        self.window = window
+        self.observed = 0
+        self.written = 0
+        self.updated = 0
+        self._open = {}   # user -> open row
+        self._changed = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="mood-coalescer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def observe(self, storage, text, sentiment):
+        # Logs one selection for storage's user; returns that user's open row
+        now = datetime.now()
+        with self._changed:
+            self.observed += 1
+            row = self._open.get(storage.user)
+            if row is not None and row["text"] == text and row["sentiment"] == sentiment \
+                    and time.monotonic() < row["expires"]:
+                row["count"] += 1
+                row["last_seen"] = now
+                return dict(row)
+            closed = self._open.pop(storage.user, None)
+            row = self._open[storage.user] = {
+                "storage": storage, "text": text, "sentiment": sentiment, "count": 1,
+                "first_seen": now, "last_seen": now, "expires": time.monotonic() + self.window,
+                "handle": None, "lock": threading.Lock(),
+            }
+            # held until the row is written, so closing it waits for its handle
+            row["lock"].acquire()
+            self._changed.notify()
+        try:
+            if closed is not None:
+                self._close_row(closed)
+            row["handle"] = storage.save_mood_entry(self._entry(row))
+            with self._changed:
+                self.written += 1
+        finally:
+            row["lock"].release()
+        return dict(row)
+
+    def discard(self, storage):
+        # Drops storage's user's open row unwritten (their mood history was just cleared)
+        with self._changed:
+            self._open.pop(storage.user, None)
+
+    def flush(self):
+        # Closes every open row now
+        with self._changed:
+            rows, self._open = list(self._open.values()), {}
+        for row in rows:
+            self._close_row(row)
+
+    def close(self):
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+        self._thread.join(5.0)
+        self.flush()
+
+    @staticmethod
+    def _entry(row):
+        return {
+            "date": row["first_seen"].strftime("%Y-%m-%d %H:%M:%S"),
+            "text": row["text"],
+            "sentiment": row["sentiment"],
+            "count": row["count"],
+            "last_seen": row["last_seen"].strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def _close_row(self, row):
+        # the row was written with count 1 when it opened; only repeats need an update
+        with row["lock"]:
+            if row["handle"] is None or row["count"] == 1:
+                return
+            with self._changed:
+                entry = self._entry(row)
+            row["storage"].update_mood_entry(row["handle"], entry)
+        with self._changed:
+            self.updated += 1
+
+    def _run(self):
+        # writes rows whose window ran out, waking at the next expiry
+        while True:
+            with self._changed:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                expired = [user for user, row in self._open.items() if row["expires"] <= now]
+                rows = [self._open.pop(user) for user in expired]
+                if not rows:
+                    next_expiry = min((row["expires"] for row in self._open.values()), default=None)
+                    self._changed.wait(None if next_expiry is None else next_expiry - now)
+                    continue
+            for row in rows:
+                try:
+                    self._close_row(row)
+                except Exception as e:
+                    print(f"mood coalescer: could not update a mood row: {e}", file=sys.stderr)
+
+    def stats(self):
+        with self._changed:
+            return {"observed": self.observed, "written": self.written, "updated": self.updated,
+                    "open": len(self._open)}
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+def get_mood_coalescer():
+    global _coalescer
+    if _coalescer is None:
+        with _coalescer_lock:
+            if _coalescer is None:
+                _coalescer = MoodCoalescer()
+    return _coalescer
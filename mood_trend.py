@@ -0,0 +1,175 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+
+from writer import file_signature
+
+
+GRANULARITIES = ("day", "week", "month")
+
+# Max points sent to st.line_chart, whatever the history length
+CHART_POINT_BUDGET = int(os.environ.get("OJA_CHART_POINT_BUDGET", 500))
+
+# Ranges offered above the trend chart: label -> days back (None = all history)
+TREND_RANGES = {
+    "Last 7 days": 7,
+    "Last 30 days": 30,
+    "Last 90 days": 90,
+    "Last year": 365,
+    "All time": None,
+}
+
+ROLLUP_COLUMNS = ["bucket", "count", "mean", "min", "max"]
+
+
+# -------- Buckets --------
+def bucket_keys(date):
+    # day, week (starting Monday) and month buckets for a "YYYY-MM-DD[ HH:MM:SS]" date
+    day = datetime.strptime(str(date)[:10], "%Y-%m-%d").date()
+    return {
+        "day": day.isoformat(),
+        "week": (day - timedelta(days=day.weekday())).isoformat(),
+        "month": day.replace(day=1).isoformat(),
+    }
+
+def pick_granularity(span_days):
+    if span_days <= 14:
+        return "raw"
+    if span_days <= 120:
+        return "day"
+    if span_days <= 730:
+        return "week"
+    return "month"
+
+
+# -------- Rollups kept next to a CSV mood log --------
+class MoodRollups:
+    # {granularity: {bucket: [count, total, low, high]}}, saved as a small JSON file.
+    # Writers hold the mood log's file lock; the file is re-read whenever another
+    # server process has replaced it since this one last read or wrote it.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._buckets = None
+        self._signature = None
+
+    def _load(self):
+        signature = file_signature(self.path)
+        if self._buckets is None or signature != self._signature:
+            if signature is not None:
+                with open(self.path) as file:
+                    self._buckets = json.load(file)
+            else:
+                self._buckets = {g: {} for g in GRANULARITIES}
+            self._signature = signature
+        return self._buckets
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _add(self, buckets, date, sentiment):
+        try:
+            keys = bucket_keys(date)
+            sentiment = float(sentiment)
+        except (TypeError, ValueError):
+            return
+        if sentiment != sentiment:  # NaN
+            return
+        for granularity, key in keys.items():
+            stats = buckets[granularity].get(key)
+            if stats is None:
+                buckets[granularity][key] = [1, sentiment, sentiment, sentiment]
+            else:
+                stats[0] += 1
+                stats[1] += sentiment
+                stats[2] = min(stats[2], sentiment)
+                stats[3] = max(stats[3], sentiment)
+
+    def add(self, date, sentiment):
+        self.add_many([(date, sentiment)])
+
+    def add_many(self, rows):
+        # rows: iterable of (date, sentiment); one file write per batch
+        with self._lock:
+            buckets = self._load()
+            for date, sentiment in rows:
+                self._add(buckets, date, sentiment)
+            self._save()
+
+    def rebuild(self, rows):
+        # rows: iterable of (date, sentiment)
+        with self._lock:
+            buckets = {g: {} for g in GRANULARITIES}
+            for date, sentiment in rows:
+                self._add(buckets, date, sentiment)
+            self._buckets = buckets
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {g: {} for g in GRANULARITIES}
+            self._signature = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self._buckets, file)
+        os.replace(tmp_path, self.path)
+        self._signature = file_signature(self.path)
+
+    def first_day(self):
+        with self._lock:
+            days = self._load()["day"]
+            return min(days) if days else None
+
+    def frame(self, granularity, since=None):
+        import pandas as pd
+        with self._lock:
+            items = sorted(self._load()[granularity].items())
+        rows = [
+            (bucket, count, total / count, low, high)
+            for bucket, (count, total, low, high) in items
+            if since is None or bucket >= since
+        ]
+        return pd.DataFrame(rows, columns=ROLLUP_COLUMNS)
+
+
+# -------- Shape-preserving downsampling --------
+def lttb(xs, ys, threshold):
+    # Largest-Triangle-Three-Buckets: indices of the points to keep
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    keep = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        # average of the next bucket is the third triangle corner
+        if end < next_end:
+            avg_x = sum(xs[end:next_end]) / (next_end - end)
+            avg_y = sum(ys[end:next_end]) / (next_end - end)
+        else:
+            avg_x, avg_y = xs[n - 1], ys[n - 1]
+        best, best_area = start, -1.0
+        for j in range(start, min(end, n - 1)):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
+
+def downsample(frame, x_col, y_col, threshold=CHART_POINT_BUDGET):
+    if len(frame) <= threshold:
+        return frame
+    import pandas as pd
+    xs = pd.to_datetime(frame[x_col]).astype("int64").tolist()
+    ys = frame[y_col].astype(float).tolist()
+    return frame.iloc[lttb(xs, ys, threshold)]
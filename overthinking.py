@@ -0,0 +1,101 @@
+from collections import deque
+
+
+# Overthinking keyword list
+overthinking_keywords = [
+    "always", "never", "can't","not", "should have", "why", "again", "mess", "ruined",
+    "everything", "nothing", "failed", "hate", "hopeless", "worthless","sad","what if",
+    "maybe i should have","i can't stop thinking about", "why did i","what will they think",
+    "i always mess things up","what is it goes wrong?", "did i say something wrong?","i need to be sure",
+    "past","future","every time","doubt","anxious","nervous","insecure","guilt","fear","regret",
+    "embarrassed","shame","panic","die","depressed","depression","low","without","alone","weak","confusion","confuse",
+    "remember","i wonder","left","defeat","destroy","disappointed","disappointment","end","loser"
+]
+
+
+def is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+# -------- Aho–Corasick automaton --------
+# Built once from the phrase list; matching is a single pass over the text,
+# however many phrases there are.
+class KeywordMatcher:
+    def __init__(self, phrases, whole_words=True):
+        self.phrases = []
+        self.whole_words = whole_words
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for phrase in phrases:
+            phrase = phrase.lower()
+            if not phrase or phrase in self.phrases:
+                continue
+            self.phrases.append(phrase)
+            self._add(phrase, len(self.phrases) - 1)
+        self._build_failure_links()
+
+    def _add(self, phrase, index):
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(index)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def _on_boundary(self, text, start, end, phrase):
+        if is_word_char(phrase[0]) and start > 0 and is_word_char(text[start - 1]):
+            return False
+        if is_word_char(phrase[-1]) and end < len(text) and is_word_char(text[end]):
+            return False
+        return True
+
+    def finditer(self, text, whole_words=None):
+        # Yields (start, end, phrase); positions index into text.lower()
+        whole_words = self.whole_words if whole_words is None else whole_words
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                phrase = self.phrases[index]
+                start = i + 1 - len(phrase)
+                if whole_words and not self._on_boundary(text, start, i + 1, phrase):
+                    continue
+                yield start, i + 1, phrase
+
+    def find_all(self, text, whole_words=None):
+        return sorted(self.finditer(text, whole_words))
+
+    def matched(self, text, whole_words=None):
+        # Distinct phrases found, in lexicon order
+        found = {phrase for _, _, phrase in self.finditer(text, whole_words)}
+        return [phrase for phrase in self.phrases if phrase in found]
+
+
+overthinking_matcher = KeywordMatcher(overthinking_keywords)
+
+
+# Detect overthinking keywords
+def detect_overthinking(text):
+    return overthinking_matcher.matched(text)
@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from storage import (JOURNAL_FILE, DB_FILE, PARTITION_OWNER_FILE, SqliteStorage, CsvStorage, CsvRowIndex,
+                     csv_partitions)
+from writer import file_lock
+from sentiment import polarity_many
+from overthinking import detect_overthinking
+
+
+# Re-score the whole journal history with the current sentiment and keyword logic.
+#   python rescore.py                         # backend from OJA_STORAGE (sqlite by default)
+#   python rescore.py --source csv --workers 8      # the shared journal and every user partition
+#   python rescore.py --source csv --file journal_db.csv
+# The trigger counters are rebuilt from the new keywords, and the journal
+# generation is bumped so running app servers rebuild their search indexes.
+
+
+# Same scoring as analyze_entry in app.py, minus Streamlit; a batch at a
+# time so the sentiment backend scores every entry in one call
+def score_batch(entries):
+    return list(zip(polarity_many(entries), (", ".join(detect_overthinking(entry)) for entry in entries)))
+
+def score_chunk(pool, entries, workers):
+    size = max(1, len(entries) // (workers * 4))
+    batches = [entries[i:i + size] for i in range(0, len(entries), size)]
+    return [score for batch in pool.map(score_batch, batches) for score in batch]
+
+
+class Progress:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.done = 0
+
+    def update(self, count):
+        self.done += count
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        print(f"\rrescored {self.done:,} entries ({rate:,.0f} entries/s)", end="", file=sys.stderr, flush=True)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        print(f"\ndone: {self.done:,} entries in {elapsed:.1f}s ({rate:,.0f} entries/s)", file=sys.stderr)
+
+
+# -------- CSV journal --------
+def file_identity(path):
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino
+
+def rescore_csv(path, pool, workers, chunk_size, progress=None):
+    progress = progress or Progress()
+    if not os.path.exists(path):
+        print(f"{path} not found", file=sys.stderr)
+        return progress
+    tmp_path = path + ".rescore"
+    try:
+        while True:
+            # rescore the rows that exist now; anything the app appends meanwhile is carried over at the end
+            index = CsvRowIndex(path)
+            with file_lock(path):
+                total = index.refresh()
+                snapshot_end = index.indexed_bytes
+                identity = file_identity(path)
+            first = True
+            done = 0
+            for chunk in pd.read_csv(path, chunksize=chunk_size, nrows=total, dtype={"entry": str, "keywords": str}):
+                entries = chunk["entry"].fillna("").tolist()
+                scores = score_chunk(pool, entries, workers)
+                chunk["sentiment"] = [score for score, _ in scores]
+                chunk["keywords"] = [keywords for _, keywords in scores]
+                chunk.to_csv(tmp_path, mode="w" if first else "a", header=first, index=False)
+                first = False
+                done += len(chunk)
+                progress.update(len(chunk))
+            if first:
+                return progress  # header only, nothing to rewrite
+            # swap in the rescored file only once every chunk made it, and only if the
+            # rows it was made from are still there: a delete rewrites the whole file
+            with file_lock(path):
+                if file_identity(path) == identity and os.path.getsize(path) >= snapshot_end:
+                    with open(path, "rb") as src, open(tmp_path, "ab") as dst:
+                        src.seek(snapshot_end)
+                        dst.write(src.read())
+                    os.replace(tmp_path, path)
+                    return progress
+            print(f"\n{path} was rewritten while rescoring it; starting over", file=sys.stderr)
+            progress.update(-done)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def csv_partition_of(path):
+    # the CsvStorage a journal file belongs to: the shared one in the working
+    # directory, or the user partition whose owner file sits next to it
+    path = os.path.realpath(path)
+    if os.path.basename(path) != JOURNAL_FILE:
+        return None
+    directory = os.path.dirname(path)
+    if directory == os.path.realpath(os.getcwd()):
+        return CsvStorage()
+    owner = os.path.join(directory, PARTITION_OWNER_FILE)
+    if not os.path.exists(owner):
+        return None
+    with open(owner) as file:
+        return CsvStorage(directory, file.read())
+
+
+# -------- SQLite journal --------
+def rescore_sqlite(db_path, pool, workers, chunk_size):
+    progress = Progress()
+    conn = SqliteStorage(db_path).connection()
+    last_id = 0
+    # one transaction per chunk, so the app's writer is never locked out for longer than a chunk
+    while True:
+        rows = conn.execute(
+            "SELECT id, entry FROM journal WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            break
+        scores = score_chunk(pool, [entry or "" for _, entry in rows], workers)
+        with conn:
+            conn.executemany(
+                "UPDATE journal SET sentiment = ?, keywords = ? WHERE id = ?",
+                [(score, keywords, row_id) for (row_id, _), (score, keywords) in zip(rows, scores)],
+            )
+        last_id = rows[-1][0]
+        progress.update(len(rows))
+    # the trigger counters were counted from the old keywords
+    storage = SqliteStorage(db_path)
+    for (user,) in conn.execute("SELECT DISTINCT user FROM journal").fetchall():
+        storage.for_user(user).rebuild_trigger_counts()
+    storage.bump_journal_generation()
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score journal history with the current sentiment and keyword logic.")
+    parser.add_argument("--source", choices=["csv", "sqlite"], default=os.environ.get("OJA_STORAGE", "sqlite").lower())
+    parser.add_argument("--file", help="one journal CSV (csv source; default: all of them)")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database (sqlite source)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        if args.source == "csv":
+            progress = Progress()
+            # the shared journal and every partition, with the trigger counters kept next to each
+            paths = [args.file] if args.file else [
+                path for path in [JOURNAL_FILE, *(os.path.join(d, JOURNAL_FILE) for _, d in csv_partitions())]
+                if os.path.exists(path)
+            ]
+            for path in paths:
+                rescore_csv(path, pool, args.workers, args.chunk_size, progress)
+                storage = csv_partition_of(path)
+                if storage is None:
+                    print(f"\n{path} is not a journal the app reads; no counters to rebuild", file=sys.stderr)
+                    continue
+                storage.rebuild_trigger_counts()
+                storage.bump_journal_generation()
+        else:
+            progress = rescore_sqlite(args.db, pool, args.workers, args.chunk_size)
+    progress.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import os
+import re
+import math
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from storage import get_storage
+
+
+# Results shown per page of journal search
+SEARCH_PAGE_SIZE = int(os.environ.get("OJA_SEARCH_PAGE_SIZE", 10))
+# Per-user indexes kept in memory at once
+SEARCH_INDEX_CACHE = int(os.environ.get("OJA_SEARCH_INDEX_CACHE", 32))
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# "quoted phrase" or a bare word
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Same thresholds as the mood label next to each saved journal
+MOODS = ("positive", "neutral", "negative")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+def parse_query(query):
+    # (terms, phrases): every term and every phrase must match
+    terms, phrases = [], []
+    for phrase, word in QUERY_RE.findall(query):
+        tokens = tokenize(phrase if phrase else word)
+        if len(tokens) > 1:
+            phrases.append(tokens)
+        terms.extend(tokens)
+    return terms, phrases
+
+
+# -------- Live docs of a renumbering backend --------
+class LiveDocs:
+    # Fenwick tree over docs, 1 per live doc. CSV ids are row numbers and docs
+    # are added in row order, so a live doc's storage id is its rank among the
+    # live docs: a delete shifts every later id in O(log n), nothing is rewritten.
+    def __init__(self):
+        self._tree = [0]   # 1-based
+        self.count = 0
+
+    def append(self):
+        n = len(self._tree)
+        low = n & -n
+        # tree[n] covers docs n - low + 1 .. n; all but the new one are already counted
+        self._tree.append(1 + self._prefix(n - 1) - self._prefix(n - low))
+        self.count += 1
+
+    def remove(self, doc):
+        i = doc + 1
+        while i < len(self._tree):
+            self._tree[i] -= 1
+            i += i & -i
+        self.count -= 1
+
+    def _prefix(self, i):
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def rank(self, doc):
+        # storage id of a live doc
+        return self._prefix(doc + 1)
+
+    def select(self, rank):
+        # the live doc with this storage id, or None
+        if not 1 <= rank <= self.count:
+            return None
+        i, step = 0, 1 << (len(self._tree).bit_length())
+        while step:
+            if i + step < len(self._tree) and self._tree[i + step] < rank:
+                i += step
+                rank -= self._tree[i]
+            step >>= 1
+        return i
+
+
+# -------- Inverted index over journal entries --------
+# Internal doc ids only ever grow, so every postings list stays sorted and the
+# per-doc columns are plain arrays indexed by doc. Storage ids are mapped
+# separately: a dict for stable ids, LiveDocs for CSV row numbers, which shift
+# after a delete. Queries run on numpy views of these arrays (numpy is
+# imported on the first search).
+class SearchIndex:
+    def __init__(self, storage):
+        self.storage = storage
+        self.renumbers = getattr(storage, "renumbers_on_delete", False)
+        self._lock = threading.RLock()
+        self._built = False
+        self._generation = None
+        self._clear()
+
+    def _clear(self):
+        self._vocab = {}                 # token -> token id
+        self._postings = {}              # token id -> (doc ids, term frequencies)
+        self._keywords = {}              # overthinking keyword -> doc ids
+        self._tokens = []                # doc -> token ids as bytes (phrases, removal); None once deleted
+        self._lengths = array("I")       # doc -> number of tokens
+        self._sentiment = array("d")     # doc -> sentiment
+        self._storage_of = array("q")    # doc -> storage id as added, -1 once deleted
+        self._doc_of = {}                # storage id -> doc (stable ids)
+        self._live = LiveDocs()          # storage id <-> doc (row numbers)
+        self._total_length = 0
+
+    def __len__(self):
+        return self._live.count if self.renumbers else len(self._doc_of)
+
+    def _doc(self, storage_id):
+        return self._live.select(storage_id) if self.renumbers else self._doc_of.get(storage_id)
+
+    def _storage_id(self, doc):
+        return self._live.rank(doc) if self.renumbers else self._storage_of[doc]
+
+    # -------- Building and updating --------
+    def build(self):
+        with self._lock:
+            self._clear()
+            # read first: a rewrite that lands while building is picked up on the next search
+            self._generation = self.storage.journal_generation()
+            for journal in self.storage.iter_entries():
+                self._add(journal["id"], journal)
+            self._built = True
+
+    def ensure_built(self):
+        # also picks up rows another server process wrote since the last build,
+        # and rows rewritten in place by a rescore (see journal_generation)
+        with self._lock:
+            if (not self._built or self.storage.count_entries() != len(self)
+                    or self.storage.journal_generation() != self._generation):
+                self.build()
+
+    def add(self, storage_id, entry_data):
+        # Called after every save; before the first search the build reads it from storage anyway
+        with self._lock:
+            if not self._built or self._doc(storage_id) is not None:
+                return
+            if self.renumbers and storage_id != len(self) + 1:
+                self._built = False  # rows we never saw came first: read them all on the next search
+                return
+            self._add(storage_id, entry_data)
+
+    def _add(self, storage_id, entry_data):
+        doc = len(self._tokens)
+        token_ids = array("I")
+        counts = {}
+        for token in tokenize(entry_data.get("entry") or ""):
+            token_id = self._vocab.get(token)
+            if token_id is None:
+                token_id = self._vocab[token] = len(self._vocab)
+            token_ids.append(token_id)
+            counts[token_id] = counts.get(token_id, 0) + 1
+        for token_id, count in counts.items():
+            postings = self._postings.get(token_id)
+            if postings is None:
+                postings = self._postings[token_id] = (array("I"), array("I"))
+            postings[0].append(doc)
+            postings[1].append(count)
+        keywords = entry_data.get("keywords") or ""
+        if not isinstance(keywords, str):
+            keywords = ", ".join(keywords)
+        for keyword in set(filter(None, (k.strip().lower() for k in keywords.split(",")))):
+            self._keywords.setdefault(keyword, array("I")).append(doc)
+        try:
+            sentiment = float(entry_data.get("sentiment") or 0.0)
+        except (TypeError, ValueError):
+            sentiment = 0.0
+        self._tokens.append(token_ids.tobytes())
+        self._lengths.append(len(token_ids))
+        self._sentiment.append(sentiment)
+        self._storage_of.append(storage_id)
+        if self.renumbers:
+            self._live.append()
+        else:
+            self._doc_of[storage_id] = doc
+        self._total_length += len(token_ids)
+
+    def remove(self, storage_id):
+        with self._lock:
+            if not self._built:
+                return
+            doc = self._doc(storage_id)
+            if doc is None:
+                return
+            if self.renumbers:
+                self._live.remove(doc)
+            else:
+                del self._doc_of[storage_id]
+            token_ids = array("I")
+            token_ids.frombytes(self._tokens[doc])
+            for token_id in set(token_ids):
+                docs, counts = self._postings[token_id]
+                i = bisect_left(docs, doc)
+                del docs[i]
+                del counts[i]
+                if not docs:
+                    del self._postings[token_id]
+            for docs in self._keywords.values():
+                i = bisect_left(docs, doc)
+                if i < len(docs) and docs[i] == doc:
+                    del docs[i]
+            self._total_length -= self._lengths[doc]
+            self._tokens[doc] = None
+            self._lengths[doc] = 0
+            self._storage_of[doc] = -1
+
+    # -------- Queries --------
+    def search(self, query="", mood=None, keyword=None, page=0, page_size=SEARCH_PAGE_SIZE):
+        # (number of matches, journal rows for the requested page), best match first
+        self.ensure_built()
+        with self._lock:
+            total, storage_ids = self._search(query, mood, keyword, page, page_size)
+        return total, self.storage.load_entries_by_ids(storage_ids)
+
+    def _search(self, query, mood, keyword, page, page_size):
+        import numpy as np
+
+        def column(values, dtype):
+            # copy, so the arrays can keep growing while the result is in use
+            return np.frombuffer(values, dtype=dtype).copy() if len(values) else np.zeros(0, dtype=dtype)
+
+        terms, phrases = parse_query(query)
+        token_ids = []
+        for term in terms:
+            token_id = self._vocab.get(term)
+            if token_id is None or token_id not in self._postings:
+                return 0, []
+            token_ids.append(token_id)
+        # rarest term first keeps every intersection small
+        unique = sorted(set(token_ids), key=lambda t: len(self._postings[t][0]))
+
+        if unique:
+            docs = column(self._postings[unique[0]][0], np.uint32)
+            tfs = [column(self._postings[unique[0]][1], np.uint32)]
+            for token_id in unique[1:]:
+                other_docs, other_tfs = self._postings[token_id]
+                docs, keep, other = np.intersect1d(docs, column(other_docs, np.uint32),
+                                                   assume_unique=True, return_indices=True)
+                tfs = [tf[keep] for tf in tfs] + [column(other_tfs, np.uint32)[other]]
+        else:
+            docs = np.flatnonzero(column(self._storage_of, np.int64) >= 0).astype(np.uint32)
+            tfs = []
+
+        keep = np.ones(len(docs), dtype=bool)
+        if keyword:
+            keep &= np.isin(docs, column(self._keywords.get(keyword.lower(), array("I")), np.uint32),
+                            assume_unique=True)
+        if mood:
+            sentiment = column(self._sentiment, np.float64)[docs]
+            keep &= sentiment > 0.3 if mood == "positive" else sentiment < -0.3 if mood == "negative" \
+                else (sentiment >= -0.3) & (sentiment <= 0.3)
+        if phrases:
+            needles = [array("I", [self._vocab[t] for t in phrase]).tobytes() for phrase in phrases]
+            for i in np.flatnonzero(keep):
+                doc = int(docs[i])
+                keep[i] = all(self._has_phrase(doc, needle) for needle in needles)
+        docs = docs[keep]
+        tfs = [tf[keep] for tf in tfs]
+
+        # BM25 over the query terms; ties (and filter-only searches) show the newest entry first
+        scores = np.zeros(len(docs))
+        doc_count = len(self)
+        if tfs and doc_count:
+            lengths = column(self._lengths, np.uint32)[docs]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (self._total_length / doc_count))
+            for token_id, tf in zip(unique, tfs):
+                df = len(self._postings[token_id][0])
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                scores += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        order = np.lexsort((-docs.astype(np.int64), -scores))[page * page_size:(page + 1) * page_size]
+        return len(docs), [self._storage_id(int(doc)) for doc in docs[order]]
+
+    def _has_phrase(self, doc, needle):
+        # token ids are 4 bytes each: a match only counts on a token boundary
+        haystack = self._tokens[doc]
+        i = haystack.find(needle)
+        while i != -1:
+            if i % 4 == 0:
+                return True
+            i = haystack.find(needle, i + 1)
+        return False
+
+
+_search_indexes = OrderedDict()
+_search_index_lock = threading.Lock()
+
+def get_search_index(username=None):
+    # One index per user partition, shared by that user's sessions in this
+    # process; the least recently searched ones are dropped past SEARCH_INDEX_CACHE
+    key = username or ""
+    with _search_index_lock:
+        index = _search_indexes.pop(key, None)
+        if index is None:
+            index = SearchIndex(get_storage().for_user(key))
+        _search_indexes[key] = index
+        while len(_search_indexes) > SEARCH_INDEX_CACHE:
+            _search_indexes.popitem(last=False)
+    return index
@@ -0,0 +1,223 @@
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+from metrics import timed
+from lexicon import get_lexicon
+
+
+# Max number of scored texts kept per server process
+SENTIMENT_CACHE_SIZE = int(os.environ.get("OJA_SENTIMENT_CACHE_SIZE", 4096))
+
+
+# -------- Text keys --------
+def normalize_text(text):
+    # neither backend cares about extra whitespace, so it shouldn't cause a cache miss either
+    return " ".join(text.split())
+
+def text_key(text):
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).hexdigest()
+
+
+# -------- LRU cache shared by every session --------
+class SentimentCache:
+    def __init__(self, maxsize=SENTIMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # score outside the lock so one slow entry doesn't block other sessions
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def get_or_compute_many(self, keys, compute_many):
+        # compute_many(missing positions) -> one value per missing key
+        values = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    values[i] = self._data[key]
+                    self.hits += 1
+                else:
+                    missing.append(i)
+            self.misses += len(missing)
+        if missing:
+            computed = compute_many(missing)
+            with self._lock:
+                for i, value in zip(missing, computed):
+                    values[i] = self._data[keys[i]] = value
+                    self._data.move_to_end(keys[i])
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return values
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+sentiment_cache = SentimentCache()
+
+
+# -------- Backends --------
+# A backend scores text with:
+#   name                     cache keys and reports tell backends apart by it
+#   warm_up()                load whatever scoring needs, before the first real entry
+#   score(text)              (polarity, number of sentiment-bearing assessments)
+#   polarity_many(texts)     [polarity], one per text
+# OJA_SENTIMENT_BACKEND picks one per deployment; sentiment_report.py compares them.
+SENTIMENT_BACKEND = os.environ.get("OJA_SENTIMENT_BACKEND", "lexicon").lower()
+
+class LexiconBackend:
+    # TextBlob's word scores and rules, compiled into arrays (see lexicon.py)
+    name = "lexicon"
+
+    def warm_up(self):
+        return len(get_lexicon()) > 0
+
+    def score(self, text):
+        return get_lexicon().score(text)
+
+    def polarity_many(self, texts):
+        return get_lexicon().score_many(texts)
+
+class TextBlobBackend:
+    # textblob (and nltk behind it) is imported on first use, not at import time
+    name = "textblob"
+
+    def warm_up(self):
+        return textblob("warm up").sentiment.polarity is not None
+
+    def score(self, text):
+        result = textblob(text).sentiment_assessments
+        return result.polarity, len(result.assessments)
+
+    def polarity_many(self, texts):
+        return [textblob(text).sentiment.polarity for text in texts]
+
+def textblob(text):
+    from textblob import TextBlob
+    return TextBlob(text)
+
+SENTIMENT_BACKENDS = {"lexicon": LexiconBackend, "textblob": TextBlobBackend}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name=None):
+    # one instance per backend and process
+    name = (name or SENTIMENT_BACKEND).lower()
+    if name not in SENTIMENT_BACKENDS:
+        raise ValueError(f"unknown sentiment backend {name!r} (choose from {', '.join(SENTIMENT_BACKENDS)})")
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend = _backends[name] = SENTIMENT_BACKENDS[name]()
+    return backend
+
+
+# -------- Scoring --------
+def warm_up():
+    return get_backend().warm_up()
+
+@timed("sentiment.polarity")
+def polarity(text):
+    backend = get_backend()
+    normalized = normalize_text(text)
+    return sentiment_cache.get_or_compute(
+        f"{backend.name}:{text_key(normalized)}", lambda: backend.score(normalized)[0]
+    )
+
+@timed("sentiment.polarity_many")
+def polarity_many(texts):
+    # Same scores as polarity(), with every cache miss scored in one backend call
+    backend = get_backend()
+    normalized = [normalize_text(text) for text in texts]
+    keys = [f"{backend.name}:{text_key(text)}" for text in normalized]
+    return sentiment_cache.get_or_compute_many(keys, lambda missing: backend.polarity_many(
+        [normalized[i] for i in missing]
+    ))
+
+
+# -------- Incremental scoring while typing --------
+SENTENCE_RE = re.compile(r"[^.!?\n]+(?:[.!?]+|\n|$)")
+
+def split_sentences(text):
+    return [m.group().strip() for m in SENTENCE_RE.finditer(text) if m.group().strip()]
+
+@timed("sentiment.sentence_score")
+def sentence_score(sentence):
+    # (polarity, number of sentiment-bearing assessments) for one sentence
+    backend = get_backend()
+    return sentiment_cache.get_or_compute(
+        f"sentence:{backend.name}:{text_key(sentence)}", lambda: backend.score(sentence)
+    )
+
+class IncrementalSentiment:
+    # Keeps per-sentence scores for one text box; an edit only re-scores the
+    # sentences that changed. Both backends average polarity over all assessments,
+    # so each sentence is weighted by its assessment count. This is approximate:
+    # a "!" boosts the last assessment even in an earlier sentence, and an
+    # intensifier or negation carries over a sentence break, neither of which
+    # a sentence scored alone sees. On multi-sentence journal text it stays
+    # within 0.05 of polarity() (tests/test_sentiment.py); short texts built
+    # around those cases can differ more. Only the live mood theme uses it;
+    # saved entries are scored whole.
+    def __init__(self):
+        self._scores = {}
+        self.rescored = 0
+
+    def update(self, text):
+        scores = {}
+        self.rescored = 0
+        total = weight = 0.0
+        for sentence in split_sentences(text):
+            key = text_key(sentence)
+            score = scores.get(key) or self._scores.get(key)
+            if score is None:
+                score = sentence_score(sentence)
+                self.rescored += 1
+            scores[key] = score
+            total += score[0] * score[1]
+            weight += score[1]
+        self._scores = scores
+        return total / weight if weight else 0.0
@@ -0,0 +1,163 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+
+# Sentiment backend report: accuracy on a labeled sample, agreement with
+# TextBlob and latency, to pick OJA_SENTIMENT_BACKEND for a deployment.
+#   python sentiment_report.py
+#   python sentiment_report.py --sample my_labeled.csv --show-disagreements --json out.json
+#
+# The sample is a CSV with text,label columns (label: positive, neutral or
+# negative). Backends score directly, bypassing the sentiment cache; warm-up
+# is timed in a fresh interpreter, so it is a cold start.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_FILE = os.path.join(APP_DIR, "sentiment_sample.csv")
+# Every other backend is compared against this one
+REFERENCE_BACKEND = "textblob"
+# Same cut as the mood shown after Analyze & Save
+LABEL_THRESHOLD = 0.1
+LABELS = ("positive", "neutral", "negative")
+
+
+def label_of(score):
+    return "positive" if score > LABEL_THRESHOLD else "negative" if score < -LABEL_THRESHOLD else "neutral"
+
+def load_sample(path):
+    with open(path, newline="", encoding="utf-8") as file:
+        rows = [(row["text"], row["label"].strip().lower()) for row in csv.DictReader(file)]
+    bad = sorted({label for _, label in rows if label not in LABELS})
+    if bad:
+        raise ValueError(f"{path}: unknown labels {', '.join(bad)} (use {', '.join(LABELS)})")
+    return rows
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# -------- Measurements --------
+def measure_warm_up(name):
+    # ms to import sentiment and load the backend, in a fresh interpreter
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name], capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "child failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])["ms"]
+
+def child_warm_up(name):
+    sys.path.insert(0, APP_DIR)
+    started = time.perf_counter()
+    from sentiment import get_backend
+    get_backend(name).warm_up()
+    return {"ms": (time.perf_counter() - started) * 1000}
+
+def measure_backend(backend, texts, repeats):
+    backend.warm_up()
+    scores = [backend.score(text)[0] for text in texts]
+    single = []
+    for _ in range(repeats):
+        for text in texts:
+            started = time.perf_counter()
+            backend.score(text)
+            single.append((time.perf_counter() - started) * 1e6)
+    batch = texts * repeats
+    started = time.perf_counter()
+    backend.polarity_many(batch)
+    batch_us = (time.perf_counter() - started) * 1e6 / len(batch)
+    return {
+        "scores": scores,
+        "warm_up_ms": measure_warm_up(backend.name),
+        "p50_us": percentile(single, 0.50),
+        "p99_us": percentile(single, 0.99),
+        "batch_us": batch_us,
+    }
+
+def agreement(scores, reference):
+    labels = sum(label_of(a) == label_of(b) for a, b in zip(scores, reference)) / len(scores)
+    diffs = [abs(a - b) for a, b in zip(scores, reference)]
+    try:
+        correlation = statistics.correlation(scores, reference)
+    except statistics.StatisticsError:  # a constant series
+        correlation = float("nan")
+    return {"labels": labels, "mean_abs_diff": statistics.fmean(diffs), "max_abs_diff": max(diffs),
+            "correlation": correlation}
+
+
+# -------- Report --------
+def collect(sample, names, repeats):
+    from sentiment import get_backend
+
+    texts = [text for text, _ in sample]
+    expected = [label for _, label in sample]
+    results = {name: measure_backend(get_backend(name), texts, repeats) for name in names}
+    reference = results.get(REFERENCE_BACKEND)
+    for result in results.values():
+        result["accuracy"] = sum(label_of(s) == e for s, e in zip(result["scores"], expected)) / len(expected)
+        if reference is not None:
+            result["agreement"] = agreement(result["scores"], reference["scores"])
+    return results
+
+def report(results, sample, show_disagreements):
+    print(f"{len(sample)} labeled entries; labels cut at ±{LABEL_THRESHOLD}; agreement against {REFERENCE_BACKEND}")
+    print(f"{'backend':<10}{'accuracy':>10}{'agree':>8}{'mean |Δ|':>10}{'max |Δ|':>9}{'corr':>7}"
+          f"{'warm-up ms':>12}{'p50 µs':>9}{'p99 µs':>9}{'batch µs':>10}")
+    for name, result in results.items():
+        agree = result.get("agreement")
+        columns = (f"{agree['labels']:>8.0%}{agree['mean_abs_diff']:>10.3f}{agree['max_abs_diff']:>9.3f}"
+                   f"{agree['correlation']:>7.3f}") if agree else f"{'':>34}"
+        print(f"{name:<10}{result['accuracy']:>10.0%}{columns}{result['warm_up_ms']:>12.0f}"
+              f"{result['p50_us']:>9.1f}{result['p99_us']:>9.1f}{result['batch_us']:>10.1f}")
+    reference = results.get(REFERENCE_BACKEND)
+    if not show_disagreements or reference is None:
+        return
+    for name, result in results.items():
+        if name == REFERENCE_BACKEND:
+            continue
+        rows = [(text, s, r) for (text, _), s, r in zip(sample, result["scores"], reference["scores"])
+                if label_of(s) != label_of(r)]
+        print(f"\n{name} vs {REFERENCE_BACKEND}: {len(rows)} different labels")
+        for text, s, r in rows:
+            print(f"  {s:+.2f} {r:+.2f}  {text}")
+
+
+def main(argv=None):
+    sys.path.insert(0, APP_DIR)
+    from sentiment import SENTIMENT_BACKENDS
+
+    parser = argparse.ArgumentParser(description="Compare sentiment backends on a labeled sample")
+    parser.add_argument("--sample", default=SAMPLE_FILE, help="CSV with text,label columns")
+    parser.add_argument("--backends", default=",".join(SENTIMENT_BACKENDS), help="comma-separated backend names")
+    parser.add_argument("--repeats", type=int, default=20, help="timed passes over the sample")
+    parser.add_argument("--show-disagreements", action="store_true", help="list entries labeled differently")
+    parser.add_argument("--json", help="also write the measurements to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(child_warm_up(args.child)))
+        return 0
+
+    names = [name.strip() for name in args.backends.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SENTIMENT_BACKENDS]
+    if unknown:
+        parser.error(f"unknown backend {', '.join(unknown)} (choose from {', '.join(SENTIMENT_BACKENDS)})")
+    sample = load_sample(args.sample)
+    results = collect(sample, names, args.repeats)
+    report(results, sample, args.show_disagreements)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({name: {key: value for key, value in result.items() if key != "scores"}
+                       for name, result in results.items()}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+
+# Time-to-first-paint budget report.
+#   python startup_budget.py              # table, exit code 1 if anything is over budget
+#   python startup_budget.py --json out.json
+#
+# Every measurement runs in a fresh interpreter, so it is a cold start.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, "app.py")
+
+# Modules app.py imports at the top; none of them should drag in the heavy ones
+APP_MODULES = ["storage", "sentiment", "audit", "mood_trend", "journal_store", "overthinking", "metrics", "search", "backup", "analysis", "throttle", "mood_coalescer"]
+HEAVY_MODULES = ["pandas", "textblob", "nltk", "matplotlib"]
+
+# Budgets in milliseconds
+BUDGETS = {
+    "import:streamlit": 1000,
+    "import:app modules": 150,
+    "render:login page": 1500,
+    "render:journal page": 4000,
+}
+
+
+def run_child(*args):
+    # Run this script in a fresh interpreter and return the JSON it prints
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", *args],
+        capture_output=True, text=True, cwd=tempfile.mkdtemp(prefix="oja-budget-"),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "child failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# -------- Measurements (child side) --------
+def measure_import(modules):
+    sys.path.insert(0, APP_DIR)
+    started = time.perf_counter()
+    for module in modules:
+        __import__(module)
+    elapsed = (time.perf_counter() - started) * 1000
+    return {"ms": elapsed, "heavy": [m for m in HEAVY_MODULES if m in sys.modules]}
+
+def measure_render():
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, APP_DIR)
+    app = AppTest.from_file(APP_FILE, default_timeout=120)
+    started = time.perf_counter()
+    app.run()
+    login_ms = (time.perf_counter() - started) * 1000
+    heavy_at_login = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    app.session_state["logged_in"] = True
+    started = time.perf_counter()
+    app.run()
+    journal_ms = (time.perf_counter() - started) * 1000
+    errors = [str(e.value) for e in app.exception]
+    return {"login": login_ms, "journal": journal_ms, "heavy_at_login": heavy_at_login, "errors": errors}
+
+
+# -------- Report (parent side) --------
+def collect():
+    results = []
+    streamlit_import = run_child("import", "streamlit")
+    results.append(("import:streamlit", streamlit_import["ms"], ""))
+    app_import = run_child("import", *APP_MODULES)
+    results.append(("import:app modules", app_import["ms"], "loads " + ", ".join(app_import["heavy"]) if app_import["heavy"] else ""))
+    render = run_child("render")
+    note = "login page loads " + ", ".join(render["heavy_at_login"]) if render["heavy_at_login"] else ""
+    results.append(("render:login page", render["login"], note))
+    results.append(("render:journal page", render["journal"], "; ".join(render["errors"])))
+    return results
+
+def report(results):
+    over = False
+    print(f"{'measurement':<22}{'ms':>10}{'budget':>10}  status")
+    for name, ms, note in results:
+        budget = BUDGETS.get(name)
+        ok = budget is None or ms <= budget
+        over = over or not ok
+        print(f"{name:<22}{ms:>10.0f}{budget or 0:>10}  {'ok' if ok else 'OVER'}  {note}".rstrip())
+    return over
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time and first-render budget report for app.py")
+    parser.add_argument("--json", help="also write the measurements to this file")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        kind, *modules = args.child
+        print(json.dumps(measure_import(modules) if kind == "import" else measure_render()))
+        return 0
+
+    results = collect()
+    over = report(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({name: {"ms": round(ms, 1), "budget": BUDGETS.get(name), "note": note}
+                       for name, ms, note in results}, file, indent=2)
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
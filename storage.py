@@ -0,0 +1,1301 @@
+import os
+import io
+import re
+import csv
+import copy
+import hashlib
+import sqlite3
+import sys
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+
+# pandas is imported inside the methods that build DataFrames, so logging in
+# doesn't pay for it
+from itertools import combinations
+
+from mood_trend import MoodRollups, bucket_keys, ROLLUP_COLUMNS
+from triggers import TriggerCounts, split_keywords, trigger_buckets, top_triggers, TOP_TRIGGERS
+from writer import get_write_queue, file_lock, atomic_write
+
+
+# ---------- DATA FILES ----------
+USERS_FILE = "users.csv"
+LOGIN_LOG_FILE = "login_attempts.csv"
+JOURNAL_FILE = "journal_db.csv"
+MOOD_LOG_FILE = "mood_log.csv"
+MOOD_ROLLUP_FILE = "mood_rollups.json"
+TRIGGER_COUNTS_FILE = "trigger_counts.json"
+# bumped by rewrites that change journal rows in place (rescore.py), see journal_generation()
+JOURNAL_GENERATION_FILE = "journal_generation"
+DB_FILE = os.environ.get("OJA_DB_FILE", "oja.db")
+
+# Per-user journal and mood files (CSV backend): user_data/<name>-<hash>/journal_db.csv, ...
+USER_DATA_DIR = os.environ.get("OJA_USER_DATA_DIR", "user_data")
+PARTITION_OWNER_FILE = "owner"
+# User partitions kept open per process (row index, rollups, trigger counters)
+USER_PARTITION_CACHE = int(os.environ.get("OJA_USER_PARTITION_CACHE", 256))
+
+# Roll the login log over to a dated file past this size, or when the day changes
+LOGIN_LOG_MAX_BYTES = int(os.environ.get("OJA_LOGIN_LOG_MAX_BYTES", 10 * 1024 * 1024))
+
+# Rewrite the mood log once this many bytes have been appended since the last compaction
+MOOD_LOG_COMPACT_BYTES = int(os.environ.get("OJA_MOOD_COMPACT_BYTES", 1024 * 1024))
+
+USER_COLUMNS = ["username", "password"]
+LOGIN_COLUMNS = ["timestamp", "username", "status"]
+JOURNAL_COLUMNS = ["date", "entry", "sentiment", "keywords"]
+# count / last_seen: repeated radio selections coalesced into one row (see mood_coalescer.py)
+MOOD_COLUMNS = ["date", "text", "sentiment", "count", "last_seen"]
+
+
+# -------- CSV helpers --------
+def append_csv_row(path, fieldnames, row):
+    append_csv_rows(path, fieldnames, [row])
+
+def append_csv_rows(path, fieldnames, rows):
+    file_exists = os.path.exists(path)
+    with open(path, mode='a', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        if not file_exists:
+            writer.writeheader()
+        writer.writerows(rows)
+
+def read_csv_header(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, mode='r', newline='') as file:
+        return next(csv.reader(file), None)
+
+def read_csv_rows(path):
+    if not os.path.exists(path):
+        return
+    with open(path, mode='r', newline='') as file:
+        yield from csv.DictReader(file)
+
+
+def mood_row(row):
+    # rows from before coalescing were each seen once, at their date
+    sentiment, count = row.get("sentiment"), row.get("count")
+    return {
+        "date": row.get("date") or "",
+        "text": row.get("text") or "",
+        "sentiment": float(sentiment) if sentiment not in (None, "") else 0.0,
+        "count": int(float(count)) if count not in (None, "") else 1,
+        "last_seen": row.get("last_seen") or row.get("date") or "",
+    }
+
+def mood_frame(history):
+    # a mood log read with pandas, in the current layout whatever layout it was written in
+    import pandas as pd
+    history = history.reindex(columns=MOOD_COLUMNS)
+    history["text"] = history["text"].fillna("")
+    history["count"] = pd.to_numeric(history["count"], errors="coerce").fillna(1).astype(int)
+    history["last_seen"] = history["last_seen"].fillna(history["date"])
+    return history
+
+def file_identity(path):
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino
+
+def journal_row(row, entry_id):
+    sentiment = row.get("sentiment")
+    return {
+        "id": entry_id,
+        "date": row.get("date") or "",
+        "entry": row.get("entry") or "",
+        "sentiment": float(sentiment) if sentiment not in (None, "") else 0.0,
+        "keywords": row.get("keywords") or "",
+    }
+
+
+# -------- Per-user partitions (CSV backend) --------
+def user_partition_dir(username, root=USER_DATA_DIR):
+    # readable part for people browsing the folder; the hash keeps names that sanitize alike apart
+    readable = re.sub(r"[^A-Za-z0-9_-]+", "_", username)[:40]
+    digest = hashlib.sha1(username.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(root, f"{readable}-{digest}")
+
+def ensure_user_partition(username, root=USER_DATA_DIR):
+    directory = user_partition_dir(username, root)
+    owner = os.path.join(directory, PARTITION_OWNER_FILE)
+    if not os.path.exists(owner):
+        os.makedirs(directory, exist_ok=True)
+        with atomic_write(owner) as file:
+            file.write(username)
+    return directory
+
+def csv_partitions(root=USER_DATA_DIR):
+    # (username, directory) of every user partition on disk
+    if not os.path.isdir(root):
+        return
+    for name in sorted(os.listdir(root)):
+        owner = os.path.join(root, name, PARTITION_OWNER_FILE)
+        if os.path.exists(owner):
+            with open(owner) as file:
+                yield file.read(), os.path.join(root, name)
+
+
+# -------- Byte-offset index of CSV records --------
+class CsvRowIndex:
+    # Start offset of every data row. Extended incrementally as the file grows,
+    # so reading one page of rows is a single seek instead of a full parse.
+    def __init__(self, path):
+        self.path = path
+        self.offsets = []
+        self._end = 0
+        self._identity = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                self.offsets, self._end, self._identity = [], 0, None
+                return 0
+            stat = os.stat(self.path)
+            identity = (stat.st_dev, stat.st_ino)
+            if identity != self._identity or stat.st_size < self._end:
+                # file was replaced or truncated (delete, rescore, compaction)
+                self.offsets, self._end, self._identity = [], 0, identity
+            if stat.st_size > self._end:
+                self._scan()
+            return len(self.offsets)
+
+    @property
+    def indexed_bytes(self):
+        return self._end
+
+    def _scan(self):
+        with open(self.path, mode='rb') as file:
+            file.seek(self._end)
+            if self._end == 0:
+                if self._read_record(file) is None:
+                    return
+                self._end = file.tell()
+            while True:
+                start = file.tell()
+                record = self._read_record(file)
+                if record is None:
+                    break  # nothing more, or a row still being written
+                if record.strip():
+                    self.offsets.append(start)
+                self._end = file.tell()
+
+    @staticmethod
+    def _read_record(file):
+        # A record ends at the first newline where the quotes seen so far balance
+        record = b""
+        while True:
+            line = file.readline()
+            if not line:
+                return None
+            record += line
+            if record.count(b'"') % 2 == 0 and line.endswith(b"\n"):
+                return record
+
+    def read_rows(self, first, last):
+        # Rows first..last (0-based, inclusive) as lists of strings
+        start = self.offsets[first]
+        end = self.offsets[last + 1] if last + 1 < len(self.offsets) else self._end
+        with open(self.path, mode='rb') as file:
+            file.seek(start)
+            chunk = file.read(end - start).decode("utf-8")
+        return [values for values in csv.reader(io.StringIO(chunk, newline='')) if values]
+
+
+# -------- Size/day rotated CSV log --------
+class RotatingCsvLog:
+    def __init__(self, path, fieldnames, max_bytes=LOGIN_LOG_MAX_BYTES):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.max_bytes = max_bytes
+        self._day = None
+
+    def _rotate_if_needed(self, today):
+        if not os.path.exists(self.path):
+            self._day = today
+            return
+        if self._day is None:
+            self._day = datetime.fromtimestamp(os.path.getmtime(self.path)).strftime("%Y%m%d")
+        if self._day == today and os.path.getsize(self.path) < self.max_bytes:
+            return
+        root, ext = os.path.splitext(self.path)
+        rotated = f"{root}-{self._day}{ext}"
+        n = 1
+        while os.path.exists(rotated):
+            rotated = f"{root}-{self._day}.{n}{ext}"
+            n += 1
+        os.replace(self.path, rotated)
+        self._day = today
+
+    def write_rows(self, rows):
+        self._rotate_if_needed(datetime.now().strftime("%Y%m%d"))
+        append_csv_rows(self.path, self.fieldnames, rows)
+
+
+# -------- CSV backend (the original flat files) --------
+def _by_partition(method):
+    # Writer handler for one kind of CSV append. Items are (partition, row);
+    # each partition gets its own rows in one call.
+    def handler(items):
+        groups = {}
+        for i, (partition, row) in enumerate(items):
+            groups.setdefault(partition, []).append((i, row))
+        results = [None] * len(items)
+        for partition, rows in groups.items():
+            done = method(partition, [row for _, row in rows])
+            if done is not None:
+                for (i, _), result in zip(rows, done):
+                    results[i] = result
+        return results
+    return handler
+
+class CsvStorage:
+    name = "csv"
+    # journal ids are row numbers, so deleting an entry shifts the ids after it
+    renumbers_on_delete = True
+
+    def __init__(self, directory=None, username="", shared=None):
+        # directory=None is the shared partition: the files in the working
+        # directory, which hold the history from before per-user partitions
+        self.user = username or ""
+        self.directory = directory
+        self._shared = shared or self
+        in_partition = (lambda name: os.path.join(directory, name)) if directory else (lambda name: name)
+        self.journal_file = in_partition(JOURNAL_FILE)
+        self.mood_log_file = in_partition(MOOD_LOG_FILE)
+        self.mood_rollup_file = in_partition(MOOD_ROLLUP_FILE)
+        self.trigger_counts_file = in_partition(TRIGGER_COUNTS_FILE)
+        self.journal_generation_file = in_partition(JOURNAL_GENERATION_FILE)
+        self._mood_lock = threading.Lock()
+        self._mood_compacting = False
+        self._mood_compacted_size = None
+        self._mood_sorted_identity = None
+        self._journal_index = CsvRowIndex(self.journal_file)
+        self._mood_index = CsvRowIndex(self.mood_log_file)
+        self._mood_rollups = MoodRollups(self.mood_rollup_file)
+        self._trigger_counts = TriggerCounts(self.trigger_counts_file)
+        self._writes = get_write_queue()
+        if directory is not None:
+            return
+        self._login_log = RotatingCsvLog(LOGIN_LOG_FILE, LOGIN_COLUMNS)
+        # user partitions opened by this process, least recently used first
+        self._partitions = OrderedDict()
+        self._partitions_lock = threading.Lock()
+        # every append goes through the single writer thread, in batches
+        self._writes.register("csv:users", self._append_users)
+        self._writes.register("csv:login_attempts", self._append_login_attempts)
+        self._writes.register("csv:journal", _by_partition(CsvStorage._append_journal))
+        self._writes.register("csv:mood_log", _by_partition(CsvStorage._append_mood))
+
+    def for_user(self, username):
+        # The journal and mood history of one user; no user means the shared partition
+        shared = self._shared
+        if not username:
+            return shared
+        if username == self.user:
+            return self
+        with shared._partitions_lock:
+            partition = shared._partitions.pop(username, None)
+            if partition is None:
+                partition = CsvStorage(ensure_user_partition(username), username, shared)
+            shared._partitions[username] = partition
+            while len(shared._partitions) > USER_PARTITION_CACHE:
+                shared._partitions.popitem(last=False)
+        return partition
+
+    def load_users(self):
+        return {row['username']: row['password'] for row in read_csv_rows(USERS_FILE)}
+
+    def users_signature(self):
+        if not os.path.exists(USERS_FILE):
+            return None
+        stat = os.stat(USERS_FILE)
+        return stat.st_mtime_ns, stat.st_size
+
+    def find_user(self, username):
+        for row in read_csv_rows(USERS_FILE):
+            if row['username'] == username:
+                return row['password']
+        return None
+
+    def save_new_user(self, username, password):
+        return self._writes.write("csv:users", {"username": username, "password": password})
+
+    def log_login_attempts(self, attempts):
+        self._writes.write_many("csv:login_attempts", attempts)
+
+    def save_entry(self, entry_data):
+        # returns the new entry's id; its trigger counters are bumped with the append
+        return self._writes.write("csv:journal", (self, entry_data))
+
+    def save_entries(self, entries):
+        # bulk import; the writer appends them in batches. Returns how many were saved
+        saved = [self._writes.submit("csv:journal", (self, entry)) for entry in entries]
+        return len([future.result() for future in saved])
+
+    # -------- Writer-thread handlers: one batch of rows per call --------
+    def _append_users(self, rows):
+        with file_lock(USERS_FILE):
+            append_csv_rows(USERS_FILE, USER_COLUMNS, rows)
+        return [True] * len(rows)
+
+    def _append_login_attempts(self, rows):
+        with file_lock(LOGIN_LOG_FILE):
+            self._login_log.write_rows(rows)
+
+    def _append_journal(self, rows):
+        # the trigger counters change under the journal's lock, so a rebuild never misses a row
+        with file_lock(self.journal_file):
+            count = self._journal_index.refresh()
+            append_csv_rows(self.journal_file, JOURNAL_COLUMNS, rows)
+            self._trigger_counts.add_many((self.user, row["date"], row["keywords"], 1) for row in rows)
+        return list(range(count + 1, count + 1 + len(rows)))
+
+    def _append_mood(self, rows):
+        # Append-only: the rest of the log is never re-read, only its last row's
+        # date. The log is kept in date order for load_mood_entries, so rows
+        # older than that (an imported backup) have the log re-sorted.
+        with self._mood_lock, file_lock(self.mood_log_file):
+            if self._mood_compacted_size is None:
+                header = read_csv_header(self.mood_log_file)
+                if header is not None and header != MOOD_COLUMNS:
+                    # older logs were written as date,sentiment or without count,last_seen;
+                    # fix the layout before appending
+                    self._compact_mood_log_locked()
+                self._mood_compacted_size = self._mood_log_size()
+            self._ensure_mood_rollups()
+            rows = [mood_row(row) for row in rows]
+            dates = [self._last_mood_date(), *(row["date"] for row in rows)]
+            handles = self._append_mood_rows(rows)
+            self._mood_rollups.add_many((row["date"], row["sentiment"]) for row in rows)
+            if any(earlier > later for earlier, later in zip(dates, dates[1:])):
+                self._compact_mood_log_locked()
+                self._mood_compacted_size = self._mood_log_size()
+            grown = self._mood_log_size() - self._mood_compacted_size
+        if grown >= MOOD_LOG_COMPACT_BYTES:
+            self.compact_mood_log(background=True)
+        return handles
+
+    def _last_mood_date(self):
+        count = self._mood_index.refresh()
+        return self._mood_index.read_rows(count - 1, count - 1)[0][0] if count else ""
+
+    def _append_mood_rows(self, rows):
+        # (offset, length, file identity) of each appended row, for update_mood_entry
+        handles = []
+        with open(self.mood_log_file, mode='a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=MOOD_COLUMNS)
+            if file.tell() == 0:
+                writer.writeheader()
+            stat = os.fstat(file.fileno())
+            for row in rows:
+                start = file.tell()
+                writer.writerow(row)
+                handles.append((start, file.tell() - start, (stat.st_dev, stat.st_ino)))
+        return handles
+
+    def update_mood_entry(self, handle, mood_data):
+        # New count / last_seen for a row save_mood_entry wrote (it returned the
+        # handle). The row is rewritten in place while it is still the last one
+        # in the file; otherwise it is found by date and text and the file rewritten.
+        row = mood_row(mood_data)
+        with self._mood_lock, file_lock(self.mood_log_file):
+            if not os.path.exists(self.mood_log_file):
+                return False
+            offset, length, identity = handle
+            stat = os.stat(self.mood_log_file)
+            if (stat.st_dev, stat.st_ino) == identity and offset + length == stat.st_size:
+                with open(self.mood_log_file, mode='r+', newline='') as file:
+                    file.seek(offset)
+                    tail = next(csv.reader(file), [])
+                    if tail[:2] == [row["date"], row["text"]]:
+                        file.seek(offset)
+                        file.truncate()
+                        csv.DictWriter(file, fieldnames=MOOD_COLUMNS).writerow(row)
+                        return True
+            rows = [mood_row(r) for r in read_csv_rows(self.mood_log_file)]
+            for i in range(len(rows) - 1, -1, -1):
+                if (rows[i]["date"], rows[i]["text"], rows[i]["sentiment"]) == \
+                        (row["date"], row["text"], row["sentiment"]):
+                    rows[i] = row
+                    break
+            else:
+                return False
+            with atomic_write(self.mood_log_file) as file:
+                writer = csv.DictWriter(file, fieldnames=MOOD_COLUMNS)
+                writer.writeheader()
+                writer.writerows(rows)
+            return True
+
+    def load_entries(self, since=None):
+        import pandas as pd
+        if not os.path.exists(self.journal_file):
+            return pd.DataFrame(columns=JOURNAL_COLUMNS)
+        entries = pd.read_csv(self.journal_file)
+        if since is not None:
+            entries = entries[entries["date"].astype(str) >= since]
+        return entries
+
+    def count_entries(self):
+        return self._journal_index.refresh()
+
+    def journal_generation(self):
+        # Changes whenever rows were rewritten in place (same count, new
+        # sentiment/keywords), so a cached search index knows to rebuild
+        try:
+            with open(self.journal_generation_file) as file:
+                return file.read()
+        except FileNotFoundError:
+            return ""
+
+    def bump_journal_generation(self):
+        with file_lock(self.journal_file):
+            generation = int(self.journal_generation() or 0) + 1
+            with atomic_write(self.journal_generation_file) as file:
+                file.write(str(generation))
+
+    def iter_entries(self):
+        # every entry, oldest first
+        for entry_id, row in enumerate(read_csv_rows(self.journal_file), start=1):
+            yield journal_row(row, entry_id)
+
+    def load_entries_by_ids(self, ids):
+        total = self._journal_index.refresh()
+        header = read_csv_header(self.journal_file)
+        entries = []
+        for entry_id in ids:
+            if 1 <= entry_id <= total:
+                values = self._journal_index.read_rows(entry_id - 1, entry_id - 1)[0]
+                entries.append(journal_row(dict(zip(header, values)), entry_id))
+        return entries
+
+    def has_entry(self, text, since):
+        # Whether an entry with this text (surrounding whitespace aside) is dated
+        # `since` or later; reads pages backwards from the newest row and stops at the first older one
+        text = text.strip()
+        total = self._journal_index.refresh()
+        header = read_csv_header(self.journal_file)
+        last = total - 1
+        while last >= 0:
+            first = max(0, last - 255)
+            for values in reversed(self._journal_index.read_rows(first, last)):
+                row = dict(zip(header, values))
+                if (row.get("date") or "") < since:
+                    return False
+                if (row.get("entry") or "").strip() == text:
+                    return True
+            last = first - 1
+        return False
+
+    def load_top_triggers(self, granularity, bucket, limit=TOP_TRIGGERS):
+        return self._trigger_counts.top(self.user, granularity, bucket, limit)
+
+    def load_entries_page(self, offset, limit):
+        # Newest first; ids are 1-based row numbers in the file
+        total = self._journal_index.refresh()
+        last = total - 1 - offset
+        if last < 0 or limit <= 0:
+            return []
+        first = max(0, last - limit + 1)
+        header = read_csv_header(self.journal_file)
+        rows = self._journal_index.read_rows(first, last)
+        page = [journal_row(dict(zip(header, values)), first + i + 1) for i, values in enumerate(rows)]
+        page.reverse()
+        return page
+
+    def delete_entry(self, journal):
+        # the id of the entry actually deleted (which the search index must drop), or None
+        return self._delete_journal_row(journal)
+
+    def _delete_journal_row(self, journal):
+        # Rewrites the file without the row; returns the row number it had, or
+        # None. The row number is checked against date and text, so an id that
+        # went stale after another delete still removes the right entry.
+        with file_lock(self.journal_file):
+            if not os.path.exists(self.journal_file):
+                return None
+            deleted = None
+            with open(self.journal_file, mode='r', newline='') as src:
+                rows = list(csv.DictReader(src))
+            for candidate in [journal["id"] - 1] + list(range(len(rows))):
+                if 0 <= candidate < len(rows):
+                    row = rows[candidate]
+                    if row.get("date") == journal["date"] and row.get("entry") == journal["entry"]:
+                        deleted = candidate
+                        break
+            if deleted is None:
+                return None
+            removed = rows.pop(deleted)
+            with atomic_write(self.journal_file) as dst:
+                writer = csv.DictWriter(dst, fieldnames=JOURNAL_COLUMNS, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+            self._trigger_counts.add_many([(self.user, removed.get("date"), removed.get("keywords") or "", -1)])
+            return deleted + 1
+
+    def rebuild_trigger_counts(self):
+        # recount from the journal, e.g. after a rescore rewrote its keywords
+        with file_lock(self.journal_file):
+            self._trigger_counts.rebuild(
+                (self.user, row.get("date"), row.get("keywords") or "") for row in read_csv_rows(self.journal_file)
+            )
+
+    def save_mood_entry(self, mood_data):
+        # returns a handle for update_mood_entry
+        return self._writes.write("csv:mood_log", (self, mood_data))
+
+    def save_mood_entries(self, entries):
+        return len(self._writes.write_many("csv:mood_log", [(self, entry) for entry in entries]))
+
+    def iter_mood_entries(self):
+        # oldest first (in file order)
+        for row in read_csv_rows(self.mood_log_file):
+            yield mood_row(row)
+
+    def _mood_log_size(self):
+        return os.path.getsize(self.mood_log_file) if os.path.exists(self.mood_log_file) else 0
+
+    def compact_mood_log(self, background=False):
+        # Rewrites the whole log (normalized columns, sorted by date); only runs when asked
+        with self._mood_lock:
+            if self._mood_compacting:
+                return
+            self._mood_compacting = True
+        if background:
+            threading.Thread(target=self._compact_mood_log, name="mood-log-compaction", daemon=True).start()
+        else:
+            self._compact_mood_log()
+
+    def _compact_mood_log(self):
+        try:
+            if not os.path.exists(self.mood_log_file):
+                return
+            snapshot_size = self._mood_log_size()
+            tmp_path = self.mood_log_file + ".compact"
+            identity, tail = self._write_compacted_mood_log(tmp_path, snapshot_size)
+            with self._mood_lock, file_lock(self.mood_log_file):
+                with open(self.mood_log_file, mode='rb') as src:
+                    stat = os.fstat(src.fileno())
+                    src.seek(snapshot_size - len(tail))
+                    if (stat.st_dev, stat.st_ino) != identity or src.read(len(tail)) != tail:
+                        # a row was updated in place meanwhile; the next append compacts again
+                        os.remove(tmp_path)
+                        return
+                    # carry over rows appended while the snapshot was being rewritten
+                    with open(tmp_path, mode='ab') as dst:
+                        dst.write(src.read())
+                os.replace(tmp_path, self.mood_log_file)
+                self._mood_compacted_size = self._mood_log_size()
+                self._mood_sorted_identity = file_identity(self.mood_log_file)
+        finally:
+            self._mood_compacting = False
+
+    def _compact_mood_log_locked(self):
+        tmp_path = self.mood_log_file + ".compact"
+        self._write_compacted_mood_log(tmp_path, self._mood_log_size())
+        os.replace(tmp_path, self.mood_log_file)
+        self._mood_sorted_identity = file_identity(self.mood_log_file)
+
+    def _write_compacted_mood_log(self, tmp_path, snapshot_size):
+        # returns the snapshot's file identity and last bytes, to tell whether it changed since
+        import pandas as pd
+        with open(self.mood_log_file, mode='rb') as file:
+            stat = os.fstat(file.fileno())
+            data = file.read(snapshot_size)
+        history = mood_frame(pd.read_csv(io.BytesIO(data)))
+        history = history.dropna(subset=["date"])
+        history = history.sort_values("date", kind="stable")
+        history.to_csv(tmp_path, index=False)
+        return (stat.st_dev, stat.st_ino), data[-4096:]
+
+    def load_mood_entries(self, since=None):
+        # The log is in date order, so the rows since a date are its tail: the
+        # row index finds where that starts in O(log n) seeks and only the tail
+        # is parsed. The date is the first column in every layout.
+        import pandas as pd
+        if not os.path.exists(self.mood_log_file):
+            return pd.DataFrame(columns=MOOD_COLUMNS)
+        if since is None:
+            return mood_frame(pd.read_csv(self.mood_log_file))
+        with self._mood_lock, file_lock(self.mood_log_file):
+            self._ensure_mood_log_sorted()
+            index = self._mood_index
+            count = index.refresh()
+            first = bisect_left(range(count), since, key=lambda row: index.read_rows(row, row)[0][0])
+            with open(self.mood_log_file, mode='rb') as file:
+                header = file.readline()
+                start = index.offsets[first] if first < count else index.indexed_bytes
+                file.seek(start)
+                tail = file.read(index.indexed_bytes - start)
+        history = mood_frame(pd.read_csv(io.BytesIO(header + tail)))
+        return history[history["date"].astype(str) >= since]
+
+    def _ensure_mood_log_sorted(self):
+        # Once per file: logs written before appends kept date order are sorted
+        # (appends keep it from then on, and compaction writes it sorted)
+        import pandas as pd
+        if file_identity(self.mood_log_file) == self._mood_sorted_identity:
+            return
+        dates = pd.read_csv(self.mood_log_file, usecols=[0], dtype=str).iloc[:, 0].fillna("")
+        if dates.is_monotonic_increasing:
+            self._mood_sorted_identity = file_identity(self.mood_log_file)
+        else:
+            self._compact_mood_log_locked()
+            self._mood_compacted_size = self._mood_log_size()
+
+    # -------- Day/week/month rollups (mood_rollups.json) --------
+    def _ensure_mood_rollups(self):
+        # built once from an existing log, then kept up to date by save_mood_entry
+        if not self._mood_rollups.exists():
+            self._mood_rollups.rebuild(
+                (row.get("date"), row.get("sentiment")) for row in read_csv_rows(self.mood_log_file)
+            )
+
+    def first_mood_day(self):
+        with self._mood_lock:
+            self._ensure_mood_rollups()
+        return self._mood_rollups.first_day()
+
+    def load_mood_rollup(self, granularity, since=None):
+        with self._mood_lock:
+            self._ensure_mood_rollups()
+        return self._mood_rollups.frame(granularity, since)
+
+    def clear_mood_log(self):
+        with self._mood_lock, file_lock(self.mood_log_file):
+            self._mood_compacted_size = None
+            self._mood_rollups.clear()
+            if os.path.exists(self.mood_log_file):
+                os.remove(self.mood_log_file)
+                return True
+            return False
+
+    # -------- Handing the shared history to one user --------
+    def claim_shared_history(self, username):
+        # Moves the shared journal and mood log (written before per-user
+        # partitions) into a partition that has no history of its own yet
+        shared, partition = self._shared, self.for_user(username)
+        if any(os.path.exists(path) for path in (partition.journal_file, partition.mood_log_file)):
+            raise ValueError(f"{username} already has journal or mood history; nothing was moved")
+        with shared._mood_lock, partition._mood_lock, \
+                file_lock(shared.journal_file), file_lock(shared.mood_log_file):
+            for source, target in ((shared.journal_file, partition.journal_file),
+                                   (shared.mood_log_file, partition.mood_log_file),
+                                   (shared.mood_rollup_file, partition.mood_rollup_file)):
+                if os.path.exists(source):
+                    os.replace(source, target)
+            shared._mood_rollups.clear()
+            shared._mood_compacted_size = None
+            partition._mood_rollups = MoodRollups(partition.mood_rollup_file)
+            partition._mood_compacted_size = None
+            shared._trigger_counts.clear()
+        partition.rebuild_trigger_counts()
+        return {"journal": partition.count_entries(), "mood_log": sum(1 for _ in read_csv_rows(partition.mood_log_file))}
+
+
+# -------- SQLite backend (WAL, indexed tables) --------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS login_attempts (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    username TEXT,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_login_attempts_user ON login_attempts(username, timestamp);
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    sentiment REAL,
+    keywords TEXT,
+    user TEXT NOT NULL DEFAULT ''  -- '' is the shared history from before per-user partitions
+);
+CREATE TABLE IF NOT EXISTS mood_log (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    text TEXT,
+    sentiment REAL,
+    user TEXT NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 1,  -- coalesced radio selections: how often, and the last one
+    last_seen TEXT
+);
+CREATE TABLE IF NOT EXISTS mood_rollups (
+    user TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    low REAL NOT NULL,
+    high REAL NOT NULL,
+    PRIMARY KEY (user, granularity, bucket)
+);
+CREATE TABLE IF NOT EXISTS trigger_counts (
+    user TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    keyword TEXT NOT NULL,  -- '' counts entries
+    other TEXT NOT NULL,    -- second keyword of a co-occurring pair, '' for single keywords
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user, granularity, bucket, keyword, other)
+);
+"""
+
+# Every per-user query leads with user, so one user's page only walks that user's index range
+USER_INDEXES = """
+DROP INDEX IF EXISTS idx_journal_date;
+DROP INDEX IF EXISTS idx_mood_log_date;
+CREATE INDEX IF NOT EXISTS idx_journal_user ON journal(user, id);
+CREATE INDEX IF NOT EXISTS idx_journal_user_date ON journal(user, date);
+CREATE INDEX IF NOT EXISTS idx_mood_log_user_date ON mood_log(user, date);
+"""
+
+INSERT_JOURNAL = """
+INSERT INTO journal (user, date, entry, sentiment, keywords) VALUES (:user, :date, :entry, :sentiment, :keywords)
+"""
+
+INSERT_MOOD = """
+INSERT INTO mood_log (user, date, text, sentiment, count, last_seen)
+VALUES (:user, :date, :text, :sentiment, :count, :last_seen)
+"""
+
+MOOD_SELECT = "SELECT date, text, sentiment, count, coalesce(last_seen, date) AS last_seen FROM mood_log"
+
+UPSERT_MOOD_ROLLUP = """
+INSERT INTO mood_rollups (user, granularity, bucket, count, total, low, high) VALUES (?, ?, ?, 1, ?, ?, ?)
+ON CONFLICT (user, granularity, bucket) DO UPDATE SET
+    count = count + 1,
+    total = total + excluded.total,
+    low = min(low, excluded.low),
+    high = max(high, excluded.high)
+"""
+
+UPSERT_TRIGGER_COUNT = """
+INSERT INTO trigger_counts (user, granularity, bucket, keyword, other, count) VALUES (?, ?, ?, ?, ?, 1)
+ON CONFLICT (user, granularity, bucket, keyword, other) DO UPDATE SET count = count + 1
+"""
+
+# SQL bucket expressions matching mood_trend.bucket_keys
+ROLLUP_BUCKET_SQL = {
+    "day": "date(substr(date, 1, 10))",
+    "week": "date(substr(date, 1, 10), '-6 days', 'weekday 1')",
+    "month": "date(substr(date, 1, 10), 'start of month')",
+}
+
+class SqliteStorage:
+    name = "sqlite"
+    renumbers_on_delete = False
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        # '' is the shared partition; for_user() returns views bound to one user
+        self.user = ""
+        # Streamlit runs every session on its own thread, so each thread gets its own connection
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            self._add_user_columns(conn)
+            conn.executescript(USER_INDEXES)
+        # sessions only read on their own connection; writes go through the single writer thread
+        self._writes = get_write_queue()
+        self._writes.register(("sqlite", os.path.abspath(path)), self._apply_writes)
+        if self._mood_rollups_missing():
+            self.rebuild_mood_rollups()
+
+    def for_user(self, username):
+        # Same database and connections, every journal/mood query scoped to one user
+        if (username or "") == self.user:
+            return self
+        partition = copy.copy(self)
+        partition.user = username or ""
+        return partition
+
+    @staticmethod
+    def _add_user_columns(conn):
+        # databases from before per-user partitions: existing rows stay in the shared partition
+        for table in ("journal", "mood_log"):
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if "user" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN user TEXT NOT NULL DEFAULT ''")
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(mood_log)")]
+        if "count" not in columns:
+            # from before radio moods were coalesced: every row was seen once
+            conn.execute("ALTER TABLE mood_log ADD COLUMN count INTEGER NOT NULL DEFAULT 1")
+            conn.execute("ALTER TABLE mood_log ADD COLUMN last_seen TEXT")
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(mood_rollups)")]
+        if "user" not in columns:
+            # rebuilt from mood_log right after
+            conn.execute("DROP TABLE mood_rollups")
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -------- Writes --------
+    # A write is a tuple of (sql, params, many) statements run in one transaction,
+    # or a function that gets the writer's connection for writes that have to read
+    # what they rewrite (rebuilds, migrations). The writer thread commits a whole
+    # batch of them at once.
+    def _write(self, *statements):
+        return self._write_with(statements)
+
+    def _write_with(self, write):
+        result = self._writes.write(("sqlite", os.path.abspath(self.path)), write)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @staticmethod
+    def _execute(conn, statements):
+        # (rowcount, lastrowid) of the first statement, or what the function returned
+        if callable(statements):
+            return statements(conn)
+        cursors = [(conn.executemany if many else conn.execute)(sql, params) for sql, params, many in statements]
+        return cursors[0].rowcount, cursors[0].lastrowid
+
+    def _apply_writes(self, batch):
+        conn = self.connection()
+        try:
+            with conn:
+                return [self._execute(conn, statements) for statements in batch]
+        except sqlite3.Error:
+            if len(batch) == 1:
+                raise
+        # one bad write shouldn't fail the rest of the batch: retry each on its own
+        results = []
+        for statements in batch:
+            try:
+                with conn:
+                    results.append(self._execute(conn, statements))
+            except sqlite3.Error as e:
+                results.append(e)
+        return results
+
+    def load_users(self):
+        rows = self.connection().execute("SELECT username, password FROM users")
+        return dict(rows.fetchall())
+
+    def users_signature(self):
+        # users are only ever inserted, so the newest rowid changes whenever the table does
+        return self.connection().execute("SELECT max(rowid) FROM users").fetchone()[0]
+
+    def find_user(self, username):
+        row = self.connection().execute(
+            "SELECT password FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save_new_user(self, username, password):
+        rowcount, _ = self._write(
+            ("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", (username, password), False),
+        )
+        return rowcount == 1
+
+    def log_login_attempts(self, attempts):
+        self._write(
+            ("INSERT INTO login_attempts (timestamp, username, status) VALUES (:timestamp, :username, :status)",
+             list(attempts), True),
+        )
+
+    def save_entry(self, entry_data):
+        # returns the new entry's id; the trigger counters are bumped in the same transaction
+        _, entry_id = self._write(
+            (INSERT_JOURNAL, dict(entry_data, user=self.user), False),
+            (UPSERT_TRIGGER_COUNT, self._trigger_count_keys(self.user, entry_data["date"], entry_data["keywords"]), True),
+        )
+        return entry_id
+
+    def save_entries(self, entries):
+        # bulk import: the rows and their trigger counters in one transaction
+        if not entries:
+            return 0
+        rowcount, _ = self._write(
+            (INSERT_JOURNAL, [dict(entry, user=self.user) for entry in entries], True),
+            (UPSERT_TRIGGER_COUNT,
+             [key for e in entries for key in self._trigger_count_keys(self.user, e["date"], e["keywords"])], True),
+        )
+        return rowcount
+
+    def load_top_triggers(self, granularity, bucket, limit=TOP_TRIGGERS):
+        rows = self.connection().execute(
+            "SELECT keyword, other, count FROM trigger_counts WHERE user = ? AND granularity = ? AND bucket = ?",
+            (self.user, granularity, bucket),
+        ).fetchall()
+        entries, keywords, pairs = 0, {}, {}
+        for keyword, other, count in rows:
+            if not keyword:
+                entries = count
+            elif not other:
+                keywords[keyword] = count
+            else:
+                pairs[(keyword, other)] = count
+        return top_triggers(entries, keywords, pairs, limit)
+
+    def iter_entries(self):
+        # every entry, oldest first
+        cur = self.connection().execute(
+            "SELECT id, date, entry, sentiment, keywords FROM journal WHERE user = ? ORDER BY id", (self.user,)
+        )
+        columns = [c[0] for c in cur.description]
+        for row in cur:
+            yield journal_row(dict(zip(columns, row)), row[0])
+
+    def has_entry(self, text, since):
+        # Whether an entry with this text (surrounding whitespace aside) is dated `since` or later
+        text = text.strip()
+        cur = self.connection().execute("SELECT entry FROM journal WHERE user = ? AND date >= ?", (self.user, since))
+        return any((entry or "").strip() == text for entry, in cur)
+
+    def load_entries_by_ids(self, ids):
+        ids = list(ids)
+        rows = {}
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cur = self.connection().execute(
+                f"""SELECT id, date, entry, sentiment, keywords FROM journal
+                    WHERE id IN ({','.join('?' * len(chunk))}) AND user = ?""",
+                [*chunk, self.user],
+            )
+            columns = [c[0] for c in cur.description]
+            rows.update((row[0], journal_row(dict(zip(columns, row)), row[0])) for row in cur)
+        return [rows[entry_id] for entry_id in ids if entry_id in rows]
+
+    def load_entries(self, since=None):
+        import pandas as pd
+        if since is None:
+            return pd.read_sql_query(
+                "SELECT date, entry, sentiment, keywords FROM journal WHERE user = ? ORDER BY id",
+                self.connection(), params=(self.user,),
+            )
+        return pd.read_sql_query(
+            "SELECT date, entry, sentiment, keywords FROM journal WHERE user = ? AND date >= ? ORDER BY id",
+            self.connection(), params=(self.user, since),
+        )
+
+    def count_entries(self):
+        return self.connection().execute("SELECT count(*) FROM journal WHERE user = ?", (self.user,)).fetchone()[0]
+
+    def journal_generation(self):
+        # one for the whole database: a rescore rewrites every user's rows
+        row = self.connection().execute("SELECT value FROM meta WHERE key = 'journal_generation'").fetchone()
+        return row[0] if row else ""
+
+    def bump_journal_generation(self):
+        self._write(
+            ("""INSERT INTO meta (key, value) VALUES ('journal_generation', 1)
+                ON CONFLICT (key) DO UPDATE SET value = value + 1""", (), False),
+        )
+
+    def load_entries_page(self, offset, limit):
+        cur = self.connection().execute(
+            "SELECT id, date, entry, sentiment, keywords FROM journal WHERE user = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+            (self.user, limit, offset),
+        )
+        columns = [c[0] for c in cur.description]
+        return [journal_row(dict(zip(columns, row)), row[0]) for row in cur.fetchall()]
+
+    def _trigger_count_keys(self, user, date, keywords):
+        found = split_keywords(keywords)
+        return [
+            (user, granularity, bucket, keyword, other)
+            for granularity, bucket in trigger_buckets(date).items()
+            for keyword, other in [("", ""), *((k, "") for k in found), *combinations(found, 2)]
+        ]
+
+    def delete_entry(self, journal):
+        # the row and its trigger counters go in one transaction, as they came in save_entry
+        return self._write_with(partial(self._delete_entry, journal=journal))
+
+    def _delete_entry(self, conn, journal):
+        deleted = conn.execute("DELETE FROM journal WHERE id = ? AND user = ?", (journal["id"], self.user))
+        if deleted.rowcount != 1:
+            return None
+        conn.executemany(
+            """UPDATE trigger_counts SET count = count - 1
+               WHERE user = ? AND granularity = ? AND bucket = ? AND keyword = ? AND other = ?""",
+            self._trigger_count_keys(self.user, journal["date"], journal["keywords"]),
+        )
+        conn.execute("DELETE FROM trigger_counts WHERE user = ? AND count <= 0", (self.user,))
+        return journal["id"]
+
+    def save_mood_entry(self, mood_data):
+        # returns the row's id, the handle for update_mood_entry
+        _, row_id = self._write(
+            (INSERT_MOOD, dict(mood_row(mood_data), user=self.user), False),
+            (UPSERT_MOOD_ROLLUP, self._mood_rollup_keys([mood_data]), True),
+        )
+        return row_id
+
+    def save_mood_entries(self, entries):
+        if not entries:
+            return 0
+        rowcount, _ = self._write(
+            (INSERT_MOOD, [dict(mood_row(entry), user=self.user) for entry in entries], True),
+            (UPSERT_MOOD_ROLLUP, self._mood_rollup_keys(entries), True),
+        )
+        return rowcount
+
+    def _mood_rollup_keys(self, entries):
+        return [
+            (self.user, g, key, sentiment, sentiment, sentiment)
+            for entry in entries
+            for sentiment in [float(entry["sentiment"])]
+            for g, key in bucket_keys(entry["date"]).items()
+        ]
+
+    def update_mood_entry(self, row_id, mood_data):
+        # new count / last_seen for a row save_mood_entry wrote
+        row = mood_row(mood_data)
+        rowcount, _ = self._write(
+            ("UPDATE mood_log SET count = ?, last_seen = ? WHERE id = ? AND user = ?",
+             (row["count"], row["last_seen"], row_id, self.user), False),
+        )
+        return rowcount > 0
+
+    def iter_mood_entries(self):
+        # oldest first
+        cur = self.connection().execute(f"{MOOD_SELECT} WHERE user = ? ORDER BY date, id", (self.user,))
+        for values in cur:
+            yield mood_row(dict(zip(MOOD_COLUMNS, values)))
+
+    def load_mood_entries(self, since=None):
+        import pandas as pd
+        if since is None:
+            return pd.read_sql_query(
+                f"{MOOD_SELECT} WHERE user = ? ORDER BY date, id", self.connection(), params=(self.user,),
+            )
+        return pd.read_sql_query(
+            f"{MOOD_SELECT} WHERE user = ? AND date >= ? ORDER BY date, id",
+            self.connection(), params=(self.user, since),
+        )
+
+    # -------- Day/week/month rollups --------
+    def _mood_rollups_missing(self):
+        row = self.connection().execute(
+            "SELECT EXISTS (SELECT 1 FROM mood_log) AND NOT EXISTS (SELECT 1 FROM mood_rollups)"
+        ).fetchone()
+        return bool(row[0])
+
+    def rebuild_mood_rollups(self, user=None):
+        # every user's rollups, or only one user's
+        self._write_with(partial(self._rebuild_mood_rollups, user=user))
+
+    @staticmethod
+    def _rebuild_mood_rollups(conn, user=None):
+        where, params = ("AND user = ?", (user,)) if user is not None else ("", ())
+        conn.execute(f"DELETE FROM mood_rollups WHERE 1 {where}", params)
+        for granularity, bucket_sql in ROLLUP_BUCKET_SQL.items():
+            conn.execute(
+                f"""INSERT INTO mood_rollups (user, granularity, bucket, count, total, low, high)
+                    SELECT user, ?, {bucket_sql} AS bucket, count(*), sum(sentiment), min(sentiment), max(sentiment)
+                    FROM mood_log
+                    WHERE sentiment IS NOT NULL AND {bucket_sql} IS NOT NULL {where}
+                    GROUP BY user, bucket""",
+                (granularity, *params),
+            )
+
+    def rebuild_trigger_counts(self):
+        # recount this user's counters from the journal, e.g. after a rescore rewrote its keywords
+        self._write_with(partial(self._rebuild_trigger_counts, user=self.user))
+
+    def _rebuild_trigger_counts(self, conn, user):
+        conn.execute("DELETE FROM trigger_counts WHERE user = ?", (user,))
+        keys = []
+        for date, keywords in conn.execute("SELECT date, keywords FROM journal WHERE user = ?", (user,)):
+            try:
+                keys.extend(self._trigger_count_keys(user, date, keywords or ""))
+            except (TypeError, ValueError):
+                continue
+        conn.executemany(UPSERT_TRIGGER_COUNT, keys)
+
+    def first_mood_day(self):
+        return self.connection().execute(
+            "SELECT min(bucket) FROM mood_rollups WHERE user = ? AND granularity = 'day'", (self.user,)
+        ).fetchone()[0]
+
+    def load_mood_rollup(self, granularity, since=None):
+        import pandas as pd
+        return pd.read_sql_query(
+            """SELECT bucket, count, total / count AS mean, low AS min, high AS max
+               FROM mood_rollups WHERE user = ? AND granularity = ? AND bucket >= ? ORDER BY bucket""",
+            self.connection(), params=(self.user, granularity, since or ""),
+        )[ROLLUP_COLUMNS]
+
+    def clear_mood_log(self):
+        rowcount, _ = self._write(
+            ("DELETE FROM mood_log WHERE user = ?", (self.user,), False),
+            ("DELETE FROM mood_rollups WHERE user = ?", (self.user,), False),
+        )
+        return rowcount > 0
+
+    # -------- Handing the shared history to one user --------
+    def claim_shared_history(self, username):
+        # Rows saved before per-user partitions belong to nobody; give them all to username
+        return self._write_with(partial(self._claim_shared_history, username=username))
+
+    def _claim_shared_history(self, conn, username):
+        counts = {
+            table: conn.execute(f"UPDATE {table} SET user = ? WHERE user = ''", (username,)).rowcount
+            for table in ("journal", "mood_log")
+        }
+        for user in ("", username):
+            self._rebuild_mood_rollups(conn, user)
+            self._rebuild_trigger_counts(conn, user)
+        return counts
+
+    # -------- One-shot CSV import --------
+    def is_migrated(self, conn=None):
+        row = (conn or self.connection()).execute("SELECT value FROM meta WHERE key = 'csv_migrated'").fetchone()
+        return row is not None
+
+    def migrate_from_csv(self):
+        return self._write_with(self._migrate_from_csv)
+
+    def _migrate_from_csv(self, conn):
+        counts = {}
+        if self.is_migrated(conn):
+            return counts
+        counts["users"] = conn.executemany(
+            "INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)",
+            ((r.get("username"), r.get("password") or "") for r in read_csv_rows(USERS_FILE)),
+        ).rowcount
+        counts["login_attempts"] = conn.executemany(
+            "INSERT INTO login_attempts (timestamp, username, status) VALUES (?, ?, ?)",
+            ((r.get("timestamp"), r.get("username"), r.get("status")) for r in read_csv_rows(LOGIN_LOG_FILE)),
+        ).rowcount
+        counts["journal"] = counts["mood_log"] = 0
+        # the shared files, then every user partition
+        for user, directory in [("", None), *csv_partitions()]:
+            partition = CsvStorage(directory, user)
+            counts["journal"] += conn.executemany(
+                "INSERT INTO journal (user, date, entry, sentiment, keywords) VALUES (?, ?, ?, ?, ?)",
+                ((user, r.get("date"), r.get("entry") or "", r.get("sentiment"), r.get("keywords") or "")
+                 for r in read_csv_rows(partition.journal_file)),
+            ).rowcount
+            # older mood logs only have date,sentiment columns
+            counts["mood_log"] += conn.executemany(
+                INSERT_MOOD,
+                (dict(mood_row(r), user=user, sentiment=r.get("sentiment"))
+                 for r in read_csv_rows(partition.mood_log_file)),
+            ).rowcount
+            self._rebuild_trigger_counts(conn, user)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('csv_migrated', datetime('now'))")
+        self._rebuild_mood_rollups(conn)
+        return counts
+
+
+# -------- Cached user directory --------
+class UserDirectory:
+    # username -> password index shared by every session; reloaded only when
+    # the backend's users signature (file mtime/size, newest rowid) changes
+    def __init__(self, backend):
+        self.backend = backend
+        self._users = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        signature = self.backend.users_signature()
+        if self._users is None or signature != self._signature:
+            with self._lock:
+                if self._users is None or signature != self._signature:
+                    self._users = self.backend.load_users()
+                    self._signature = signature
+        return self._users
+
+    def load_users(self):
+        return self._current()
+
+    def find_user(self, username):
+        return self._current().get(username)
+
+    def save_new_user(self, username, password):
+        with self._lock:
+            before = self.backend.users_signature()
+            saved = self.backend.save_new_user(username, password)
+            if saved and self._users is not None:
+                self._users[username] = password
+                # only skip the next reload if nobody else touched the users since we loaded them
+                if before == self._signature:
+                    self._signature = self.backend.users_signature()
+        return saved
+
+
+# -------- Backend selection --------
+BACKENDS = {
+    "csv": CsvStorage,
+    "sqlite": SqliteStorage,
+}
+
+_storage = None
+_user_directory = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    # One storage object per server process, shared by every session
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                backend = os.environ.get("OJA_STORAGE", "sqlite").lower()
+                storage = BACKENDS[backend]()
+                if isinstance(storage, SqliteStorage) and not storage.is_migrated():
+                    storage.migrate_from_csv()
+                _storage = storage
+    return _storage
+
+def get_user_directory():
+    global _user_directory
+    if _user_directory is None:
+        storage = get_storage()
+        with _storage_lock:
+            if _user_directory is None:
+                _user_directory = UserDirectory(storage)
+    return _user_directory
+
+
+if __name__ == "__main__":
+    # python storage.py migrate [db_file]
+    # python storage.py compact-mood-log [username]
+    # python storage.py claim-shared-history username
+    if len(sys.argv) >= 2 and sys.argv[1] == "compact-mood-log":
+        partition = CsvStorage().for_user(sys.argv[2] if len(sys.argv) > 2 else "")
+        partition.compact_mood_log()
+        path = partition.mood_log_file
+        print(f"{path} compacted ({os.path.getsize(path) if os.path.exists(path) else 0} bytes)")
+        sys.exit(0)
+    if len(sys.argv) == 3 and sys.argv[1] == "claim-shared-history":
+        try:
+            counts = get_storage().claim_shared_history(sys.argv[2])
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        for table, count in counts.items():
+            print(f"{table}: {count} rows now belong to {sys.argv[2]}")
+        sys.exit(0)
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("usage: python storage.py migrate [db_file] | compact-mood-log [username] | claim-shared-history username")
+        sys.exit(1)
+    target = SqliteStorage(sys.argv[2] if len(sys.argv) > 2 else DB_FILE)
+    if target.is_migrated():
+        print(f"{target.path} already holds the imported CSV data.")
+    else:
+        for table, count in target.migrate_from_csv().items():
+            print(f"{table}: {count} rows imported")
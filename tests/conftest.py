@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# the app's modules live at the repository root, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # storage paths are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,128 @@
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import analysis
+from analysis import AnalysisPool, AnalysisBusy, AnalysisTimeout
+
+
+def slow_analyze(seconds):
+    real = analysis.analyze
+    return lambda entry: (time.sleep(seconds), real(entry))[1]
+
+
+def wait_done(future, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not future.done() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_scores_and_saves():
+    pool = AnalysisPool(threads=2, processes=0)
+    saved = []
+    future = pool.submit("I always worry", lambda sentiment, keywords: saved.append(keywords))
+    wait_done(future)
+    assert pool.poll(future) == future.result()
+    assert saved == [["always"]]
+    assert pool.stats()["completed"] == 1
+    pool.close()
+
+
+def test_timeout_means_nothing_is_saved(monkeypatch):
+    monkeypatch.setattr(analysis, "analyze", slow_analyze(0.4))
+    pool = AnalysisPool(threads=1, processes=0, timeout=0.1)
+    saved = []
+    future = pool.submit("late entry", lambda *scored: saved.append(scored))
+    time.sleep(0.15)
+    with pytest.raises(AnalysisTimeout):
+        pool.poll(future)
+    wait_done(future)
+    assert saved == []
+    assert isinstance(future.exception(), AnalysisTimeout)
+    pool.close()
+
+
+def test_scored_too_late_to_save_even_unpolled(monkeypatch):
+    monkeypatch.setattr(analysis, "analyze", slow_analyze(0.3))
+    pool = AnalysisPool(threads=1, processes=0, timeout=0.1)
+    saved = []
+    future = pool.submit("late entry", lambda *scored: saved.append(scored))
+    wait_done(future)
+    assert "too late" in str(future.exception())
+    assert saved == []
+    assert pool.stats()["timed_out"] == 1
+    pool.close()
+
+
+def test_a_job_already_saving_is_waited_for():
+    pool = AnalysisPool(threads=1, processes=0, timeout=0.1)
+    saving = threading.Event()
+    finish = threading.Event()
+
+    def save(*scored):
+        saving.set()
+        finish.wait(5)
+
+    future = pool.submit("entry", save)
+    saving.wait(5)
+    time.sleep(0.15)  # past the deadline, but the save has started
+    assert pool.poll(future) is None
+    finish.set()
+    wait_done(future)
+    assert pool.poll(future) == future.result()
+    pool.close()
+
+
+class HeldWorkers:
+    # stands in for the process pool: tasks run once release is set, like a busy worker
+    def __init__(self):
+        self.release = threading.Event()
+        self._executor = ThreadPoolExecutor(4)
+
+    def submit(self, fn, entry):
+        return self._executor.submit(lambda: (self.release.wait(5), fn(entry))[1])
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.release.set()
+        self._executor.shutdown(wait=wait)
+
+
+def test_timed_out_scoring_keeps_its_slot_until_the_worker_is_done():
+    pool = AnalysisPool(threads=2, processes=0, max_pending=1, timeout=0.1)
+    workers = pool._processes = HeldWorkers()
+    future = pool.submit("stuck entry")
+    wait_done(future)
+    assert isinstance(future.exception(), AnalysisTimeout)
+    # the worker is still busy with the entry, so the pool is still full
+    with pytest.raises(AnalysisBusy):
+        pool.submit("next entry")
+    workers.release.set()
+    deadline = time.monotonic() + 5
+    while pool.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.stats()["pending"] == 0
+    pool.submit("next entry")
+    pool.close()
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_recovers_when_a_worker_process_dies():
+    pool = AnalysisPool(threads=1, processes=1, timeout=60)
+    first = pool.submit("warm up the worker")
+    wait_done(first, 60)
+    assert first.exception() is None
+    for process in list(pool._processes._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+    time.sleep(0.5)
+    future = pool.submit("I always worry")
+    wait_done(future, 60)
+    assert future.result()[1] == ["always"]
+    assert pool.stats()["restarts"] == 1
+    again = pool.submit("again")
+    wait_done(again, 60)
+    assert again.exception() is None
+    pool.close()
@@ -0,0 +1,113 @@
+import io
+import json
+
+import pytest
+
+import backup
+from backup import SeenHashes, clean_journal_row, clean_mood_row, detect_format, export_chunks, import_file
+from storage import CsvStorage, SqliteStorage
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def storage(request, workdir):
+    backend = CsvStorage() if request.param == "csv" else SqliteStorage(str(workdir / "oja.db"))
+    return backend.for_user("amy")
+
+
+def journal(**fields):
+    return {"date": "2024-03-01 10:00:00", "entry": "rain again", "sentiment": 0.25, "keywords": "again", **fields}
+
+
+def ndjson(*records):
+    return io.BytesIO("".join(json.dumps(record) + "\n" for record in records).encode())
+
+
+def texts(storage):
+    return [row["entry"] for row in storage.iter_entries()]
+
+
+@pytest.mark.parametrize("date", ["", None, "yesterday", "2024-13-01", "2024-02-30 10:00:00", 20240301])
+def test_bad_dates_are_rejected(date):
+    with pytest.raises(ValueError, match="date"):
+        clean_journal_row(journal(date=date))
+
+
+@pytest.mark.parametrize("sentiment", [1.5, -1.01, "nan", float("nan"), "inf", "very happy", [0.1]])
+def test_sentiment_outside_minus_one_to_one_is_rejected(sentiment):
+    with pytest.raises(ValueError, match="sentiment"):
+        clean_journal_row(journal(sentiment=sentiment))
+    with pytest.raises(ValueError, match="sentiment"):
+        clean_mood_row({"date": "2024-03-01", "text": "ok", "sentiment": sentiment})
+
+
+def test_valid_rows_are_kept_as_written():
+    assert clean_journal_row(journal(sentiment="-1", keywords=["work", "sleep"], date=" 2024-03-01 ")) == {
+        "date": "2024-03-01", "entry": "rain again", "sentiment": -1.0, "keywords": "work, sleep",
+    }
+    assert clean_mood_row({"date": "2024-03-01", "text": "ok", "sentiment": "1"}) == {
+        "date": "2024-03-01", "text": "ok", "sentiment": 1.0, "count": 1, "last_seen": "2024-03-01",
+    }
+    with pytest.raises(ValueError, match="empty entry"):
+        clean_journal_row(journal(entry="   "))
+
+
+def test_seen_hashes_merge_past_an_eighth_of_the_sorted_array(monkeypatch):
+    monkeypatch.setattr(backup, "IMPORT_BATCH_ROWS", 4)
+    seen = SeenHashes(range(0, 80, 2))   # 40 sorted: recent rows merge once there are more than 5
+    for key in range(1, 11, 2):
+        seen.add(key)
+    assert len(seen._sorted) == 40 and len(seen._recent) == 5
+    seen.add(11)
+    assert len(seen._sorted) == 46 and not seen._recent
+    assert list(seen._sorted) == sorted(seen._sorted)
+    assert all(key in seen for key in [*range(0, 80, 2), 1, 3, 5, 7, 9, 11])
+    assert 13 not in seen and 81 not in seen
+
+
+def test_import_saves_valid_rows_and_reports_the_rest(storage):
+    report = import_file(storage, ndjson(
+        journal(),
+        journal(entry="rain again"),                    # same text twice in one file
+        journal(entry="bad date", date="someday"),
+        journal(entry="too happy", sentiment=3),
+        {"dataset": "mood_log", "date": "2024-03-01", "text": "ok", "sentiment": 0.2},
+        {"dataset": "mood_log", "date": "2024-03-01", "text": "ok", "sentiment": 0.2},
+        {"dataset": "recipes"},
+    ))
+    assert report.saved == {"journal": 1, "mood_log": 2}
+    assert report.duplicates == 1 and report.invalid == 3
+    assert [error.split(":")[0] for error in report.errors] == ["line 3", "line 4", "line 7"]
+    assert texts(storage) == ["rain again"]
+
+
+def test_importing_the_same_file_twice_saves_nothing_new(storage):
+    storage.save_entry(journal(entry="already here"))
+    backup_file = ndjson(journal(), journal(entry="already here"), journal(entry="sunny walk"),
+                         {"dataset": "mood_log", "date": "2024-03-01", "text": "ok", "sentiment": 0.2})
+    first = import_file(storage, backup_file)
+    assert first.saved == {"journal": 2, "mood_log": 1} and first.duplicates == 1
+    backup_file.seek(0)
+    again = import_file(storage, backup_file)
+    assert again.saved == {"journal": 0, "mood_log": 0} and again.duplicates == 4
+    assert sorted(texts(storage)) == ["already here", "rain again", "sunny walk"]
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_an_export_imports_back_into_another_user(storage, fmt):
+    storage.save_entry(journal())
+    storage.save_entry(journal(entry="sunny walk", keywords=""))
+    exported = io.BytesIO(b"".join(export_chunks(storage, "journal", fmt, chunk_rows=1)))
+    assert detect_format(exported) == fmt
+    other = storage.for_user("bob")
+    report = import_file(other, exported)
+    assert report.saved["journal"] == 2 and report.invalid == 0
+    assert texts(other) == texts(storage)
+
+
+def test_format_comes_from_the_name_then_the_contents():
+    csv_like = io.BytesIO(b'{"looks": "like json"}\n')
+    assert detect_format(csv_like, "backup.csv") == "csv"
+    assert detect_format(io.BytesIO(b"date,entry\n"), "backup.jsonl") == "ndjson"
+    assert detect_format(csv_like) == "ndjson"
+    assert detect_format(io.BytesIO(b"date,entry,sentiment,keywords\n")) == "csv"
+    assert csv_like.tell() == 0   # sniffing rewinds for the reader
@@ -0,0 +1,61 @@
+import random
+
+import pandas as pd
+import pytest
+
+from storage import CsvStorage, mood_frame
+
+
+def mood(day, text="ok", sentiment=0.2):
+    return {"date": f"2024-03-{day:02d} 10:00:00", "text": text, "sentiment": sentiment}
+
+
+def naive(storage, since):
+    history = mood_frame(pd.read_csv(storage.mood_log_file))
+    return history[history["date"].astype(str) >= since]
+
+
+def same_rows(history, expected):
+    assert list(history.columns) == list(expected.columns)
+    assert history.to_dict("records") == expected.to_dict("records")
+
+
+@pytest.fixture
+def storage(workdir):
+    return CsvStorage().for_user("amy")
+
+
+def test_since_matches_a_full_parse(storage):
+    for day in range(1, 29):
+        storage.save_mood_entry(mood(day, text="multi\nline, \"quoted\"" if day % 5 == 0 else "ok"))
+    for since in ["2024-01-01", "2024-03-01", "2024-03-14", "2024-03-14 10:00:00", "2024-03-28 10:00:01", "2025"]:
+        same_rows(storage.load_mood_entries(since=since), naive(storage, since))
+    assert len(storage.load_mood_entries(since="2024-03-20")) == 9
+
+
+def test_older_rows_keep_the_log_in_date_order(storage):
+    days = list(range(1, 21))
+    random.Random(3).shuffle(days)
+    storage.save_mood_entries([mood(day) for day in days[:10]])   # an imported backup, in any order
+    for day in days[10:]:
+        storage.save_mood_entry(mood(day, sentiment=-0.5))
+    dates = pd.read_csv(storage.mood_log_file)["date"]
+    assert dates.is_monotonic_increasing and len(dates) == 20
+    same_rows(storage.load_mood_entries(since="2024-03-11"), naive(storage, "2024-03-11"))
+
+
+def test_an_unsorted_log_from_before_is_sorted_once(storage):
+    storage.save_mood_entry(mood(1))
+    with open(storage.mood_log_file, "a") as file:   # written out of order by an older version
+        file.write("2024-03-09 10:00:00,ok,0.1,1,\n2024-03-05 10:00:00,ok,0.3,1,\n")
+    history = storage.load_mood_entries(since="2024-03-04")
+    assert list(history["date"]) == ["2024-03-05 10:00:00", "2024-03-09 10:00:00"]
+    assert pd.read_csv(storage.mood_log_file)["date"].is_monotonic_increasing
+
+
+def test_old_layouts_are_read_too(storage):
+    with open(storage.mood_log_file, "w") as file:
+        file.write("date,sentiment\n2024-03-01,0.1\n2024-03-02,0.4\n")
+    history = storage.load_mood_entries(since="2024-03-02")
+    assert list(history["date"]) == ["2024-03-02"] and list(history["count"]) == [1]
+    assert list(history["last_seen"]) == ["2024-03-02"]
@@ -0,0 +1,75 @@
+import csv
+import os
+
+from storage import CsvRowIndex, CsvStorage, JOURNAL_COLUMNS
+
+ROWS = [
+    ["2024-01-01 09:00:00", "plain", "0.1", ""],
+    ["2024-01-02 09:00:00", "comma, inside", "-0.2", "why, again"],
+    ["2024-01-03 09:00:00", "line one\nline two\n\nline four", "0.0", "never"],
+    ["2024-01-04 09:00:00", 'she said "hi"\nand "left"', "0.3", ""],
+    ["2024-01-05 09:00:00", "crlf\r\ninside, and ünïcode ✨", "0.5", "past"],
+    ["2024-01-06 09:00:00", '"', "0.0", ""],
+]
+
+
+def write_csv(path, rows, mode="w", header=True):
+    with open(path, mode, newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        if header:
+            writer.writerow(JOURNAL_COLUMNS)
+        writer.writerows(rows)
+
+
+def test_offsets_land_on_quoted_and_multiline_rows(tmp_path):
+    path = tmp_path / "journal.csv"
+    write_csv(path, ROWS)
+    index = CsvRowIndex(str(path))
+    assert index.refresh() == len(ROWS)
+    with open(path, "rb") as file:
+        data = file.read()
+    for i, offset in enumerate(index.offsets):
+        assert data[offset:].startswith(ROWS[i][0].encode())
+        assert index.read_rows(i, i) == [ROWS[i]]
+    assert index.read_rows(0, len(ROWS) - 1) == ROWS
+    assert index.indexed_bytes == len(data)
+
+
+def test_grows_incrementally_and_waits_for_a_half_written_row(tmp_path):
+    path = tmp_path / "journal.csv"
+    write_csv(path, ROWS[:2])
+    index = CsvRowIndex(str(path))
+    assert index.refresh() == 2
+    # a multiline row cut off inside its quotes is not a row yet
+    with open(path, "a", newline="", encoding="utf-8") as file:
+        file.write('2024-01-07 09:00:00,"still\nwriting')
+    assert index.refresh() == 2
+    with open(path, "a", newline="", encoding="utf-8") as file:
+        file.write(' it",0.0,\r\n')
+    assert index.refresh() == 3
+    assert index.read_rows(2, 2) == [["2024-01-07 09:00:00", "still\nwriting it", "0.0", ""]]
+    write_csv(path, ROWS[2:], mode="a", header=False)
+    assert index.refresh() == 3 + len(ROWS) - 2
+    assert index.read_rows(3, 3 + len(ROWS) - 3) == ROWS[2:]
+
+
+def test_rewritten_file_is_indexed_again(tmp_path):
+    path = tmp_path / "journal.csv"
+    write_csv(path, ROWS)
+    index = CsvRowIndex(str(path))
+    index.refresh()
+    tmp = tmp_path / "journal.tmp"
+    write_csv(tmp, ROWS[3:])
+    os.replace(tmp, path)
+    assert index.refresh() == len(ROWS) - 3
+    assert index.read_rows(0, 0) == [ROWS[3]]
+
+
+def test_journal_pages_with_multiline_entries(workdir):
+    storage = CsvStorage().for_user("amy")
+    for date, entry, sentiment, keywords in ROWS:
+        storage.save_entry({"date": date, "entry": entry, "sentiment": float(sentiment), "keywords": keywords})
+    page = storage.load_entries_page(0, 4)
+    assert [journal["entry"] for journal in page] == [row[1] for row in reversed(ROWS)][:4]
+    assert [journal["id"] for journal in page] == [6, 5, 4, 3]
+    assert [journal["entry"] for journal in storage.load_entries_page(4, 4)] == [ROWS[1][1], ROWS[0][1]]
@@ -0,0 +1,38 @@
+import pytest
+
+from journal_store import JournalStore, get_entry_hash, memory_report
+from storage import CsvStorage, SqliteStorage
+
+
+def test_add_lookup_delete_and_duplicates():
+    store = JournalStore("amy")
+    first = store.add("I always worry", -0.2, ["always"], "2024-03-01 10:00")
+    assert store.add("  I always worry\n", 0.0, [], "2024-03-01 10:01") is None
+    assert "I always worry " in store and len(store) == 1
+    assert store.find_by_hash(get_entry_hash("I always worry"))["keywords"] == ["always"]
+    assert store.delete(first) and not store.delete(first)
+    assert "I always worry" not in store
+    assert store.footprint()["memory_bytes"] == 0
+
+
+def test_budget_evicts_the_oldest_metadata():
+    store = JournalStore("amy", budget=2000)
+    for i in range(100):
+        store.add(f"entry {i}", 0.0, ["why"], f"2024-03-01 10:{i:02d}")
+    footprint = store.footprint()
+    assert 0 < footprint["memory_bytes"] <= 2000
+    assert footprint["entries"] + footprint["evicted"] == 100
+    assert "entry 99" in store and "entry 0" not in store
+    assert store.evicted_since == "2024-03-01 10:00"
+    assert memory_report()["total"]["evicted"] >= footprint["evicted"]
+
+
+@pytest.mark.parametrize("backend", ["csv", "sqlite"])
+def test_storage_answers_for_evicted_entries(backend, workdir):
+    storage = (CsvStorage() if backend == "csv" else SqliteStorage(str(workdir / "oja.db"))).for_user("amy")
+    for i, date in enumerate(["2024-02-28 09:00:00", "2024-03-01 10:00:00", "2024-03-01 10:05:00"]):
+        storage.save_entry({"date": date, "entry": f"entry {i}", "sentiment": 0.0, "keywords": ""})
+    assert storage.has_entry(" entry 1 ", "2024-03-01 10:00")
+    assert storage.has_entry("entry 2", "2024-03-01 10:00")
+    assert not storage.has_entry("entry 0", "2024-03-01 10:00")   # saved before the session
+    assert not storage.has_entry("entry 3", "2024-03-01 10:00")
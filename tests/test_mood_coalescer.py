@@ -0,0 +1,111 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import mood_coalescer
+from mood_coalescer import MoodCoalescer
+from storage import CsvStorage, SqliteStorage
+
+START = datetime(2024, 3, 1, 10, 0, 0)
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def storage(request, workdir):
+    backend = CsvStorage() if request.param == "csv" else SqliteStorage(str(workdir / "oja.db"))
+    return backend.for_user("amy")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # datetime.now() in the coalescer, moved on by hand
+    class Clock:
+        now_value = START
+
+        @classmethod
+        def now(cls):
+            return cls.now_value
+
+        @classmethod
+        def advance(cls, seconds):
+            cls.now_value += timedelta(seconds=seconds)
+
+    monkeypatch.setattr(mood_coalescer, "datetime", Clock)
+    return Clock
+
+
+@pytest.fixture
+def coalescer():
+    coalescer = MoodCoalescer(window=60)
+    yield coalescer
+    coalescer.close()
+
+
+def rows(storage):
+    return [(row["date"], row["text"], row["sentiment"], row["count"], row["last_seen"])
+            for row in storage.iter_mood_entries()]
+
+
+def test_repeats_merge_into_one_row_with_count_and_last_seen(storage, clock, coalescer):
+    for _ in range(5):
+        coalescer.observe(storage, "(Radio selection)", 0.5)
+        clock.advance(7)
+    # written once as soon as it opened, updated when a different mood closes it
+    assert rows(storage) == [("2024-03-01 10:00:00", "(Radio selection)", 0.5, 1, "2024-03-01 10:00:00")]
+    coalescer.observe(storage, "(Radio selection)", -0.5)
+    assert rows(storage) == [
+        ("2024-03-01 10:00:00", "(Radio selection)", 0.5, 5, "2024-03-01 10:00:28"),
+        ("2024-03-01 10:00:35", "(Radio selection)", -0.5, 1, "2024-03-01 10:00:35"),
+    ]
+    assert coalescer.stats() == {"observed": 6, "written": 2, "updated": 1, "open": 1}
+
+
+def test_each_user_has_their_own_open_row(storage, clock, coalescer):
+    bob = storage.for_user("bob")
+    for who in (storage, bob, storage, bob, bob):
+        coalescer.observe(who, "(Radio selection)", 0.0)
+        clock.advance(1)
+    coalescer.flush()
+    assert [row[3] for row in rows(storage)] == [2]
+    assert [row[3] for row in rows(bob)] == [3]
+
+
+def test_closing_writes_the_open_rows(storage, clock):
+    # what happens to the rows of sessions still open when the server shuts down
+    coalescer = MoodCoalescer(window=60)
+    for _ in range(3):
+        coalescer.observe(storage, "(Radio selection)", 1.0)
+        clock.advance(2)
+    coalescer.close()
+    assert rows(storage) == [("2024-03-01 10:00:00", "(Radio selection)", 1.0, 3, "2024-03-01 10:00:04")]
+    assert coalescer.stats()["open"] == 0
+    # nothing left to write twice
+    coalescer.flush()
+    assert coalescer.stats()["updated"] == 1
+
+
+def test_an_abandoned_row_is_written_when_its_window_runs_out(storage, clock):
+    # a session that just stops rerunning: the background thread closes its row
+    coalescer = MoodCoalescer(window=0.2)
+    try:
+        coalescer.observe(storage, "(Radio selection)", 0.5)
+        clock.advance(1)
+        coalescer.observe(storage, "(Radio selection)", 0.5)
+        deadline = time.monotonic() + 5
+        while coalescer.stats()["open"] and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert rows(storage) == [("2024-03-01 10:00:00", "(Radio selection)", 0.5, 2, "2024-03-01 10:00:01")]
+        # the same mood after the window opens a new row
+        coalescer.observe(storage, "(Radio selection)", 0.5)
+        assert [row[3] for row in rows(storage)] == [2, 1]
+    finally:
+        coalescer.close()
+
+
+def test_a_discarded_row_is_never_updated(storage, clock, coalescer):
+    coalescer.observe(storage, "(Radio selection)", 0.5)
+    coalescer.observe(storage, "(Radio selection)", 0.5)
+    assert storage.clear_mood_log()
+    coalescer.discard(storage)
+    coalescer.flush()
+    assert rows(storage) == []
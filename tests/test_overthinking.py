@@ -0,0 +1,45 @@
+import random
+import re
+
+import pytest
+
+from overthinking import KeywordMatcher, overthinking_keywords, detect_overthinking, is_word_char
+
+
+def naive_find_all(phrases, text, whole_words):
+    # every occurrence of every phrase, by plain substring search
+    text = text.lower()
+    found = []
+    for phrase in dict.fromkeys(p.lower() for p in phrases if p):
+        left = r"(?<!\w)" if whole_words and is_word_char(phrase[0]) else ""
+        right = r"(?!\w)" if whole_words and is_word_char(phrase[-1]) else ""
+        pattern = re.compile(f"(?=({left}{re.escape(phrase)}{right}))")
+        found.extend((m.start(1), m.end(1), phrase) for m in pattern.finditer(text))
+    return sorted(found)
+
+
+def random_texts(count, seed=4):
+    rng = random.Random(seed)
+    pieces = overthinking_keywords + ["a", "the", "sure", "nots", "always-", "why?", "_past", "Never", " ", ". ", ",", "\n"]
+    for _ in range(count):
+        yield "".join(rng.choice(pieces) + rng.choice(["", " ", "", "x"]) for _ in range(rng.randint(0, 30)))
+
+
+@pytest.mark.parametrize("whole_words", [True, False])
+def test_matches_naive_substring_search(whole_words):
+    matcher = KeywordMatcher(overthinking_keywords)
+    for text in random_texts(300):
+        assert matcher.find_all(text, whole_words) == naive_find_all(overthinking_keywords, text, whole_words), text
+
+
+def test_overlapping_and_nested_phrases():
+    phrases = ["he", "she", "his", "hers", "i can't", "can't", "i can't stop thinking about"]
+    matcher = KeywordMatcher(phrases, whole_words=False)
+    for text in ["ushers", "hishershe", "I can't stop thinking about it, I can't", ""]:
+        assert matcher.find_all(text) == naive_find_all(phrases, text, False)
+
+
+def test_detect_overthinking_keeps_lexicon_order_and_whole_words():
+    found = detect_overthinking("Why did I always NOT sleep? Nothing... nothingness, notable")
+    assert found == [k for k in overthinking_keywords if k in ("always", "not", "why", "nothing", "why did i")]
+    assert detect_overthinking("") == []
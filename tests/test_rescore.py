@@ -0,0 +1,44 @@
+import pytest
+
+import rescore
+from search import SearchIndex
+from storage import CsvStorage, SqliteStorage
+from triggers import trigger_buckets
+
+DATE = "2024-03-01 10:00:00"
+TEXT = "I always worry what if I fail"
+
+
+def top_keywords(storage):
+    granularity, bucket = next(iter(trigger_buckets(DATE).items()))
+    return dict(storage.load_top_triggers(granularity, bucket)["keywords"])
+
+
+def stale_entry(storage):
+    # saved by an older version that found no keywords
+    storage.save_entry({"date": DATE, "entry": TEXT, "sentiment": 0.0, "keywords": ""})
+
+
+@pytest.mark.parametrize("user", ["", "amy"])
+def test_rescoring_one_csv_file_rebuilds_its_counters(workdir, user):
+    storage = CsvStorage().for_user(user)
+    stale_entry(storage)
+    index = SearchIndex(storage)
+    assert index.search("", keyword="always")[0] == 0
+    rescore.main(["--source", "csv", "--file", storage.journal_file, "--workers", "1"])
+    assert top_keywords(storage) == {"always": 1, "what if": 1}
+    # same number of rows, but the running app's index sees the new keywords
+    assert index.search("", keyword="always")[0] == 1
+
+
+def test_rescoring_sqlite_rebuilds_every_user(workdir):
+    path = str(workdir / "oja.db")
+    storage = SqliteStorage(path)
+    for user in ("", "amy"):
+        stale_entry(storage.for_user(user))
+    index = SearchIndex(storage.for_user("amy"))
+    assert index.search("", keyword="always")[0] == 0
+    rescore.main(["--source", "sqlite", "--db", path, "--workers", "1"])
+    for user in ("", "amy"):
+        assert top_keywords(storage.for_user(user)) == {"always": 1, "what if": 1}
+    assert index.search("", keyword="always")[0] == 1
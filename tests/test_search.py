@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from search import LiveDocs, SearchIndex, tokenize
+from storage import CsvStorage, SqliteStorage
+
+WORDS = ["rain", "work", "sleep", "mom", "exam", "coffee", "walk", "tired", "happy", "late"]
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def storage(request, workdir):
+    backend = CsvStorage() if request.param == "csv" else SqliteStorage(str(workdir / "oja.db"))
+    return backend.for_user("amy")
+
+
+def save(storage, index, text, keywords=""):
+    entry = {"date": "2024-03-01 10:00:00", "entry": text, "sentiment": 0.0, "keywords": keywords}
+    index.add(storage.save_entry(entry), entry)
+
+
+def naive(texts, query):
+    terms = tokenize(query)
+    return sorted(text for text in texts if all(term in tokenize(text) for term in terms))
+
+
+def results(index, query):
+    total, rows = index.search(query, page_size=1000)
+    assert total == len(rows)
+    return sorted(row["entry"] for row in rows)
+
+
+def test_search_after_deletes_matches_a_naive_scan(storage):
+    rng = random.Random(17)
+    index = SearchIndex(storage)
+    texts = [f"{i} " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))) for i in range(60)]
+    for text in texts:
+        save(storage, index, text)
+    index.search("")  # built from storage; later saves and deletes are applied in place
+    live = list(texts)
+    for _ in range(25):
+        page = storage.load_entries_page(rng.randrange(len(live)), 1)
+        journal = page[0]
+        deleted = storage.delete_entry(journal)
+        assert deleted == journal["id"]
+        index.remove(deleted)
+        live.remove(journal["entry"])
+        if rng.random() < 0.3:
+            text = f"new {len(texts)} " + rng.choice(WORDS)
+            texts.append(text)
+            live.append(text)
+            save(storage, index, text)
+        query = " ".join(rng.sample(WORDS, rng.randint(1, 2)))
+        assert results(index, query) == naive(live, query)
+    assert results(index, "") == sorted(live)
+    # a fresh index built from storage agrees with the one updated in place
+    rebuilt = SearchIndex(storage)
+    for word in WORDS:
+        assert results(rebuilt, word) == results(index, word)
+
+
+def test_deleted_entries_never_come_back(storage):
+    index = SearchIndex(storage)
+    for text in ["rain again", "more rain today", "sunny walk"]:
+        save(storage, index, text, "again")
+    total, rows = index.search("rain")
+    assert total == 2
+    first = next(row for row in rows if row["entry"] == "rain again")
+    index.remove(storage.delete_entry(first))
+    assert results(index, "rain") == ["more rain today"]
+    assert results(index, '"rain again"') == []
+    assert index.search("", keyword="again")[0] == 2
+    assert [row["entry"] for row in index.search("walk")[1]] == ["sunny walk"]
+
+
+def test_stale_csv_id_removes_the_row_actually_deleted(workdir):
+    storage = CsvStorage().for_user("amy")
+    index = SearchIndex(storage)
+    for text in ["first rain", "second walk", "third coffee"]:
+        save(storage, index, text)
+    index.search("")
+    rows = {row["entry"]: row for row in storage.load_entries_page(0, 10)}
+    stale = rows["third coffee"]
+    assert stale["id"] == 3
+    index.remove(storage.delete_entry(rows["first rain"]))
+    # id 3 is past the end now; storage finds the row by date and text at row 2
+    deleted = storage.delete_entry(stale)
+    assert deleted == 2
+    index.remove(deleted)
+    assert results(index, "") == ["second walk"]
+    assert [row["id"] for row in index.search("walk")[1]] == [1]
+
+
+def test_live_docs_rank_and_select_follow_deletes():
+    rng = random.Random(5)
+    live_docs, docs = LiveDocs(), []
+    for doc in range(200):
+        live_docs.append()
+        docs.append(doc)
+        if docs and rng.random() < 0.4:
+            live_docs.remove(docs.pop(rng.randrange(len(docs))))
+    assert live_docs.count == len(docs)
+    for rank, doc in enumerate(docs, 1):
+        assert live_docs.rank(doc) == rank
+        assert live_docs.select(rank) == doc
+    assert live_docs.select(0) is None and live_docs.select(len(docs) + 1) is None
@@ -0,0 +1,47 @@
+import csv
+import os
+import random
+
+import pytest
+
+from sentiment import IncrementalSentiment, polarity, split_sentences
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sentiment_sample.csv")
+# how far the live score may drift from scoring the whole text (see IncrementalSentiment)
+TOLERANCE = 0.05
+
+
+@pytest.fixture(scope="module")
+def sample():
+    with open(SAMPLE_FILE, newline="", encoding="utf-8") as file:
+        return [row["text"] for row in csv.DictReader(file)]
+
+
+def test_one_sentence_scores_exactly_like_the_whole_text(sample):
+    for text in sample:
+        if len(split_sentences(text)) == 1:
+            assert IncrementalSentiment().update(text) == pytest.approx(polarity(text), abs=1e-12)
+
+
+def test_several_sentences_stay_within_the_tolerance(sample):
+    rng = random.Random(1)
+    for _ in range(2000):
+        text = rng.choice([" ", "\n", "  "]).join(rng.sample(sample, rng.randint(2, 6)))
+        assert abs(IncrementalSentiment().update(text) - polarity(text)) <= TOLERANCE, text
+
+
+def test_a_boost_across_sentences_is_where_they_differ():
+    # the "!" boosts "hate" in the whole text; the sentence it ends has nothing to boost
+    text = "I hate it. I got the job!"
+    assert IncrementalSentiment().update(text) != pytest.approx(polarity(text))
+
+
+def test_an_edit_rescores_only_the_changed_sentences(sample):
+    live = IncrementalSentiment()
+    text = " ".join(sample[:4])
+    live.update(text)
+    assert live.rescored == 4
+    live.update(text + " Then it rained.")
+    assert live.rescored == 1
+    live.update(text.replace(sample[1], "It was a lovely day."))
+    assert live.rescored == 1
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+from storage import CsvStorage, SqliteStorage
+from triggers import trigger_buckets
+
+DATE = "2024-03-01 10:00:00"
+
+
+def entry(text, keywords=""):
+    return {"date": DATE, "entry": text, "sentiment": 0.5, "keywords": keywords}
+
+
+def texts(storage):
+    return [row["entry"] for row in storage.iter_entries()]
+
+
+def top(storage):
+    granularity, bucket = next(iter(trigger_buckets(DATE).items()))
+    return storage.load_top_triggers(granularity, bucket)
+
+
+def test_connections_use_wal(workdir):
+    storage = SqliteStorage(str(workdir / "oja.db"))
+    assert storage.connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_every_query_is_scoped_to_its_user(workdir):
+    storage = SqliteStorage(str(workdir / "oja.db"))
+    amy, bob = storage.for_user("amy"), storage.for_user("bob")
+    amy.save_entry(entry("amy's day", "work"))
+    bob.save_entry(entry("bob's day", "exam"))
+    assert texts(amy) == ["amy's day"] and texts(bob) == ["bob's day"]
+    assert texts(storage) == []
+    assert top(amy)["keywords"] == [("work", 1)]
+    # one user can't delete another's row by id
+    assert bob.delete_entry(dict(entry("amy's day", "work"), id=1)) is None
+    assert texts(amy) == ["amy's day"]
+
+
+def test_old_databases_get_a_user_column(workdir):
+    path = str(workdir / "oja.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE journal (id INTEGER PRIMARY KEY, date TEXT NOT NULL, entry TEXT NOT NULL,"
+                     " sentiment REAL, keywords TEXT)")
+        conn.execute("INSERT INTO journal (date, entry, sentiment, keywords) VALUES (?, 'from before', 0.1, '')",
+                     (DATE,))
+    conn.close()
+    storage = SqliteStorage(path)
+    columns = [row[1] for row in storage.connection().execute("PRAGMA table_info(journal)")]
+    assert "user" in columns
+    # existing rows stay in the shared partition
+    assert texts(storage) == ["from before"]
+    assert texts(storage.for_user("amy")) == []
+
+
+@pytest.fixture
+def csv_history(workdir):
+    CsvStorage().save_new_user("amy", "hash")
+    shared = CsvStorage()
+    shared.save_entry(entry("shared rain", "rain"))
+    shared.save_entry(entry("shared rain and work", "rain, work"))
+    amy = CsvStorage().for_user("amy")
+    amy.save_entry(entry("amy's exam", "exam"))
+    amy.save_mood_entry({"date": DATE, "text": "ok", "sentiment": 0.2})
+    return workdir
+
+
+def test_migration_copies_every_partition_with_its_counters(csv_history):
+    storage = SqliteStorage(str(csv_history / "oja.db"))
+    counts = storage.migrate_from_csv()
+    assert counts["users"] == 1 and counts["journal"] == 3 and counts["mood_log"] == 1
+    assert storage.find_user("amy") == "hash"
+    assert texts(storage) == ["shared rain", "shared rain and work"]
+    assert texts(storage.for_user("amy")) == ["amy's exam"]
+    # the shared partition's trigger counters are rebuilt too, not just the users'
+    assert top(storage)["keywords"] == [("rain", 2), ("work", 1)]
+    assert top(storage.for_user("amy"))["keywords"] == [("exam", 1)]
+
+
+def test_migration_runs_once(csv_history):
+    path = str(csv_history / "oja.db")
+    SqliteStorage(path).migrate_from_csv()
+    # a second run, even from a fresh process, imports nothing again
+    storage = SqliteStorage(path)
+    assert storage.is_migrated()
+    assert storage.migrate_from_csv() == {}
+    assert storage.connection().execute("SELECT count(*) FROM journal").fetchone()[0] == 3
+    assert top(storage)["entries"] == 2
@@ -0,0 +1,88 @@
+import pytest
+
+import throttle
+from throttle import LoginThrottle, SlidingWindow, client_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(throttle.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_throttle(reports, **limits):
+    return LoginThrottle(reports.append, report_seconds=1e9, **dict({"per_user": 3, "per_client": 5, "window": 60}, **limits))
+
+
+def test_sliding_window_allows_limit_attempts_per_window():
+    window = SlidingWindow(limit=3, window=10)
+    for t in (0, 1, 2):
+        assert window.retry_after("k", t) == 0.0
+        window.record("k", t)
+    assert window.retry_after("k", 5) == pytest.approx(5.0)
+    # the window slides: the oldest attempt drops out at t=10, the next at t=11
+    assert window.retry_after("k", 10) == 0.0
+    window.record("k", 10)
+    assert window.retry_after("k", 10.5) == pytest.approx(0.5)
+
+
+def test_idle_and_excess_keys_are_dropped():
+    window = SlidingWindow(limit=2, window=10, max_keys=2)
+    window.record("a", 0)
+    window.record("b", 5)
+    window.record("c", 11)  # a went idle for a whole window
+    assert len(window) == 2
+    window.record("d", 12)  # past max_keys: the least recently seen goes
+    assert len(window) == 2
+    assert window.retry_after("b", 12) == 0.0
+
+
+def test_per_user_limit_is_case_insensitive(clock):
+    reports = []
+    limiter = make_throttle(reports)
+    for client in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+        assert limiter.check("Amy", client) == 0.0
+    assert limiter.check(" amy ", "4.4.4.4") == pytest.approx(60.0)
+    clock[0] += 30
+    assert limiter.check("AMY", "4.4.4.4") == pytest.approx(30.0)
+    clock[0] += 30
+    assert limiter.check("amy", "4.4.4.4") == 0.0
+    assert limiter.check("bob", "4.4.4.4") == 0.0
+
+
+def test_per_client_limit_across_usernames(clock):
+    reports = []
+    limiter = make_throttle(reports)
+    for i in range(5):
+        assert limiter.check(f"user{i}", "9.9.9.9") == 0.0
+        clock[0] += 1
+    assert limiter.check("someone", "9.9.9.9") == pytest.approx(55.0)
+    assert limiter.check("someone", "8.8.8.8") == 0.0
+    clock[0] += 55
+    assert limiter.check("someone", "9.9.9.9") == 0.0
+
+
+def test_refusals_are_reported_once_per_user_and_client(clock):
+    reports = []
+    limiter = make_throttle(reports, per_user=1)
+    limiter.check("amy", "1.1.1.1")
+    for _ in range(4):
+        assert limiter.check("amy", "1.1.1.1") > 0
+    assert limiter.stats()["throttled"] == 4
+    limiter.flush()
+    assert [(r["username"], r["status"]) for r in reports] == [("amy", "Throttled x4 from 1.1.1.1")]
+    limiter.flush()
+    assert len(reports) == 1
+
+
+@pytest.mark.parametrize("address, forwarded, proxies, expected", [
+    ("10.0.0.1", "6.6.6.6", 0, "10.0.0.1"),                   # header ignored without a trusted proxy
+    ("10.0.0.1", "6.6.6.6, 5.5.5.5", 1, "5.5.5.5"),           # the hop our proxy appended
+    ("10.0.0.1", "6.6.6.6, 5.5.5.5, 10.0.0.2", 2, "5.5.5.5"),
+    ("10.0.0.1", "5.5.5.5", 3, "5.5.5.5"),
+    ("10.0.0.1", "", 1, "10.0.0.1"),
+    ("", "", 0, "unknown"),
+])
+def test_client_key(address, forwarded, proxies, expected):
+    assert client_key(address, forwarded, proxies) == expected
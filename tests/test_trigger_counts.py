@@ -0,0 +1,41 @@
+import pytest
+
+from storage import CsvStorage, SqliteStorage
+from triggers import trigger_buckets
+
+DATE = "2024-03-01 10:00:00"
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def storage(request, workdir):
+    backend = CsvStorage() if request.param == "csv" else SqliteStorage(str(workdir / "oja.db"))
+    return backend.for_user("amy")
+
+
+def top(storage):
+    granularity, bucket = next(iter(trigger_buckets(DATE).items()))
+    return storage.load_top_triggers(granularity, bucket)
+
+
+def save(storage, text, keywords):
+    entry = {"date": DATE, "entry": text, "sentiment": 0.0, "keywords": keywords}
+    return dict(entry, id=storage.save_entry(entry))
+
+
+def test_delete_takes_its_keywords_out_of_the_counters(storage):
+    first = save(storage, "work and sleep", "work, sleep")
+    save(storage, "work again", "work")
+    assert storage.delete_entry(first) == first["id"]
+    assert top(storage) == {"entries": 1, "keywords": [("work", 1)], "pairs": []}
+    # a second delete of the same entry finds nothing and changes nothing
+    assert storage.delete_entry(first) is None
+    assert top(storage)["entries"] == 1
+
+
+def test_rebuild_matches_the_counters_kept_on_save(storage):
+    save(storage, "work and sleep", "work, sleep")
+    save(storage, "exam stress", "exam")
+    kept = top(storage)
+    storage.rebuild_trigger_counts()
+    assert top(storage) == kept
+    assert kept["entries"] == 2 and kept["pairs"] == [(("sleep", "work"), 1)]
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+from writer import WriteQueue
+
+
+def collecting_queue():
+    queue = WriteQueue(batch_max=10)
+    written = []
+    queue.register("rows", lambda items: (written.extend(items), [f"ok {i}" for i in items])[1])
+    return queue, written
+
+
+def test_writes_are_batched_in_order_with_one_result_each():
+    queue, written = collecting_queue()
+    assert queue.write_many("rows", list(range(25))) == [f"ok {i}" for i in range(25)]
+    assert written == list(range(25))
+    queue.close()
+
+
+def test_write_after_close_runs_inline_instead_of_hanging():
+    queue, written = collecting_queue()
+    queue.write("rows", 1)
+    queue.close()
+    done = []
+    thread = threading.Thread(target=lambda: done.append(queue.write("rows", 2, timeout=5)))
+    thread.start()
+    thread.join(5)
+    assert done == ["ok 2"]
+    assert written == [1, 2]
+    assert queue.submit("rows", 3).done()
+
+
+def test_close_is_idempotent_and_finishes_queued_writes():
+    queue, written = collecting_queue()
+    futures = [queue.submit("rows", i) for i in range(5)]
+    queue.close()
+    queue.close()
+    assert [future.result(0) for future in futures] == [f"ok {i}" for i in range(5)]
+
+
+def test_handler_errors_reach_every_caller_of_the_batch():
+    queue = WriteQueue()
+    queue.register("broken", lambda items: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        queue.write("broken", "x")
+    queue.close()
+    with pytest.raises(ZeroDivisionError):
+        queue.write("broken", "y")
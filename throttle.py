@@ -0,0 +1,137 @@
+import os
+import time
+import atexit
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+
+
+# Login throttling shared by every session of the server process. Attempts
+# are counted in sliding windows per username and per client; once either is
+# over its limit, further attempts are refused before the user list is read
+# or anything is written. Refusals are only counted, and reach the audit log
+# as one row per username and client every LOGIN_THROTTLE_REPORT_SECONDS.
+LOGIN_WINDOW_SECONDS = float(os.environ.get("OJA_LOGIN_WINDOW_SECONDS", 60))
+LOGIN_LIMIT_PER_USER = int(os.environ.get("OJA_LOGIN_LIMIT_PER_USER", 5))
+LOGIN_LIMIT_PER_CLIENT = int(os.environ.get("OJA_LOGIN_LIMIT_PER_CLIENT", 20))
+# Usernames / clients tracked at once; the least recently seen are dropped first
+LOGIN_THROTTLE_KEYS = int(os.environ.get("OJA_LOGIN_THROTTLE_KEYS", 10000))
+LOGIN_THROTTLE_REPORT_SECONDS = float(os.environ.get("OJA_LOGIN_THROTTLE_REPORT_SECONDS", 60))
+# Reverse proxies in front of the server that append to X-Forwarded-For. The
+# header is only read when this is set: its leading hops are whatever the
+# client sent, so only the ones these proxies appended identify a client.
+TRUSTED_PROXIES = int(os.environ.get("OJA_TRUSTED_PROXIES", 0))
+
+
+def client_key(address, forwarded="", trusted_proxies=TRUSTED_PROXIES):
+    # The throttle's client: the address the outermost trusted proxy saw, or
+    # the connection's own address when there is no trusted proxy
+    hops = [hop.strip() for hop in (forwarded or "").split(",") if hop.strip()]
+    if trusted_proxies > 0 and hops:
+        return hops[max(0, len(hops) - trusted_proxies)]
+    return address or "unknown"
+
+
+class SlidingWindow:
+    # key -> times of its last `limit` attempts; an attempt is allowed while
+    # fewer than `limit` of them fall inside the window
+    def __init__(self, limit, window=LOGIN_WINDOW_SECONDS, max_keys=LOGIN_THROTTLE_KEYS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._times = OrderedDict()
+
+    def __len__(self):
+        return len(self._times)
+
+    def retry_after(self, key, now):
+        # seconds until the key may try again, 0.0 if it may now
+        times = self._times.get(key)
+        if times is None or len(times) < self.limit:
+            return 0.0
+        return max(0.0, times[0] + self.window - now)
+
+    def record(self, key, now):
+        times = self._times.pop(key, None)
+        if times is None:
+            times = deque(maxlen=self.limit)
+        times.append(now)
+        self._times[key] = times
+        # keys idle for a whole window are dropped; past max_keys, the least recently seen too
+        while self._times:
+            oldest = next(iter(self._times.values()))
+            if oldest[-1] + self.window > now and len(self._times) <= self.max_keys:
+                break
+            self._times.popitem(last=False)
+
+
+class LoginThrottle:
+    def __init__(self, report, per_user=LOGIN_LIMIT_PER_USER, per_client=LOGIN_LIMIT_PER_CLIENT,
+                 window=LOGIN_WINDOW_SECONDS, max_keys=LOGIN_THROTTLE_KEYS,
+                 report_seconds=LOGIN_THROTTLE_REPORT_SECONDS):
+        # report(row) takes one login-log row ({"timestamp", "username", "status"})
+        self.report = report
+        self.report_seconds = report_seconds
+        self.max_keys = max_keys
+        self.allowed = 0
+        self.throttled = 0
+        self._users = SlidingWindow(per_user, window, max_keys)
+        self._clients = SlidingWindow(per_client, window, max_keys)
+        self._refused = {}   # (username, client) -> refusals since the last report
+        self._reported_at = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def check(self, username, client):
+        # Seconds the caller has to wait (the attempt is refused), or 0.0 (it
+        # is allowed and counted)
+        user_key = (username or "").strip().lower()
+        now = time.monotonic()
+        with self._lock:
+            wait = max(self._users.retry_after(user_key, now), self._clients.retry_after(client, now))
+            if wait:
+                self.throttled += 1
+                key = (username, client) if (username, client) in self._refused or \
+                    len(self._refused) < self.max_keys else ("*", "*")
+                self._refused[key] = self._refused.get(key, 0) + 1
+            else:
+                self.allowed += 1
+                self._users.record(user_key, now)
+                self._clients.record(client, now)
+            due = now - self._reported_at >= self.report_seconds
+        if due:
+            self.flush()
+        return wait
+
+    def flush(self):
+        # one audit row per username and client refused since the last flush
+        with self._lock:
+            refused, self._refused = self._refused, {}
+            self._reported_at = time.monotonic()
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for (username, client), count in refused.items():
+            self.report({"timestamp": timestamp, "username": username,
+                         "status": f"Throttled x{count} from {client}"})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "allowed": self.allowed,
+                "throttled": self.throttled,
+                "usernames": len(self._users),
+                "clients": len(self._clients),
+                "unreported": sum(self._refused.values()),
+            }
+
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+def get_login_throttle():
+    global _throttle
+    if _throttle is None:
+        with _throttle_lock:
+            if _throttle is None:
+                from audit import get_audit_sink
+                _throttle = LoginThrottle(get_audit_sink().submit)
+    return _throttle
@@ -0,0 +1,170 @@
+import os
+import glob
+import json
+import threading
+from itertools import combinations
+
+from mood_trend import bucket_keys
+from writer import file_lock, file_signature
+
+
+# Trigger counters are kept per week (starting Monday) and per month
+TRIGGER_GRANULARITIES = ("week", "month")
+
+# Triggers listed in the "Top triggers" panel
+TOP_TRIGGERS = int(os.environ.get("OJA_TOP_TRIGGERS", 5))
+
+# The counters' append log is folded into the snapshot once it is larger than
+# this and than the snapshot itself
+TRIGGER_LOG_COMPACT_BYTES = int(os.environ.get("OJA_TRIGGER_LOG_COMPACT_BYTES", 256 * 1024))
+
+
+def split_keywords(keywords):
+    # the journal stores keywords as one ", "-joined string
+    if not isinstance(keywords, str):
+        keywords = ", ".join(keywords)
+    return sorted(set(filter(None, (k.strip().lower() for k in keywords.split(",")))))
+
+def trigger_buckets(date):
+    keys = bucket_keys(date)
+    return {g: keys[g] for g in TRIGGER_GRANULARITIES}
+
+
+# -------- Counters kept next to the CSV journal --------
+class TriggerCounts:
+    # {user: {granularity: {bucket: {"entries": n, "keywords": {kw: n}, "pairs": {"a|b": n}}}}}.
+    # A JSON snapshot plus an append-only log of (user, date, keywords, delta)
+    # lines, so a save writes only its own rows; the log is folded into a new
+    # snapshot once it outgrows it. Every read and write holds the file lock,
+    # and another server process's appends are picked up from the log.
+    def __init__(self, path, compact_bytes=TRIGGER_LOG_COMPACT_BYTES):
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._counts = None
+        self._generation = 0
+        self._signature = None
+        self._log_offset = 0
+
+    def log_path(self, generation=None):
+        # a new snapshot starts a new log, so a crash between the two never replays old rows
+        return f"{self.path}.{self._generation if generation is None else generation}.log"
+
+    def _load(self):
+        signature = file_signature(self.path)
+        if self._counts is None or signature != self._signature:
+            self._counts, self._generation = {}, 0
+            if signature is not None:
+                with open(self.path) as file:
+                    data = json.load(file)
+                if set(data) == {"generation", "counts"} and isinstance(data["generation"], int):
+                    self._counts, self._generation = data["counts"], data["generation"]
+                else:  # written before the log existed: plain counts
+                    self._counts = data
+            self._signature = signature
+            self._log_offset = 0
+        # rows other processes appended since this one last looked
+        if os.path.exists(self.log_path()):
+            with open(self.log_path(), "rb") as log:
+                log.seek(self._log_offset)
+                for line in log:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._log_offset += len(line)
+                    try:
+                        user, date, keywords, delta = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._add(self._counts, user, date, keywords, delta)
+        return self._counts
+
+    def add_many(self, rows):
+        # rows: iterable of (user, date, keywords, delta), delta +1 on save and -1 on delete;
+        # one log append per batch
+        with self._lock, file_lock(self.path):
+            counts = self._load()
+            lines = []
+            for user, date, keywords, delta in rows:
+                user = user or ""
+                if not isinstance(keywords, str):
+                    keywords = ", ".join(keywords)
+                self._add(counts, user, date, keywords, delta)
+                lines.append(json.dumps([user, date, keywords, delta]) + "\n")
+            if not lines:
+                return
+            with open(self.log_path(), "ab") as log:
+                log.write("".join(lines).encode())
+            self._log_offset = os.path.getsize(self.log_path())
+            if self._log_offset > max(self.compact_bytes, self._signature[2] if self._signature else 0):
+                self._save()
+
+    def _add(self, counts, user, date, keywords, delta):
+        try:
+            buckets = trigger_buckets(date)
+        except (TypeError, ValueError):
+            return
+        found = split_keywords(keywords)
+        for granularity, key in buckets.items():
+            bucket = counts.setdefault(user, {}).setdefault(granularity, {}).setdefault(
+                key, {"entries": 0, "keywords": {}, "pairs": {}}
+            )
+            bucket["entries"] += delta
+            bump(bucket["keywords"], found, delta)
+            bump(bucket["pairs"], (f"{a}|{b}" for a, b in combinations(found, 2)), delta)
+            if bucket["entries"] <= 0:
+                del counts[user][granularity][key]
+
+    def rebuild(self, rows):
+        # rows: iterable of (user, date, keywords), replacing every count
+        with self._lock, file_lock(self.path):
+            self._load()
+            self._counts = {}
+            for user, date, keywords in rows:
+                self._add(self._counts, user or "", date, keywords, 1)
+            self._save()
+
+    def clear(self):
+        with self._lock, file_lock(self.path):
+            self._counts = {}
+            self._generation = 0
+            self._signature = None
+            self._log_offset = 0
+            for path in [self.path, *glob.glob(glob.escape(self.path) + ".*.log")]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _save(self):
+        # fold the log into a new snapshot and start the next generation's log
+        self._generation += 1
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"generation": self._generation, "counts": self._counts}, file)
+        os.replace(tmp_path, self.path)
+        self._signature = file_signature(self.path)
+        self._log_offset = 0
+        for path in glob.glob(glob.escape(self.path) + ".*.log"):
+            if path != self.log_path():
+                os.remove(path)
+
+    def top(self, user, granularity, bucket, limit=TOP_TRIGGERS):
+        with self._lock, file_lock(self.path):
+            stats = self._load().get(user or "", {}).get(granularity, {}).get(bucket)
+            if stats is None:
+                return top_triggers(0, {}, {}, limit)
+            pairs = {tuple(pair.split("|", 1)): count for pair, count in stats["pairs"].items()}
+            return top_triggers(stats["entries"], stats["keywords"], pairs, limit)
+
+
+def bump(counts, keys, delta):
+    for key in keys:
+        count = counts.get(key, 0) + delta
+        if count > 0:
+            counts[key] = count
+        else:
+            counts.pop(key, None)
+
+def top_triggers(entries, keyword_counts, pair_counts, limit=TOP_TRIGGERS):
+    # {"entries": n, "keywords": [(kw, n)], "pairs": [((a, b), n)]}, most frequent first
+    def ranked(counts):
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return {"entries": entries, "keywords": ranked(keyword_counts), "pairs": ranked(pair_counts)}
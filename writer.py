@@ -0,0 +1,165 @@
+import os
+import queue
+import atexit
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Max writes applied together by one handler call
+WRITE_BATCH_MAX = int(os.environ.get("OJA_WRITE_BATCH_MAX", 500))
+
+
+# -------- Cross-process file lock --------
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock on path + ".lock": a thread lock inside this process plus
+    # an OS lock (flock / msvcrt) against other server processes
+    lock_path = os.path.abspath(path) + ".lock"
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(lock_path, threading.RLock())
+    with thread_lock:
+        with open(lock_path, "a+b") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def file_signature(path):
+    # changes whenever the file is written or replaced; None if it doesn't exist
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+@contextmanager
+def atomic_write(path, mode="w", newline=""):
+    # Write to a temp file next to path and rename over it only on success
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    kwargs = {} if "b" in mode else {"newline": newline}
+    try:
+        with open(tmp_path, mode, **kwargs) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# -------- Single writer thread --------
+class WriteQueue:
+    # Every session submits its writes here; one thread applies them in order,
+    # handing each target's queued items to its handler as one batch. Once
+    # closed (at exit), writes are applied inline by the caller instead.
+    def __init__(self, batch_max=WRITE_BATCH_MAX):
+        self.batch_max = batch_max
+        self.batches = 0
+        self.writes = 0
+        self._handlers = {}
+        self._queue = queue.Queue()
+        self._closed = False
+        self._state_lock = threading.Lock()
+        self._apply_lock = threading.RLock()
+        self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def register(self, target, handler):
+        # handler(items) -> list with one result per item (or None)
+        self._handlers[target] = handler
+
+    def submit(self, target, item):
+        future = Future()
+        with self._state_lock:
+            if not self._closed:
+                self._queue.put((target, item, future))
+                return future
+        # nothing drains the queue any more
+        self._apply([(target, item, future)])
+        return future
+
+    def write(self, target, item, timeout=None):
+        return self.submit(target, item).result(timeout)
+
+    def write_many(self, target, items, timeout=None):
+        futures = [self.submit(target, item) for item in items]
+        return [future.result(timeout) for future in futures]
+
+    def close(self):
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(5.0)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = [first]
+            stop = False
+            while len(pending) < self.batch_max:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                pending.append(job)
+            self._apply(pending)
+            if stop:
+                return
+
+    def _apply(self, pending):
+        # each target's jobs go to its handler together, in submission order
+        groups = {}
+        for job in pending:
+            groups.setdefault(job[0], []).append(job)
+        with self._apply_lock:
+            for target, group in groups.items():
+                try:
+                    results = self._handlers[target]([item for _, item, _ in group])
+                    results = results if results is not None else [None] * len(group)
+                    for (_, _, future), result in zip(group, results):
+                        future.set_result(result)
+                except Exception as e:
+                    for _, _, future in group:
+                        future.set_exception(e)
+                self.batches += 1
+                self.writes += len(group)
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue():
+    global _write_queue
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                _write_queue = WriteQueue()
+    return _write_queue